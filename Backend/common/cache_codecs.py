@@ -0,0 +1,146 @@
+"""
+Value codecs for RedisCache.
+
+Every encoded value starts with a 2 byte header: MAGIC and a codec tag (bit 0x80 set when the payload
+is zlib compressed). MAGIC (0xC1) can never start a UTF-8 / JSON document, so values written before the
+codecs existed (plain json.dumps text) are still recognised and decoded as JSON; old and new formats
+can live side by side while workers are rolled over.
+
+  orjson   small objects, when orjson is installed
+  msgpack  small objects, when msgpack is installed and orjson is not
+  frame    numeric pandas DataFrames: raw numpy column buffers, restored without any parsing
+"""
+import json
+import os
+import struct
+import zlib
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+MAGIC = 0xC1
+TAG_ORJSON = 0x01
+TAG_MSGPACK = 0x02
+TAG_FRAME = 0x03
+COMPRESSED = 0x80
+
+# auto, orjson, msgpack or json (json writes the legacy format, e.g. to roll back)
+CACHE_CODEC = os.getenv("CACHE_CODEC", "auto")
+# payloads larger than this many bytes are zlib compressed
+CACHE_COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", "4096"))
+
+
+def _object_codec() -> str:
+    if CACHE_CODEC in ("orjson", "auto") and orjson is not None:
+        return "orjson"
+    if CACHE_CODEC in ("msgpack", "auto") and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+
+def _default(value: Any) -> Any:
+    # same fallback as json.dumps(default=str): Decimal, datetime, Timestamp ... become strings
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _frame_supported(frame: pd.DataFrame) -> bool:
+    return (
+        all(isinstance(column, str) for column in frame.columns)
+        # plain numpy columns only; extension dtypes (nullable Int64, tz-aware) have no raw buffer
+        and all(isinstance(dtype, np.dtype) and dtype.kind in "biufM" for dtype in frame.dtypes)
+        and frame.index.dtype.kind in "biufM"
+    )
+
+
+def _encode_frame(frame: pd.DataFrame) -> bytes:
+    index = frame.index
+    tz = str(index.tz) if getattr(index, "tz", None) is not None else None
+    # tz-aware indexes are stored as naive UTC and converted back on decode
+    index_values = index.tz_convert("UTC").tz_localize(None).to_numpy() if tz else index.to_numpy()
+
+    arrays = [np.ascontiguousarray(index_values)]
+    arrays += [np.ascontiguousarray(frame[column].to_numpy()) for column in frame.columns]
+    header = json.dumps({
+        "rows": len(frame),
+        "columns": list(frame.columns),
+        "dtypes": [array.dtype.str for array in arrays],
+        "index_name": index.name,
+        "tz": tz,
+    }).encode()
+    return struct.pack(">I", len(header)) + header + b"".join(array.tobytes() for array in arrays)
+
+
+def _decode_frame(payload: bytes) -> pd.DataFrame:
+    (header_length,) = struct.unpack(">I", payload[:4])
+    header = json.loads(payload[4:4 + header_length])
+    buffer = bytearray(payload[4 + header_length:])  # writable, so the frame owns normal arrays
+
+    arrays, offset = [], 0
+    for dtype in header["dtypes"]:
+        dtype = np.dtype(dtype)
+        arrays.append(np.frombuffer(buffer, dtype=dtype, count=header["rows"], offset=offset))
+        offset += dtype.itemsize * header["rows"]
+
+    index = pd.Index(arrays[0], name=header["index_name"])
+    if header["tz"]:
+        index = pd.DatetimeIndex(index).tz_localize("UTC").tz_convert(header["tz"])
+    return pd.DataFrame(dict(zip(header["columns"], arrays[1:])), index=index)
+
+
+def encode(value: Any) -> bytes:
+    if isinstance(value, pd.DataFrame):
+        if _frame_supported(value):
+            return _pack(TAG_FRAME, _encode_frame(value))
+        value = value.reset_index().to_dict(orient="list")
+
+    codec = _object_codec()
+    if codec == "orjson":
+        # datetimes go through _default too, so they read back exactly as json.dumps(default=str) wrote them
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        return _pack(TAG_ORJSON, orjson.dumps(value, default=_default, option=options))
+    if codec == "msgpack":
+        return _pack(TAG_MSGPACK, msgpack.packb(value, default=_default, use_bin_type=True))
+    return json.dumps(value, default=str).encode()
+
+
+def _pack(tag: int, payload: bytes) -> bytes:
+    if len(payload) > CACHE_COMPRESS_THRESHOLD:
+        payload = zlib.compress(payload, 1)
+        tag |= COMPRESSED
+    return bytes((MAGIC, tag)) + payload
+
+
+def decode(raw: bytes) -> Any:
+    if not raw or raw[0] != MAGIC:
+        # legacy value written with json.dumps
+        return json.loads(raw)
+
+    tag, payload = raw[1], raw[2:]
+    if tag & COMPRESSED:
+        payload = zlib.decompress(payload)
+        tag &= ~COMPRESSED
+
+    if tag == TAG_FRAME:
+        return _decode_frame(payload)
+    if tag == TAG_ORJSON:
+        if orjson is None:
+            return json.loads(payload)
+        return orjson.loads(payload)
+    if tag == TAG_MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack encoded cache value but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    raise ValueError(f"Unknown cache codec tag {tag}")
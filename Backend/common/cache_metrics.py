@@ -0,0 +1,194 @@
+"""
+Per-namespace cache instrumentation.
+
+A key's namespace is the part before its first ":" (stock_info, stock_price, ml_prices, ml_risk, ml_corr,
+lkg, ...). For every namespace RedisCache records hits and misses per tier, errors, get / set latency
+and the encoded size of the values written, so TTLs can be tuned per kind of data. The counters are
+per process; memory_footprint samples Redis itself for what each namespace occupies there.
+"""
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# upper bounds of the histogram buckets; the last bucket is everything above
+LATENCY_BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+SIZE_BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# keys without a ":" and namespaces beyond this many are counted under "other"
+MAX_NAMESPACES = 64
+OTHER_NAMESPACE = "other"
+
+
+class Histogram:
+    """Fixed-bucket histogram with count and sum; quantiles are estimated as the upper bound of their bucket."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                # the overflow bucket has no upper bound, report the largest one
+                return self.bounds[min(i, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def snapshot(self) -> dict:
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class _NamespaceMetrics:
+    def __init__(self):
+        self.counters = {"local_hits": 0, "hits": 0, "misses": 0, "sets": 0, "errors": 0, "bytes_written": 0}
+        self.get_latency = Histogram(LATENCY_BUCKETS_MS)
+        self.set_latency = Histogram(LATENCY_BUCKETS_MS)
+        self.value_size = Histogram(SIZE_BUCKETS_BYTES)
+
+    def snapshot(self) -> dict:
+        counters = dict(self.counters)
+        lookups = counters["local_hits"] + counters["hits"] + counters["misses"]
+        counters["hit_ratio"] = (
+            round((counters["local_hits"] + counters["hits"]) / lookups, 4) if lookups else None
+        )
+        return {
+            **counters,
+            "get_latency_ms": self.get_latency.snapshot(),
+            "set_latency_ms": self.set_latency.snapshot(),
+            "value_size_bytes": self.value_size.snapshot(),
+        }
+
+
+def namespace_of(key: str) -> str:
+    namespace, separator, _ = key.partition(":")
+    return namespace if separator else OTHER_NAMESPACE
+
+
+class CacheMetrics:
+    """Thread-safe per-namespace counters and histograms of one RedisCache."""
+
+    def __init__(self):
+        self._namespaces: Dict[str, _NamespaceMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> _NamespaceMetrics:
+        namespace = namespace_of(key)
+        metrics = self._namespaces.get(namespace)
+        if metrics is None:
+            if len(self._namespaces) >= MAX_NAMESPACES:
+                namespace = OTHER_NAMESPACE
+            metrics = self._namespaces.setdefault(namespace, _NamespaceMetrics())
+        return metrics
+
+    def local_hit(self, key: str):
+        with self._lock:
+            self._get(key).counters["local_hits"] += 1
+
+    def record_get(self, keys: Iterable[str], hits: Iterable[bool], seconds: float):
+        """
+        One Redis read (GET or MGET) of keys, hits[i] telling whether keys[i] was found. The latency of
+        a batched read is observed once per namespace in the batch.
+        """
+        with self._lock:
+            seen = set()
+            for key, hit in zip(keys, hits):
+                metrics = self._get(key)
+                metrics.counters["hits" if hit else "misses"] += 1
+                if id(metrics) not in seen:
+                    seen.add(id(metrics))
+                    metrics.get_latency.observe(seconds * 1000)
+
+    def record_set(self, sizes: Dict[str, int], seconds: float):
+        """One Redis write (SETEX or a pipeline of them) of keys with the encoded size of their values."""
+        with self._lock:
+            seen = set()
+            for key, size in sizes.items():
+                metrics = self._get(key)
+                metrics.counters["sets"] += 1
+                metrics.counters["bytes_written"] += size
+                metrics.value_size.observe(size)
+                if id(metrics) not in seen:
+                    seen.add(id(metrics))
+                    metrics.set_latency.observe(seconds * 1000)
+
+    def record_error(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._get(key).counters["errors"] += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {namespace: metrics.snapshot() for namespace, metrics in sorted(self._namespaces.items())}
+
+    def reset(self):
+        with self._lock:
+            self._namespaces.clear()
+
+
+def memory_footprint(client, sample_size: int = 1000, batch_size: int = 200) -> dict:
+    """
+    Approximate Redis memory per namespace: SCAN up to sample_size keys, read MEMORY USAGE of each
+    in pipelined batches and extrapolate to the whole keyspace by the namespace's share of the sample.
+    """
+    if client is None:
+        return {}
+
+    sampled: Dict[str, List[int]] = {}
+    keys: List[str] = []
+
+    def measure(batch: List[str]):
+        pipe = client.pipeline(transaction=False)
+        for key in batch:
+            pipe.memory_usage(key)
+        for key, usage in zip(batch, pipe.execute()):
+            # keys can expire between SCAN and MEMORY USAGE
+            if usage is not None:
+                sampled.setdefault(namespace_of(key), []).append(usage)
+
+    for key in client.scan_iter(count=batch_size):
+        keys.append(key)
+        if len(keys) % batch_size == 0:
+            measure(keys[-batch_size:])
+        if len(keys) >= sample_size:
+            break
+    remainder = len(keys) % batch_size
+    if remainder:
+        measure(keys[-remainder:])
+
+    total_keys = client.dbsize()
+    sampled_keys = sum(len(sizes) for sizes in sampled.values())
+    namespaces = {}
+    for namespace, sizes in sorted(sampled.items()):
+        estimated_keys = round(total_keys * len(sizes) / sampled_keys) if sampled_keys else 0
+        namespaces[namespace] = {
+            "sampled_keys": len(sizes),
+            "sampled_bytes": sum(sizes),
+            "avg_bytes": round(sum(sizes) / len(sizes)),
+            "estimated_keys": estimated_keys,
+            "estimated_bytes": round(estimated_keys * sum(sizes) / len(sizes)),
+        }
+    return {
+        "used_memory": client.info("memory").get("used_memory"),
+        "total_keys": total_keys,
+        "sampled_keys": sampled_keys,
+        "namespaces": namespaces,
+    }
@@ -0,0 +1,132 @@
+"""
+Cross-service cache invalidation over Redis pub/sub.
+
+Writers publish a typed event when fresh data for some symbols lands:
+
+  quote          new current prices (stock_price keys)
+  price_history  new or corrected daily prices
+  fundamentals   new or changed quarterly statements / dividends
+
+as {"kind", "symbols", "source"} on INVALIDATION_CHANNEL. Every worker of every service runs one
+InvalidationSubscriber and registers handlers that drop only the derived keys of those symbols.
+
+Pub/sub does not queue messages for a disconnected subscriber, so an event can be missed while Redis
+reconnects; the TTL of the derived keys stays the upper bound on how stale they can get.
+
+Shared by the stock and ml services; the Redis connection is the one of the importing service's
+utils.cache, looked up on use so this module does not depend on a particular service at import time.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+EVENT_KINDS = ("quote", "price_history", "fundamentals")
+
+_SOURCE = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _redis_client():
+    # the service's own cache module, imported lazily (see the module docstring)
+    from utils.cache import cache
+    return cache.redis_client
+
+
+def publish(kind: str, symbols: Iterable[str]) -> int:
+    """Announce that the data of these symbols changed. Returns the number of subscribers reached."""
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"Unknown invalidation event {kind}")
+    symbols = sorted({symbol.upper() for symbol in symbols})
+    client = _redis_client()
+    if not symbols or client is None:
+        return 0
+    try:
+        return client.publish(
+            INVALIDATION_CHANNEL, json.dumps({"kind": kind, "symbols": symbols, "source": _SOURCE})
+        )
+    except Exception as e:
+        logger.error(f"Could not publish {kind} invalidation for {len(symbols)} symbols: {e}")
+        return 0
+
+
+class InvalidationSubscriber:
+    """Listens on INVALIDATION_CHANNEL in a daemon thread and calls the handlers registered per event kind."""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[List[str]], None]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.received = 0
+        self.last_event: Optional[dict] = None
+
+    def on(self, kind: str, handler: Callable[[List[str]], None]):
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"Unknown invalidation event {kind}")
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def start(self):
+        if self._thread is not None or _redis_client() is None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = _redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.dispatch(message["data"])
+            except Exception as e:
+                logger.warning(f"Invalidation subscriber disconnected: {e}; retrying in 5s")
+                self._stop.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def dispatch(self, data: str):
+        try:
+            event = json.loads(data)
+            kind, symbols = event["kind"], event["symbols"]
+        except Exception as e:
+            logger.error(f"Malformed invalidation event {data!r}: {e}")
+            return
+
+        self.received += 1
+        self.last_event = {"kind": kind, "symbols": len(symbols), "source": event.get("source"), "at": time.time()}
+        for handler in self._handlers.get(kind, ()):
+            try:
+                handler(symbols)
+            except Exception as e:
+                logger.error(f"Invalidation handler for {kind} failed: {e}")
+
+    def status(self) -> dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "handlers": {kind: len(handlers) for kind, handlers in self._handlers.items()},
+            "received": self.received,
+            "last_event": self.last_event,
+        }
+
+
+# Global subscriber instance
+invalidation_subscriber = InvalidationSubscriber()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Backend/, so the shared code is imported as the `common` package like the services do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common import cache_codecs
+
+
+@pytest.mark.parametrize("codec", ["auto", "json"])
+def test_objects_round_trip(monkeypatch, codec):
+    monkeypatch.setattr(cache_codecs, "CACHE_CODEC", codec)
+    value = {"symbol": "AKBNK", "price": 41.5, "volume": 1200, "sectors": ["Banks"], "listed": True, "peg": None}
+
+    assert cache_codecs.decode(cache_codecs.encode(value)) == value
+
+
+def test_values_read_back_as_the_legacy_json_wrote_them():
+    value = {"price": Decimal("41.50"), "at": datetime(2024, 3, 4, 10, 30)}
+    legacy = json.loads(json.dumps(value, default=str))
+
+    assert cache_codecs.decode(cache_codecs.encode(value)) == legacy
+    # values written before the codecs existed are still plain JSON text
+    assert cache_codecs.decode(json.dumps(legacy).encode()) == legacy
+
+
+def test_numeric_frame_round_trips_through_raw_buffers():
+    index = pd.date_range("2024-01-01", periods=500, freq="D", tz="Europe/Istanbul", name="Date")
+    frame = pd.DataFrame(
+        {"Close": np.linspace(10, 20, len(index)), "Volume": np.arange(len(index), dtype=np.int64)}, index=index
+    )
+
+    raw = cache_codecs.encode(frame)
+
+    assert raw[0] == cache_codecs.MAGIC
+    assert raw[1] == cache_codecs.TAG_FRAME | cache_codecs.COMPRESSED
+    pd.testing.assert_frame_equal(cache_codecs.decode(raw), frame, check_freq=False)
+
+
+def test_frame_with_extension_dtypes_falls_back_to_a_dict():
+    frame = pd.DataFrame({"Volume": pd.array([1, None], dtype="Int64")}, index=pd.Index([0, 1], name="i"))
+
+    assert cache_codecs.decode(cache_codecs.encode(frame)) == {"i": [0, 1], "Volume": [1, None]}
+
+
+def test_small_payloads_are_not_compressed():
+    raw = cache_codecs.encode({"price": 1.0})
+
+    assert not raw[1] & cache_codecs.COMPRESSED
@@ -0,0 +1,139 @@
+import time
+
+import pytest
+
+from common import yahoo_client
+from common.yahoo_client import (
+    RETRY_BUDGET_MAX, CircuitBreaker, IncompleteResponse, SymbolNotFound, UpstreamUnavailable, YahooClient,
+)
+
+
+@pytest.fixture
+def client():
+    return YahooClient(timeout=0.05)
+
+
+def _fail():
+    raise ConnectionError("connection reset")
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    # the success reset the count
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # a single probe at a time
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_open_breaker_rejects_calls_without_running_them(client):
+    for _ in range(client.breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            client._attempt(_fail, client.timeout)
+
+    with pytest.raises(UpstreamUnavailable):
+        client.call(lambda: pytest.fail("called through an open breaker"))
+    assert client.status()["rejections"] == 1
+
+
+def test_not_found_answers_do_not_open_the_breaker(client):
+    def missing():
+        raise ValueError("404 Client Error: Not Found for url")
+
+    for _ in range(client.breaker.failure_threshold + 1):
+        with pytest.raises(SymbolNotFound):
+            client.call(missing)
+
+    assert client.breaker.state == "closed"
+    assert client.status()["retries"] == 0
+
+
+def test_retries_are_limited_by_the_budget(client):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        raise ConnectionError("connection reset")
+
+    # the budget starts full: a failure is retried once while retries are saved up
+    for _ in range(int(RETRY_BUDGET_MAX)):
+        client.breaker.record_success()
+        with pytest.raises(ConnectionError):
+            client.call(flaky)
+    assert len(attempts) == 2 * int(RETRY_BUDGET_MAX)
+
+    # spent: failures are no longer retried until successes earn the budget back
+    attempts.clear()
+    client.breaker.record_success()
+    with pytest.raises(ConnectionError):
+        client.call(flaky)
+    assert len(attempts) == 1
+
+    # every success earns a tenth of a retry (one extra for float rounding)
+    for _ in range(11):
+        client.call(lambda: "quote")
+    attempts.clear()
+    with pytest.raises(ConnectionError):
+        client.call(flaky)
+    assert len(attempts) == 2
+
+
+def test_slow_bulk_calls_do_not_open_the_breaker(client):
+    for _ in range(client.breaker.failure_threshold + 1):
+        with pytest.raises(UpstreamUnavailable):
+            client.call_bulk(lambda: time.sleep(0.2), timeout=0.01)
+        with pytest.raises(ConnectionError):
+            client.call_bulk(_fail)
+
+    assert client.breaker.state == "closed"
+    assert client.call(lambda: "quote") == "quote"
+    assert client.status()["bulk_failures"] == 2 * (client.breaker.failure_threshold + 1)
+
+
+def test_bulk_calls_get_the_long_timeout(client):
+    # far above the 0.05 s interactive timeout of this client
+    assert client.call_bulk(lambda: time.sleep(0.1) or "history") == "history"
+
+
+def _ticker_info(monkeypatch, info):
+    class Ticker:
+        def __init__(self, symbol):
+            self.info = info
+
+    monkeypatch.setattr(yahoo_client.yf, "Ticker", Ticker)
+
+
+@pytest.mark.parametrize("info", [{"quoteType": "NONE"}, {"trailingPegRatio": None}])
+def test_info_of_an_unknown_ticker_is_negative_cached(client, monkeypatch, info):
+    _ticker_info(monkeypatch, info)
+
+    assert client.info("NOPE.IS") is None
+    assert client.is_known_missing("NOPE.IS")
+
+
+@pytest.mark.parametrize("info", [{}, {"quoteType": "EQUITY", "exchange": "IST"}])
+def test_partial_info_raises_without_negative_caching(client, monkeypatch, info):
+    _ticker_info(monkeypatch, info)
+
+    with pytest.raises(IncompleteResponse):
+        client.info("AKBNK.IS")
+    assert not client.is_known_missing("AKBNK.IS")
@@ -0,0 +1,305 @@
+"""
+Guarded access to Yahoo Finance (yfinance), shared by the stock, watchlist and ml services
+(copied into each image as the `common` package).
+
+Every upstream call goes through YahooClient, which adds:
+  - a per-call timeout: calls run on a bounded thread pool and the caller stops waiting after
+    YAHOO_TIMEOUT seconds (yfinance itself has no timeout for Ticker.info)
+  - a circuit breaker: after YAHOO_BREAKER_FAILURES consecutive failures calls are rejected at once
+    for YAHOO_BREAKER_RESET seconds, then a single probe call decides whether it closes again
+  - a retry budget: a failed call is retried once, but retries are limited to roughly 10% of the
+    successful calls so retries cannot multiply the load on an already struggling upstream
+  - a negative cache: symbols that returned no data are not asked again for YAHOO_NEGATIVE_TTL seconds
+
+An unknown or delisted ticker (HTTP 404, "Quote not found", yfinance's YFTickerMissingError) is an answer,
+not an upstream failure: it goes to the negative cache, is not retried and counts as a success for the
+breaker, so a page full of bad symbols cannot open it for everybody. Only an explicit not-found answer
+is cached that way: an info response that merely lacks data raises IncompleteResponse instead.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+import yfinance as yf
+
+try:
+    from yfinance.exceptions import YFTickerMissingError
+except ImportError:  # yfinance < 0.2.41
+    YFTickerMissingError = None
+
+logger = logging.getLogger(__name__)
+
+YAHOO_TIMEOUT = float(os.getenv("YAHOO_TIMEOUT", "10"))
+# Most Yahoo calls in flight at once; calls beyond it wait (and time out) in the queue
+YAHOO_MAX_CONCURRENCY = int(os.getenv("YAHOO_MAX_CONCURRENCY", "8"))
+YAHOO_BREAKER_FAILURES = int(os.getenv("YAHOO_BREAKER_FAILURES", "5"))
+YAHOO_BREAKER_RESET = float(os.getenv("YAHOO_BREAKER_RESET", "30"))
+YAHOO_NEGATIVE_TTL = float(os.getenv("YAHOO_NEGATIVE_TTL", "300"))
+# Timeout of bulk history downloads (backfills, multi-year syncs of many tickers), see call_bulk
+YAHOO_BULK_TIMEOUT = float(os.getenv("YAHOO_BULK_TIMEOUT", "300"))
+
+# retry budget: every success earns RETRY_RATIO of a retry, at most RETRY_BUDGET_MAX are saved up
+RETRY_RATIO = 0.1
+RETRY_BUDGET_MAX = 10.0
+
+
+class UpstreamUnavailable(Exception):
+    """Yahoo Finance is not called: the circuit breaker is open or the call timed out."""
+
+
+class SymbolNotFound(Exception):
+    """Yahoo Finance has no data for the symbol (unknown or delisted ticker)."""
+
+
+class IncompleteResponse(Exception):
+    """Yahoo Finance answered without the data asked for (a partial or throttled response), worth retrying later."""
+
+
+# lower-cased fragments of the errors Yahoo / yfinance answer an unknown ticker with
+_NOT_FOUND_MESSAGES = ("404 client error", "quote not found", "no data found", "possibly delisted")
+
+
+def _is_unknown_ticker_info(info: dict) -> bool:
+    # what Ticker.info holds for a ticker Yahoo does not know: an explicit NONE quote type, or nothing
+    # but the trailingPegRatio yfinance adds on its own
+    return info.get("quoteType") == "NONE" or (bool(info) and set(info) <= {"trailingPegRatio"})
+
+
+def is_not_found(error: Exception) -> bool:
+    """Whether an exception raised by a yfinance call means the symbol does not exist rather than a failure."""
+    if isinstance(error, SymbolNotFound):
+        return True
+    if YFTickerMissingError is not None and isinstance(error, YFTickerMissingError):
+        return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 404:
+        return True
+    message = str(error).lower()
+    return any(fragment in message for fragment in _NOT_FOUND_MESSAGES)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: closed -> open -> half_open (one probe) -> closed / open."""
+
+    def __init__(self, failure_threshold: int = YAHOO_BREAKER_FAILURES, reset_timeout: float = YAHOO_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Yahoo Finance circuit breaker closed")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Yahoo Finance circuit breaker opened after {self.consecutive_failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class YahooClient:
+    def __init__(self, timeout: float = YAHOO_TIMEOUT, negative_ttl: float = YAHOO_NEGATIVE_TTL):
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.breaker = CircuitBreaker()
+        self._pool = ThreadPoolExecutor(max_workers=YAHOO_MAX_CONCURRENCY, thread_name_prefix="yahoo")
+        # symbol -> monotonic time until which it is known to have no data
+        self._negative: Dict[str, float] = {}
+        self._retry_budget = RETRY_BUDGET_MAX
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "failures": 0, "timeouts": 0, "rejections": 0, "retries": 0, "not_found": 0, "negative_hits": 0,
+            "bulk_calls": 0, "bulk_failures": 0, "incomplete": 0,
+        }
+
+    def call(self, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run one yfinance call with the timeout (default YAHOO_TIMEOUT), the breaker and the retry budget.
+        Raises UpstreamUnavailable when the call is rejected or times out, SymbolNotFound when Yahoo has no
+        such symbol, otherwise whatever fn raised.
+        """
+        timeout = timeout or self.timeout
+        try:
+            return self._attempt(fn, timeout)
+        except (UpstreamUnavailable, SymbolNotFound):
+            raise
+        except Exception as e:
+            if not self._take_retry():
+                raise
+            logger.info(f"Retrying Yahoo Finance call after error: {e}")
+            return self._attempt(fn, timeout)
+
+    def call_bulk(self, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run one long yfinance call (a multi-year download of many tickers) with a long timeout (default
+        YAHOO_BULK_TIMEOUT) and without the breaker or retries. A slow backfill says nothing about whether
+        the short interactive calls work, so it must not open the breaker they share.
+        """
+        timeout = timeout or YAHOO_BULK_TIMEOUT
+        self._count("bulk_calls")
+        future = self._pool.submit(fn)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            self._count("bulk_failures")
+            raise UpstreamUnavailable(f"Yahoo Finance bulk call timed out after {timeout}s")
+        except Exception as e:
+            if is_not_found(e):
+                self._count("not_found")
+                raise SymbolNotFound(str(e)) from e
+            self._count("bulk_failures")
+            raise
+
+    def _attempt(self, fn: Callable[[], Any], timeout: float) -> Any:
+        if not self.breaker.allow():
+            self._count("rejections")
+            raise UpstreamUnavailable("Yahoo Finance circuit breaker is open")
+
+        self._count("calls")
+        future = self._pool.submit(fn)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            # the worker thread cannot be stopped, but the caller does not wait for it any longer
+            future.cancel()
+            self._count("timeouts")
+            self.breaker.record_failure()
+            raise UpstreamUnavailable(f"Yahoo Finance call timed out after {timeout}s")
+        except Exception as e:
+            if is_not_found(e):
+                # Yahoo answered; the symbol just does not exist
+                self._count("not_found")
+                self.breaker.record_success()
+                raise SymbolNotFound(str(e)) from e
+            self._count("failures")
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        with self._lock:
+            self._retry_budget = min(RETRY_BUDGET_MAX, self._retry_budget + RETRY_RATIO)
+        return result
+
+    def _take_retry(self) -> bool:
+        with self._lock:
+            if self._retry_budget < 1 or self.breaker.state != "closed":
+                return False
+            self._retry_budget -= 1
+            self._stats["retries"] += 1
+            return True
+
+    # --- negative cache ---------------------------------------------------------------
+
+    def is_known_missing(self, symbol: str) -> bool:
+        with self._lock:
+            until = self._negative.get(symbol)
+            if until is None:
+                return False
+            if until < time.monotonic():
+                del self._negative[symbol]
+                return False
+            self._stats["negative_hits"] += 1
+            return True
+
+    def mark_missing(self, symbol: str):
+        with self._lock:
+            self._negative[symbol] = time.monotonic() + self.negative_ttl
+
+    # --- yfinance calls ---------------------------------------------------------------
+
+    def info(self, symbol: str) -> Optional[dict]:
+        """
+        Ticker info, or None for a symbol Yahoo has no data for. A response without price or name that
+        does not say the symbol is unknown raises IncompleteResponse, so callers keep their last good copy
+        instead of treating (and negative caching) the symbol as missing.
+        """
+        if self.is_known_missing(symbol):
+            return None
+        try:
+            info = self.call(lambda: yf.Ticker(symbol).info)
+        except SymbolNotFound:
+            self.mark_missing(symbol)
+            return None
+        info = info or {}
+        if _is_unknown_ticker_info(info):
+            self.mark_missing(symbol)
+            return None
+        if not any(key in info for key in ("currentPrice", "regularMarketPrice", "longName", "shortName")):
+            self._count("incomplete")
+            raise IncompleteResponse(f"Incomplete info for {symbol}: {sorted(info)[:10]}")
+        return info
+
+    def history(self, symbol: str, **kwargs):
+        """Ticker price history, or None for a symbol Yahoo has no data for."""
+        if self.is_known_missing(symbol):
+            return None
+        try:
+            frame = self.call(lambda: yf.Ticker(symbol).history(timeout=self.timeout, **kwargs))
+        except SymbolNotFound:
+            self.mark_missing(symbol)
+            return None
+        # an empty start/end range can just be days without trading, only an empty period means no data
+        if (frame is None or frame.empty) and "period" in kwargs:
+            self.mark_missing(symbol)
+            return None
+        return frame
+
+    def download(self, symbols: List[str], **kwargs):
+        """Multi-ticker download of the symbols not known to be missing (None if none are left)."""
+        symbols = [symbol for symbol in symbols if not self.is_known_missing(symbol)]
+        if not symbols:
+            return None
+        try:
+            return self.call(lambda: yf.download(symbols, timeout=self.timeout, **kwargs))
+        except SymbolNotFound:
+            # only attributable to a single-ticker download; yfinance leaves failed tickers of a
+            # multi-ticker download out of the frame instead of raising
+            if len(symbols) != 1:
+                raise
+            self.mark_missing(symbols[0])
+            return None
+
+    def status(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["negative_cache_size"] = len(self._negative)
+            stats["retry_budget"] = round(self._retry_budget, 1)
+        stats["breaker"] = self.breaker.state
+        stats["consecutive_failures"] = self.breaker.consecutive_failures
+        return stats
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._stats[counter] += 1
+
+
+# Global Yahoo Finance client
+yahoo = YahooClient()
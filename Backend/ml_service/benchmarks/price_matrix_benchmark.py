@@ -0,0 +1,143 @@
+"""
+Compare the ways risk_analytics can load a price history:
+
+  redis-json   the legacy ml_prices:{symbol}:{period} cache entry (JSON dict-of-lists) decoded back into a DataFrame
+  redis-frame  the same entry written by cache_codecs (Close column as a compressed numpy buffer)
+  mmap-matrix  a slice of the memory-mapped price matrix
+
+Synthetic 5-year random-walk histories are used so no Yahoo Finance access is needed.
+If REDIS_URL points at a running Redis the cache paths include the network round trip,
+otherwise only the decode cost is measured.
+
+Run from Backend/ml_service:
+    PYTHONPATH=.. python -m benchmarks.price_matrix_benchmark --symbols 500 --iterations 200
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from common import cache_codecs
+from utils import price_matrix
+
+
+def _synthetic_history(symbols, days):
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    rng = np.random.default_rng(42)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(days, len(symbols))), axis=0))
+    return pd.DataFrame(closes, index=dates, columns=[f"{symbol}.IS" for symbol in symbols])
+
+
+def _yfinance_like_frame(close: pd.Series) -> pd.DataFrame:
+    # the same columns Ticker.history returns, which is what ends up in the Redis entry today
+    frame = pd.DataFrame({
+        "Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+        "Volume": 1_000_000.0, "Dividends": 0.0, "Stock Splits": 0.0,
+    })
+    frame.index = close.index.tz_localize("Europe/Istanbul")
+    frame.index.name = "Date"
+    return frame
+
+
+def _redis_client():
+    try:
+        import redis
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        client.ping()
+        return client
+    except Exception:
+        return None
+
+
+def _time(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.mean(samples), statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--days", type=int, default=1260)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--period", default="1y")
+    args = parser.parse_args()
+
+    symbols = [f"S{i:04d}" for i in range(args.symbols)]
+    history = _synthetic_history(symbols, args.days)
+    probe = symbols[len(symbols) // 2]
+
+    # --- redis-json / redis-frame paths -----------------------------------------------
+    frame = _yfinance_like_frame(history[f"{probe}.IS"])
+    payload = json.dumps(frame.reset_index().to_dict(orient="list"), default=str)
+    frame_payload = cache_codecs.encode(frame[["Close"]])
+    client = _redis_client()
+    key = f"ml_prices_bench:{probe}:{args.period}"
+    frame_key = f"ml_prices_bench_frame:{probe}:{args.period}"
+    if client is not None:
+        client.setex(key, 600, payload)
+        client.setex(frame_key, 600, frame_payload)
+
+    def redis_json():
+        raw = client.get(key) if client is not None else payload
+        df = pd.DataFrame(json.loads(raw))
+        df["Date"] = pd.to_datetime(df["Date"])
+        df = df.set_index("Date")
+        return np.log(df["Close"] / df["Close"].shift(1)).dropna()
+
+    def redis_frame():
+        raw = client.get(frame_key) if client is not None else frame_payload
+        df = cache_codecs.decode(raw)
+        return np.log(df["Close"] / df["Close"].shift(1)).dropna()
+
+    # --- mmap-matrix path -------------------------------------------------------------
+    with tempfile.TemporaryDirectory() as root:
+        fake_download = pd.concat({"Close": history}, axis=1)
+        with mock.patch.object(price_matrix.yf, "download", return_value=fake_download):
+            started = time.perf_counter()
+            version_dir = price_matrix.build_price_matrix(symbols, root)
+            build_ms = (time.perf_counter() - started) * 1000
+        matrix = price_matrix.PriceMatrix(version_dir)
+
+        def mmap_matrix():
+            df = matrix.close_frame(probe, args.period)
+            return np.log(df["Close"] / df["Close"].shift(1)).dropna()
+
+        correlation_symbols = symbols[:20]
+
+        def mmap_correlation_block():
+            frame, _ = matrix.returns_frame(correlation_symbols, args.period)
+            return frame.dropna()
+
+        results = {
+            f"redis-json ({'redis round trip' if client else 'decode only'})": _time(redis_json, args.iterations),
+            f"redis-frame ({'redis round trip' if client else 'decode only'})": _time(redis_frame, args.iterations),
+            "mmap-matrix single symbol": _time(mmap_matrix, args.iterations),
+            "mmap-matrix 20-symbol returns block": _time(mmap_correlation_block, args.iterations),
+        }
+
+        matrix_bytes = sum(os.path.getsize(os.path.join(version_dir, name)) for name in os.listdir(version_dir))
+
+    if client is not None:
+        client.delete(key, frame_key)
+
+    print(f"{args.symbols} symbols x {args.days} days, period={args.period}, {args.iterations} iterations")
+    print(f"matrix build: {build_ms:.1f} ms, {matrix_bytes / 1e6:.1f} MB on disk")
+    print(f"redis-json payload for one symbol: {len(payload) / 1e3:.1f} KB")
+    print(f"redis-frame payload for one symbol: {len(frame_payload) / 1e3:.1f} KB")
+    print(f"{'path':45s} {'mean ms':>9s} {'median ms':>10s} {'max ms':>9s}")
+    for name, (mean, median, worst) in results.items():
+        print(f"{name:45s} {mean:9.3f} {median:10.3f} {worst:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
+from utils.cache import cache
 from utils.db_context import get_db
+from common.yahoo_client import yahoo
 from services.risk_analytics import get_risk_metrics, get_correlation_matrix, get_portfolio_risk
 from models.pydantic_models import (
     RiskMetricsResponse,
@@ -71,14 +73,21 @@ async def portfolio_risk_analysis(
     if not rows:
         raise HTTPException(status_code=404, detail="Portfolio not found or empty")
 
-    # Get current prices for each holding via Yahoo Finance
-    import yfinance as yf
+    # Current prices: the quotes the stock service keeps warm in the shared Redis (one MGET for the
+    # whole portfolio), Yahoo Finance only for the holdings without a cached quote
+    price_keys = {row[0]: f"stock_price:{row[0].upper()}.IS" for row in rows}
+    cached_prices = cache.get_many(list(price_keys.values()))
+
     holdings = []
     for row in rows:
         symbol, quantity, avg_price = row[0], int(row[1]), float(row[2])
+        current_price = cached_prices.get(price_keys[symbol])
+        if current_price is not None:
+            holdings.append((symbol, quantity, float(current_price)))
+            continue
         try:
-            ticker = yf.Ticker(f"{symbol.upper()}.IS")
-            current_price = ticker.info.get("currentPrice", float(avg_price))
+            info = yahoo.info(f"{symbol.upper()}.IS") or {}
+            current_price = info.get("currentPrice", float(avg_price))
         except Exception:
             current_price = float(avg_price)  # Fallback to average price
         holdings.append((symbol, quantity, current_price))
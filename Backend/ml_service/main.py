@@ -1,8 +1,9 @@
 import os
+import asyncio
 import logging
 import uvicorn
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from sqlalchemy import text
@@ -10,6 +11,11 @@ from sqlalchemy.orm import Session
 
 from controllers.ml_controller import router as ml_router
 from utils.db_context import get_db
+from services.risk_analytics import invalidate_symbols
+from utils.cache import cache
+from common.invalidation import invalidation_subscriber
+from utils.price_matrix import rebuild_if_stale, get_price_matrix, mark_stale, stale_symbols
+from common.yahoo_client import yahoo
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,6 +39,42 @@ app.add_middleware(
 # Include routers
 app.include_router(ml_router)
 
+# How often each worker checks whether the shared price matrix needs a rebuild
+PRICE_MATRIX_CHECK_INTERVAL = int(os.getenv("PRICE_MATRIX_CHECK_INTERVAL", "300"))
+
+
+async def price_matrix_task():
+    # every worker runs this loop, the file lock inside rebuild_if_stale lets only one of them build
+    while True:
+        try:
+            await asyncio.to_thread(rebuild_if_stale)
+        except Exception as e:
+            logger.error(f"Price matrix rebuild failed: {e}")
+        await asyncio.sleep(PRICE_MATRIX_CHECK_INTERVAL)
+
+
+def _evict_local_quotes(symbols):
+    cache.evict_local([f"stock_price:{symbol}.IS" for symbol in symbols])
+
+
+# new daily prices make the shared price matrix rows of those symbols stale (they are skipped until the
+# early rebuild this schedules), and with them the cached price frames and risk / correlation results;
+# the matrix goes first so a request in between cannot cache a result computed from it again
+invalidation_subscriber.on("price_history", mark_stale)
+invalidation_subscriber.on("price_history", invalidate_symbols)
+invalidation_subscriber.on("quote", _evict_local_quotes)
+
+
+@app.on_event("startup")
+async def startup_event():
+    invalidation_subscriber.start()
+    asyncio.create_task(price_matrix_task())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    invalidation_subscriber.stop()
+
 
 @app.get("/")
 async def root():
@@ -58,9 +100,34 @@ async def health_check(db: Session = Depends(get_db)):
         health["redis"] = "connected"
     except Exception as e:
         health["redis"] = str(e)
+    health["cache"] = cache.stats()
+    health["yahoo"] = yahoo.status()
+    health["invalidation"] = invalidation_subscriber.status()
+    matrix = get_price_matrix()
+    health["price_matrix"] = (
+        {
+            "built_at": matrix.built_at,
+            "symbols": len(matrix.symbols),
+            "days": len(matrix.dates),
+            "stale_symbols": stale_symbols(),
+        }
+        if matrix is not None else "not built"
+    )
     status_code = 200 if health["status"] == "healthy" else 503
     return JSONResponse(status_code=status_code, content=health)
 
 
+@app.get("/cache/metrics")
+def cache_metrics(memory: bool = False, sample_size: int = Query(1000, ge=1, le=100000)):
+    """
+    Per-namespace cache hits, misses, errors, latency and value sizes of this worker.
+    With memory=true, Redis is also sampled for the memory each namespace takes.
+    """
+    metrics = {"tiers": cache.stats(), "namespaces": cache.metrics.snapshot()}
+    if memory:
+        metrics["memory"] = cache.memory_footprint(sample_size)
+    return metrics
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8003, reload=True)
@@ -1,9 +1,11 @@
 import logging
+import os
 import numpy as np
 import pandas as pd
-import yfinance as yf
 from typing import Optional, Dict, List, Tuple
 from utils.cache import cache
+from utils.price_matrix import get_price_matrix, MARKET_SYMBOL
+from common.yahoo_client import yahoo
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +13,10 @@ logger = logging.getLogger(__name__)
 RISK_FREE_RATE = 0.25
 TRADING_DAYS_PER_YEAR = 252
 
+# Prices and the analytics derived from them only change when new daily prices land, and the stock
+# service announces that (see utils.invalidation), so they can be kept much longer than 15 minutes
+ML_ANALYTICS_TTL = int(os.getenv("ML_ANALYTICS_TTL", "21600"))
+
 PERIOD_MAP = {
     "1m": "1mo",
     "3m": "3mo",
@@ -21,38 +27,106 @@ PERIOD_MAP = {
 }
 
 
+def _price_cache_key(symbol: str, period: str) -> str:
+    return f"ml_prices:{symbol.upper()}:{period}"
+
+
+def _risk_cache_key(symbol: str, period: str) -> str:
+    return f"ml_risk:{symbol.upper()}:{period}"
+
+
+def _corr_cache_key(symbols: List[str], period: str) -> str:
+    return f"ml_corr:{'_'.join(sorted(symbol.upper() for symbol in symbols))}:{period}"
+
+
+def _corr_tag(symbol: str) -> str:
+    # set of the ml_corr keys a symbol takes part in
+    return f"ml_corr_index:{symbol.upper()}"
+
+
+def invalidate_symbols(symbols: List[str]) -> int:
+    """Drop the cached prices and analytics of these symbols after their price history changed."""
+    keys = [
+        key_fn(symbol, period)
+        for symbol in symbols
+        for period in PERIOD_MAP
+        for key_fn in (_price_cache_key, _risk_cache_key)
+    ]
+    deleted = cache.delete_many(keys)
+    deleted += cache.delete_tagged([_corr_tag(symbol) for symbol in symbols])
+    return deleted
+
+
+def _as_price_frame(cached) -> pd.DataFrame:
+    if isinstance(cached, pd.DataFrame):
+        return cached
+    # value written before the frame codec: dict of columns with string dates
+    df = pd.DataFrame(cached)
+    df["Date"] = pd.to_datetime(df["Date"])
+    return df.set_index("Date")
+
+
+def _matrix_price_history(symbol: str, period: str) -> Optional[pd.DataFrame]:
+    matrix = get_price_matrix()
+    # symbols whose price history changed since the matrix was built are skipped until it is rebuilt
+    if matrix is not None and matrix.serves(symbol):
+        return matrix.close_frame(symbol, period)
+    return None
+
+
 def _fetch_price_history(symbol: str, period: str) -> Optional[pd.DataFrame]:
-    """Fetch historical price data from Yahoo Finance with caching."""
-    cache_key = f"ml_prices:{symbol}:{period}"
-    cached = cache.get_cache(cache_key)
-    if cached is not None:
-        try:
-            df = pd.DataFrame(cached)
-            df["Date"] = pd.to_datetime(df["Date"])
-            df = df.set_index("Date")
-            return df
-        except Exception:
-            pass
+    """
+    Fetch historical price data, from the shared memory-mapped price matrix when the symbol is in it,
+    otherwise from Yahoo Finance with caching.
+    """
+    prices = _matrix_price_history(symbol, period)
+    if prices is not None:
+        return prices
 
+    cache_key = _price_cache_key(symbol, period)
     yf_period = PERIOD_MAP.get(period, "1y")
     ticker_symbol = f"{symbol.upper()}.IS"
 
+    def download():
+        df = yahoo.history(ticker_symbol, period=yf_period)
+        if df is None:
+            return None
+        # only closes are used; cached as a binary frame (see cache_codecs)
+        return df[["Close"]]
+
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        df = ticker.history(period=yf_period)
-        if df.empty:
+        # concurrent misses share one download
+        cached = cache.get_or_set(cache_key, download, ttl=ML_ANALYTICS_TTL)
+        if cached is None:
             logger.warning(f"No price data for {ticker_symbol} over {yf_period}")
             return None
-
-        # Cache the data (15 min TTL for ML data)
-        cache_data = df.reset_index().to_dict(orient="list")
-        cache.set_cache(cache_key, cache_data, ttl=900)
-        return df
+        return _as_price_frame(cached)
     except Exception as e:
         logger.error(f"Error fetching price history for {symbol}: {e}")
         return None
 
 
+def _fetch_price_histories(symbols: List[str], period: str) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Batch version of _fetch_price_history: symbols not in the price matrix are read from the cache
+    with one MGET, only the misses are downloaded one by one.
+    """
+    histories = {}
+    remaining = []
+    for symbol in dict.fromkeys(symbols):
+        prices = _matrix_price_history(symbol, period)
+        if prices is not None:
+            histories[symbol] = prices
+        else:
+            remaining.append(symbol)
+
+    cached = cache.get_many([_price_cache_key(symbol, period) for symbol in remaining])
+    for symbol in remaining:
+        value = cached.get(_price_cache_key(symbol, period))
+        histories[symbol] = _as_price_frame(value) if value is not None else _fetch_price_history(symbol, period)
+    return histories
+
+
 def _compute_daily_returns(prices: pd.DataFrame) -> pd.Series:
     """Compute daily log returns from closing prices."""
     return np.log(prices["Close"] / prices["Close"].shift(1)).dropna()
@@ -102,29 +176,7 @@ def compute_var_95(returns: pd.Series) -> Optional[float]:
 
 def compute_beta(returns: pd.Series, period: str) -> Optional[float]:
     """Beta relative to BIST 100 index (XU100.IS)."""
-    cache_key = f"ml_prices:XU100:{period}"
-    cached = cache.get_cache(cache_key)
-    market_df = None
-
-    if cached is not None:
-        try:
-            market_df = pd.DataFrame(cached)
-            market_df["Date"] = pd.to_datetime(market_df["Date"])
-            market_df = market_df.set_index("Date")
-        except Exception:
-            market_df = None
-
-    if market_df is None:
-        yf_period = PERIOD_MAP.get(period, "1y")
-        try:
-            market_df = yf.Ticker("XU100.IS").history(period=yf_period)
-            if not market_df.empty:
-                cache_data = market_df.reset_index().to_dict(orient="list")
-                cache.set_cache(cache_key, cache_data, ttl=900)
-        except Exception as e:
-            logger.error(f"Error fetching BIST100 data: {e}")
-            return None
-
+    market_df = _fetch_price_history(MARKET_SYMBOL, period)
     if market_df is None or market_df.empty:
         return None
 
@@ -144,7 +196,7 @@ def compute_beta(returns: pd.Series, period: str) -> Optional[float]:
 
 def get_risk_metrics(symbol: str, period: str = "1y") -> Dict:
     """Compute all risk metrics for a given stock symbol."""
-    cache_key = f"ml_risk:{symbol}:{period}"
+    cache_key = _risk_cache_key(symbol, period)
     cached = cache.get_cache(cache_key)
     if cached is not None:
         return cached
@@ -180,20 +232,29 @@ def get_risk_metrics(symbol: str, period: str = "1y") -> Dict:
         if isinstance(val, float):
             result[key] = round(val, 4)
 
-    cache.set_cache(cache_key, result, ttl=900)
+    cache.set_cache(cache_key, result, ttl=ML_ANALYTICS_TTL)
     return result
 
 
 def get_correlation_matrix(symbols: List[str], period: str = "1y") -> Dict:
     """Compute correlation matrix between multiple stocks."""
-    cache_key = f"ml_corr:{'_'.join(sorted(symbols))}:{period}"
+    cache_key = _corr_cache_key(symbols, period)
     cached = cache.get_cache(cache_key)
     if cached is not None:
         return cached
 
     returns_dict = {}
-    for symbol in symbols:
-        prices = _fetch_price_history(symbol, period)
+    remaining = symbols
+    matrix = get_price_matrix()
+    if matrix is not None:
+        # symbols in the matrix come out as one aligned block of precomputed returns
+        matrix_returns, remaining = matrix.returns_frame(symbols, period)
+        for symbol in matrix_returns.columns:
+            symbol_returns = matrix_returns[symbol].dropna()
+            if len(symbol_returns) > 0:
+                returns_dict[symbol] = symbol_returns
+
+    for symbol, prices in _fetch_price_histories(remaining, period).items():
         if prices is not None and len(prices) > 1:
             returns_dict[symbol] = _compute_daily_returns(prices)
 
@@ -233,7 +294,8 @@ def get_correlation_matrix(symbols: List[str], period: str = "1y") -> Dict:
         "data_points": len(returns_df),
     }
 
-    cache.set_cache(cache_key, result, ttl=900)
+    cache.set_cache(cache_key, result, ttl=ML_ANALYTICS_TTL)
+    cache.tag(cache_key, [_corr_tag(symbol) for symbol in symbols], ttl=ML_ANALYTICS_TTL)
     return result
 
 
@@ -256,12 +318,13 @@ def get_portfolio_risk(
     weights = []
     returns_list = []
     holding_risks = []
+    histories = _fetch_price_histories([symbol for symbol, _, _ in holdings], period)
 
     for symbol, qty, price in holdings:
         weight = (qty * price) / total_value
         weights.append(weight)
 
-        prices = _fetch_price_history(symbol, period)
+        prices = histories.get(symbol)
         if prices is not None and len(prices) > 1:
             rets = _compute_daily_returns(prices)
             returns_list.append(rets)
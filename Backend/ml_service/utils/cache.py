@@ -1,21 +1,109 @@
 import redis
-import json
 import os
 import logging
-from typing import Optional, Any
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Optional, Any, Callable, Dict, List
+
+from common import cache_codecs
+from common.cache_metrics import CacheMetrics, memory_footprint
 
 logger = logging.getLogger(__name__)
 
+# In-process tier in front of Redis: max entries and how long (seconds) an entry is served locally
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "512"))
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", "5"))
+# Longest time a single-flight fetch may take before waiting callers give up and fetch themselves
+SINGLE_FLIGHT_TIMEOUT = int(os.getenv("SINGLE_FLIGHT_TIMEOUT", "30"))
+
+# Release the single-flight lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LocalLRU:
+    """Thread-safe, size-bounded LRU with per-entry expiry. Values are shared, treat them as read-only."""
+
+    def __init__(self, max_size: int = LOCAL_CACHE_SIZE, ttl: float = LOCAL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + min(self.ttl, ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_matching(self, pattern: str):
+        with self._lock:
+            for key in [key for key in self._entries if fnmatchcase(key, pattern)]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[Exception] = None
+
+
 class RedisCache:
     def __init__(self):
+        self.local = LocalLRU()
+        self._inflight: Dict[str, _Flight] = {}
+        self._inflight_lock = threading.Lock()
+        self._stats = {
+            "local": {"hits": 0, "misses": 0},
+            "redis": {"hits": 0, "misses": 0},
+            "single_flight": {"fetches": 0, "coalesced": 0},
+        }
+        self._stats_lock = threading.Lock()
+        # per-namespace hits, latency and value sizes (see cache_metrics)
+        self.metrics = CacheMetrics()
+
         redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
         try:
             self.redis_client = redis.from_url(redis_url, decode_responses=True)
             self.redis_client.ping()
+            # cached values are binary (see cache_codecs); locks and counters stay on the text client
+            self.binary_client = redis.from_url(redis_url)
             logger.info("ML Service connected to Redis cache")
         except Exception as e:
             logger.warning(f"Redis connection failed: {e}. Cache will be disabled.")
             self.redis_client = None
+            self.binary_client = None
 
     def _is_connected(self) -> bool:
         return self.redis_client is not None
@@ -24,23 +112,266 @@ class RedisCache:
         if not self._is_connected():
             return False
         try:
-            json_value = json.dumps(value, default=str)
-            self.redis_client.setex(key, ttl, json_value)
+            started = time.perf_counter()
+            payload = cache_codecs.encode(value)
+            self.binary_client.setex(key, ttl, payload)
+            self.metrics.record_set({key: len(payload)}, time.perf_counter() - started)
+            self.local.set(key, value, ttl)
             return True
         except Exception as e:
+            self.metrics.record_error([key])
             logger.error(f"Cache set error for key {key}: {e}")
             return False
 
     def get_cache(self, key: str) -> Optional[Any]:
         if not self._is_connected():
             return None
+
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local", "hits")
+            self.metrics.local_hit(key)
+            return value
+        self._count("local", "misses")
+
         try:
-            cached_value = self.redis_client.get(key)
+            started = time.perf_counter()
+            cached_value = self.binary_client.get(key)
+            self.metrics.record_get([key], [bool(cached_value)], time.perf_counter() - started)
             if cached_value:
-                return json.loads(cached_value)
+                value = cache_codecs.decode(cached_value)
+                self._count("redis", "hits")
+                self.local.set(key, value)
+                return value
+            self._count("redis", "misses")
             return None
         except Exception as e:
+            self.metrics.record_error([key])
             logger.error(f"Cache get error for key {key}: {e}")
             return None
 
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Values of several keys (local tier first, the rest with one MGET); missing keys are left out."""
+        if not self._is_connected() or not keys:
+            return {}
+
+        result = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                result[key] = value
+                self.metrics.local_hit(key)
+            else:
+                remote_keys.append(key)
+        self._count("local", "hits", len(result))
+        self._count("local", "misses", len(remote_keys))
+        if not remote_keys:
+            return result
+
+        try:
+            started = time.perf_counter()
+            cached_values = self.binary_client.mget(remote_keys)
+            self.metrics.record_get(remote_keys, [bool(v) for v in cached_values], time.perf_counter() - started)
+        except Exception as e:
+            self.metrics.record_error(remote_keys)
+            logger.error(f"Cache mget error for {len(remote_keys)} keys: {e}")
+            return result
+
+        for key, cached_value in zip(remote_keys, cached_values):
+            if not cached_value:
+                self._count("redis", "misses")
+                continue
+            try:
+                result[key] = cache_codecs.decode(cached_value)
+                self._count("redis", "hits")
+                self.local.set(key, result[key])
+            except Exception as e:
+                self.metrics.record_error([key])
+                logger.error(f"Cache decode error for key {key}: {e}")
+        return result
+
+    def set_many(self, values: Dict[str, Any], ttl: int = 900) -> bool:
+        """Set several values with one pipelined round trip of SETEX commands."""
+        if not self._is_connected() or not values:
+            return False
+        try:
+            started = time.perf_counter()
+            pipe = self.binary_client.pipeline(transaction=False)
+            sizes = {}
+            for key, value in values.items():
+                payload = cache_codecs.encode(value)
+                pipe.setex(key, ttl, payload)
+                sizes[key] = len(payload)
+            pipe.execute()
+            self.metrics.record_set(sizes, time.perf_counter() - started)
+            for key, value in values.items():
+                self.local.set(key, value, ttl)
+            return True
+        except Exception as e:
+            self.metrics.record_error(values)
+            logger.error(f"Cache set_many error for {len(values)} keys: {e}")
+            return False
+
+    def delete_many(self, keys: List[str]) -> int:
+        """Delete exact keys with one UNLINK (no SCAN needed). Returns the number of keys deleted."""
+        for key in keys:
+            self.local.delete(key)
+        if not self._is_connected() or not keys:
+            return 0
+        try:
+            return self.redis_client.unlink(*keys)
+        except Exception as e:
+            logger.error(f"Cache delete error for {len(keys)} keys: {e}")
+            return 0
+
+    def evict_local(self, keys: List[str]):
+        """Drop keys from this process's local tier only, e.g. after another service rewrote them."""
+        for key in keys:
+            self.local.delete(key)
+
+    def tag(self, key: str, tags: List[str], ttl: int):
+        """
+        Record key in the set of every tag, so all keys of a tag can be deleted with delete_tagged
+        without scanning. The tag sets expire with the key they were last extended for.
+        """
+        if not self._is_connected() or not tags:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for tag in tags:
+                pipe.sadd(tag, key)
+                pipe.expire(tag, ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache tag error for key {key}: {e}")
+
+    def delete_tagged(self, tags: List[str]) -> int:
+        """Delete every key recorded under the tags, and the tag sets themselves."""
+        if not self._is_connected() or not tags:
+            return 0
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for tag in tags:
+                pipe.smembers(tag)
+            keys = set().union(*pipe.execute())
+        except Exception as e:
+            logger.error(f"Cache tag lookup error for {len(tags)} tags: {e}")
+            return 0
+        return self.delete_many(sorted(keys) + list(tags))
+
+    def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        """
+        Delete every key matching a Redis glob pattern. Keys are found with SCAN (never KEYS, which blocks
+        Redis) and removed with UNLINK in batches. Returns the number of keys deleted.
+        """
+        if not self._is_connected():
+            return 0
+
+        self.local.delete_matching(pattern)
+        deleted = 0
+        try:
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self.redis_client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += self.redis_client.unlink(*batch)
+        except Exception as e:
+            logger.error(f"Cache delete error for pattern {pattern}: {e}")
+        return deleted
+
+    def get_or_set(self, key: str, fetch: Callable[[], Any], ttl: int = 900) -> Any:
+        """
+        Cached value of key, or the result of fetch() stored for ttl seconds. Concurrent misses of
+        the same key share one fetch, in this process and across workers (Redis lock).
+        None results are not cached.
+        """
+        value = self.get_cache(key)
+        if value is not None:
+            return value
+
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            self._count("single_flight", "coalesced")
+            if flight.done.wait(SINGLE_FLIGHT_TIMEOUT) and flight.error is None:
+                return flight.value
+            return fetch()
+
+        try:
+            flight.value = self._fetch_once(key, fetch, ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _fetch_once(self, key: str, fetch: Callable[[], Any], ttl: int) -> Any:
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self._is_connected() and self.redis_client.set(lock_key, token, nx=True, ex=SINGLE_FLIGHT_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Single-flight lock error for key {key}: {e}")
+            acquired = False
+
+        if self._is_connected() and not acquired:
+            # another worker is fetching the same key, wait for its result
+            self._count("single_flight", "coalesced")
+            deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = self.get_cache(key)
+                if value is not None:
+                    return value
+                try:
+                    if not self.redis_client.exists(lock_key):
+                        break
+                except Exception:
+                    break
+
+        try:
+            self._count("single_flight", "fetches")
+            value = fetch()
+            if value is not None:
+                self.set_cache(key, value, ttl)
+            return value
+        finally:
+            if acquired:
+                try:
+                    self.redis_client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.error(f"Single-flight unlock error for key {key}: {e}")
+
+    def memory_footprint(self, sample_size: int = 1000) -> dict:
+        """Sampled Redis memory per key namespace (see cache_metrics.memory_footprint)."""
+        if not self._is_connected():
+            return {}
+        try:
+            return memory_footprint(self.redis_client, sample_size)
+        except Exception as e:
+            logger.error(f"Cache memory sampling error: {e}")
+            return {"error": str(e)}
+
+    def _count(self, tier: str, counter: str, amount: int = 1):
+        if amount:
+            with self._stats_lock:
+                self._stats[tier][counter] += amount
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._stats_lock:
+            stats = {tier: dict(counters) for tier, counters in self._stats.items()}
+        stats["local"]["size"] = len(self.local)
+        return stats
+
 cache = RedisCache()
@@ -0,0 +1,302 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from sqlalchemy import text
+
+from utils.db_context import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PRICE_MATRIX_DIR = os.getenv("PRICE_MATRIX_DIR", "/tmp/ml_price_matrix")
+# Rebuild the matrix once it is older than this (default: 6 hours)
+PRICE_MATRIX_MAX_AGE = int(os.getenv("PRICE_MATRIX_MAX_AGE", "21600"))
+# After a price_history invalidation the matrix is rebuilt early, but not more often than this
+PRICE_MATRIX_MIN_AGE = int(os.getenv("PRICE_MATRIX_MIN_AGE", "300"))
+# Longest analysis period supported by the API, every shorter one is a slice of it
+PRICE_MATRIX_PERIOD = "5y"
+# BIST 100 index, needed for beta
+MARKET_SYMBOL = "XU100"
+
+CURRENT_LINK = "current"
+BUILD_LOCK = ".build.lock"
+# touched on every price_history invalidation: a matrix whose build started before it is rebuilt
+STALE_MARKER = ".stale"
+
+PERIOD_OFFSETS = {
+    "1m": pd.DateOffset(months=1),
+    "3m": pd.DateOffset(months=3),
+    "6m": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "3y": pd.DateOffset(years=3),
+    "5y": pd.DateOffset(years=5),
+}
+
+
+class PriceMatrix:
+    """
+    Read-only, memory-mapped view of one published matrix version.
+
+    close and returns are float64 arrays of shape (symbols, dates), so the full history of one
+    symbol is a contiguous row and slicing it by period never copies. Every worker process maps
+    the same files, so the OS page cache holds a single copy of the data.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.symbols: List[str] = meta["symbols"]
+        self.built_at: str = meta["built_at"]
+        # epoch seconds the download started; 0 for versions written before it was recorded
+        self.started_at: float = meta.get("started_at", 0)
+        self._rows: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        self.dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+        self.close = np.load(os.path.join(path, "close.npy"), mmap_mode="r")
+        self.returns = np.load(os.path.join(path, "returns.npy"), mmap_mode="r")
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._rows
+
+    def serves(self, symbol: str) -> bool:
+        """True when the symbol is in the matrix and its price history did not change since the build started."""
+        symbol = symbol.upper()
+        return symbol in self._rows and _stale_symbols.get(symbol, 0) <= self.started_at
+
+    def _start_index(self, period: str) -> int:
+        offset = PERIOD_OFFSETS.get(period, PERIOD_OFFSETS["1y"])
+        cutoff = (pd.Timestamp.today().normalize() - offset).to_datetime64().astype("datetime64[D]")
+        return int(np.searchsorted(self.dates, cutoff, side="left"))
+
+    def close_frame(self, symbol: str, period: str) -> Optional[pd.DataFrame]:
+        """Closing prices of one symbol over a period, shaped like the yfinance history frame ("Close" column)."""
+        if not self.serves(symbol):
+            return None
+        row = self._rows[symbol.upper()]
+
+        start = self._start_index(period)
+        closes = self.close[row, start:]
+        # skip the days before the stock was listed; still a view, no copy
+        valid = ~np.isnan(closes)
+        if not valid.any():
+            return None
+        first = int(np.argmax(valid))
+        closes = closes[first:]
+        index = pd.DatetimeIndex(self.dates[start + first:], name="Date")
+        return pd.DataFrame({"Close": closes}, index=index, copy=False)
+
+    def returns_frame(self, symbols: List[str], period: str) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Daily log returns of several symbols over a period as one date-aligned frame (NaN where a symbol
+        has no data). Returns the frame and the symbols that were not in the matrix (or are stale in it).
+        """
+        present = [symbol for symbol in symbols if self.serves(symbol)]
+        missing = [symbol for symbol in symbols if not self.serves(symbol)]
+
+        # returns[t] is log(close[t] / close[t-1]), so the first in-period return starts one day later,
+        # which matches computing the returns from the period's closing prices
+        start = self._start_index(period) + 1
+        rows = [self._rows[symbol.upper()] for symbol in present]
+        block = np.take(self.returns[:, start:], rows, axis=0)
+        frame = pd.DataFrame(block.T, index=pd.DatetimeIndex(self.dates[start:], name="Date"), columns=present)
+        return frame, missing
+
+
+_matrix: Optional[PriceMatrix] = None
+_matrix_target: Optional[str] = None
+# symbol -> epoch seconds its price history was last invalidated in this process; the symbol is not
+# served from a matrix whose build started before that
+_stale_symbols: Dict[str, float] = {}
+
+
+def mark_stale(symbols: List[str], root: str = PRICE_MATRIX_DIR):
+    """
+    Handler of the price_history invalidation event: stop serving these symbols from the current matrix
+    and have the next rebuild_if_stale check (in whichever worker) rebuild it.
+    """
+    now = time.time()
+    for symbol in symbols:
+        _stale_symbols[symbol.upper()] = now
+    try:
+        os.makedirs(root, exist_ok=True)
+        marker = os.path.join(root, STALE_MARKER)
+        with open(marker, "a"):
+            pass
+        os.utime(marker, (now, now))
+    except OSError as e:
+        logger.error(f"Could not mark the price matrix stale: {e}")
+
+
+def stale_symbols() -> List[str]:
+    """Symbols currently skipped in the mapped matrix until it is rebuilt."""
+    started_at = _matrix.started_at if _matrix is not None else 0
+    return sorted(symbol for symbol, marked_at in list(_stale_symbols.items()) if marked_at > started_at)
+
+
+def get_price_matrix() -> Optional[PriceMatrix]:
+    """Return the currently published matrix, re-mapping it when a rebuild swapped in a new version."""
+    global _matrix, _matrix_target
+    link = os.path.join(PRICE_MATRIX_DIR, CURRENT_LINK)
+    try:
+        target = os.readlink(link)
+    except OSError:
+        return None
+
+    if target != _matrix_target:
+        try:
+            _matrix = PriceMatrix(os.path.join(PRICE_MATRIX_DIR, target))
+            _matrix_target = target
+            # the new version has the prices of everything invalidated before its build started
+            for symbol, marked_at in list(_stale_symbols.items()):
+                if marked_at <= _matrix.started_at:
+                    _stale_symbols.pop(symbol, None)
+        except Exception as e:
+            logger.error(f"Could not open price matrix {target}: {e}")
+            return _matrix
+    return _matrix
+
+
+def _save_array(path: str, array: np.ndarray):
+    with open(path, "wb") as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def build_price_matrix(symbols: List[str], root: str = PRICE_MATRIX_DIR) -> str:
+    """
+    Download the 5-year close history of all symbols in one request and publish it as a new matrix version.
+
+    The arrays are written into a fresh version directory, and only then the `current` symlink is
+    atomically replaced, so readers either keep the old version or see the complete new one.
+    """
+    symbols = sorted({symbol.upper() for symbol in symbols})
+    if not symbols:
+        raise ValueError("No symbols to build the price matrix from")
+    started_at = time.time()
+
+    data = yf.download(
+        [f"{symbol}.IS" for symbol in symbols],
+        period=PRICE_MATRIX_PERIOD,
+        interval="1d",
+        group_by="column",
+        progress=False,
+        threads=True,
+    )
+    if data.empty:
+        raise ValueError("No price data returned for the price matrix")
+
+    closes = data["Close"]
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(name=f"{symbols[0]}.IS")
+    if closes.index.tz is not None:
+        closes.index = closes.index.tz_localize(None)
+    closes = closes.sort_index()
+    closes.columns = [str(column)[:-3] if str(column).endswith(".IS") else str(column) for column in closes.columns]
+    closes = closes.dropna(axis=1, how="all")
+
+    close = np.ascontiguousarray(closes.to_numpy(dtype=np.float64).T)
+    returns = np.full_like(close, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[:, 1:] = np.log(close[:, 1:] / close[:, :-1])
+    dates = closes.index.values.astype("datetime64[D]")
+
+    os.makedirs(root, exist_ok=True)
+    version = f"v{int(time.time() * 1000)}-{os.getpid()}"
+    version_dir = os.path.join(root, version)
+    os.makedirs(version_dir)
+
+    _save_array(os.path.join(version_dir, "dates.npy"), dates)
+    _save_array(os.path.join(version_dir, "close.npy"), close)
+    _save_array(os.path.join(version_dir, "returns.npy"), returns)
+    with open(os.path.join(version_dir, "meta.json"), "w") as f:
+        json.dump(
+            {"symbols": list(closes.columns), "built_at": datetime.utcnow().isoformat(), "started_at": started_at}, f
+        )
+        f.flush()
+        os.fsync(f.fileno())
+
+    # swap: create the new link under a temporary name, then rename it over `current`
+    tmp_link = os.path.join(root, f".{CURRENT_LINK}-{os.getpid()}")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, os.path.join(root, CURRENT_LINK))
+
+    _remove_old_versions(root, keep={version})
+    logger.info(f"Price matrix {version} published: {len(closes.columns)} symbols x {len(dates)} days")
+    return version_dir
+
+
+def _remove_old_versions(root: str, keep: set):
+    # readers that still map an old version keep working after the files are unlinked,
+    # but keep the previous version too so a reader that just resolved the link can still open it
+    versions = sorted(name for name in os.listdir(root) if name.startswith("v"))
+    keep = set(keep) | set(versions[-2:])
+    for name in versions:
+        if name not in keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _matrix_age_seconds(root: str) -> Optional[float]:
+    try:
+        return time.time() - os.lstat(os.path.join(root, CURRENT_LINK)).st_mtime
+    except OSError:
+        return None
+
+
+def _invalidated_since_build(root: str) -> bool:
+    # a price_history invalidation arrived after the current version's download started
+    try:
+        marked_at = os.stat(os.path.join(root, STALE_MARKER)).st_mtime
+        with open(os.path.join(root, CURRENT_LINK, "meta.json")) as f:
+            started_at = json.load(f).get("started_at", 0)
+    except (OSError, ValueError):
+        return False
+    return marked_at > started_at
+
+
+def _load_symbols() -> List[str]:
+    db = SessionLocal()
+    try:
+        rows = db.execute(text("SELECT stock_symbol FROM stocks")).fetchall()
+        return [row[0] for row in rows] + [MARKET_SYMBOL]
+    finally:
+        db.close()
+
+
+def rebuild_if_stale(root: str = PRICE_MATRIX_DIR, max_age: int = PRICE_MATRIX_MAX_AGE) -> bool:
+    """
+    Rebuild the matrix when it is missing or older than max_age, or older than PRICE_MATRIX_MIN_AGE and
+    invalidated by a price_history event since its build started. A file lock makes sure only one worker process builds at a time; the others return immediately.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, BUILD_LOCK), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        try:
+            age = _matrix_age_seconds(root)
+            if age is not None and age < max_age:
+                if age < PRICE_MATRIX_MIN_AGE or not _invalidated_since_build(root):
+                    return False
+            build_price_matrix(_load_symbols(), root)
+            return True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+if __name__ == "__main__":
+    # manual rebuild: python -m utils.price_matrix
+    logging.basicConfig(level=logging.INFO)
+    print(build_price_matrix(_load_symbols()))
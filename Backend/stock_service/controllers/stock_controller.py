@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+import json
+import math
 from decimal import Decimal
 from datetime import date
-from typing import List, Optional
-from utils.db_context import get_db
-from services.stock_service import StockService
+from typing import Dict, List, Optional
+from utils.db_context import get_db, get_read_db
+from services.stock_service import StockService, stream_stock_details
+from services.async_stock_service import AsyncStockService
+from services.job_runner import job_runner
+from services.onboarding_service import start_onboarding
+from services.fundamentals_service import refresh_fundamentals
 from models.models import *
 from models.pydantic_models import *  # includes OHLCResponse
 from utils.authentication_utils import verify_role # this function checks the token and returns the username if the token is legit
@@ -24,6 +31,9 @@ router = APIRouter(
 def get_stocks_with_prices(
     page: int = 1,
     limit: int = 10,
+    sort: str = "symbol",
+    order: str = "asc",
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -33,50 +43,42 @@ def get_stocks_with_prices(
     Results are cached for better performance.
 
     Query Parameters:
-    - page: Page number (default: 1)
+    - page: Page number (default: 1), only used for the page info and when no cursor is given
     - limit: Items per page (default: 10)
+    - sort: symbol, market_cap or price_change (default: symbol)
+    - order: asc or desc (default: asc)
+    - cursor: next_cursor of the previous page; keyset pagination, deep pages cost the same as the first
 
-    Returns paginated response with total count and page info.
+    Returns paginated response with total count, page info and the cursor of the next page.
     """
     service = StockService(db)
 
-    # Get total count
-    total = db.query(Stock).count()
+    try:
+        # sector is loaded in the same query
+        stocks, next_cursor = service.get_stocks_page(sort=sort, order=order, limit=limit, cursor=cursor, page=page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Calculate offset
-    offset = (page - 1) * limit
+    # Get total count (cached)
+    total = service.count_stocks()
 
-    # Get stocks for this page
-    stocks = db.query(Stock).offset(offset).limit(limit).all()
+    # Get current prices for the whole page at once: one Redis round trip plus one Yahoo download for the misses
+    quotes = service.get_current_quotes([stock.stock_symbol for stock in stocks])
 
     result = []
     for stock in stocks:
-        try:
-            # Get current price from cache first, then Yahoo Finance
-            current_price = service.get_current_stock_price(stock.stock_symbol)
-
-            # Get sector name
-            sector_name = stock.sector.name if stock.sector else "Unknown"
-
-            result.append(StockWithPriceResponse(
-                stock_symbol=stock.stock_symbol,
-                name=stock.name,
-                sector=sector_name,
-                market_cap=stock.market_cap,
-                current_price=current_price,
-                last_updated=stock.last_updated
-            ))
-        except Exception as e:
-            print(f"Error fetching price for {stock.stock_symbol}: {e}")
-            # Still include stock even if price fetch fails
-            result.append(StockWithPriceResponse(
-                stock_symbol=stock.stock_symbol,
-                name=stock.name,
-                sector=stock.sector.name if stock.sector else "Unknown",
-                market_cap=stock.market_cap,
-                current_price=None,
-                last_updated=stock.last_updated
-            ))
+        quote = quotes[stock.stock_symbol.upper()]
+        result.append(StockWithPriceResponse(
+            stock_symbol=stock.stock_symbol,
+            name=stock.name,
+            sector=stock.sector.name if stock.sector else "Unknown",
+            market_cap=stock.market_cap,
+            current_price=quote.value,
+            price_change_pct=stock.price_change_pct,
+            last_updated=stock.last_updated,
+            stale=quote.stale,
+            as_of=quote.as_of
+        ))
 
     # Calculate total pages
     total_pages = (total + limit - 1) // limit
@@ -86,7 +88,8 @@ def get_stocks_with_prices(
         total=total,
         page=page,
         pages=total_pages,
-        limit=limit
+        limit=limit,
+        next_cursor=next_cursor
     )
 
 
@@ -116,16 +119,17 @@ def get_user_portfolios(user_id: int, db: Session = Depends(get_db)):
 
 # to return holdings in a portfolio : get_portfolio_holdings
 @router.get("/portfolios/{portfolio_id}/holdings", response_model=List[HoldingResponse])
-def get_portfolio_holdings(portfolio_id: int, db: Session = Depends(get_db)):
-    service = StockService(db)
-    holdings = service.get_portfolio_holdings(portfolio_id)
+async def get_portfolio_holdings(portfolio_id: int, db=Depends(get_read_db)):
+    service = AsyncStockService(db)
+    holdings = await service.get_portfolio_holdings(portfolio_id)
     if not holdings:
         raise HTTPException(status_code=404, detail="No holdings found in this portfolio")
     return holdings
 
 # to add a holding to a portfolio with the given id
+# plain def: the sync db calls run in the threadpool instead of blocking the event loop
 @router.post("/portfolios/{portfolio_id}/add/holdings", response_model=HoldingResponse)
-async def add_holding(
+def add_holding(
     portfolio_id: int,
     holding: HoldingCreate,
     db: Session = Depends(get_db)
@@ -168,17 +172,30 @@ def delete_holding(holding_id: int, db: Session = Depends(get_db)):
 # it takes the stock symbol as input and returns the stock object as output if the stock is successfully added
 # uses yahoo finance for additional info
 @router.post("/", response_model=StockResponse)
-async def create_stock(stock_symbol: str, db: Session = Depends(get_db), username: str = Depends(verify_role)):
+def create_stock(stock_symbol: str, db: Session = Depends(get_db), username: str = Depends(verify_role)):
     service = StockService(db)
     existing_stock = service.get_stock(stock_symbol)
     if existing_stock:
         raise HTTPException(status_code=400, detail="Stock already exists")
     return service.create_stock(stock_symbol)
 
+# bulk version of create_stock: the symbols are onboarded by a background job with bounded concurrency
+# returns immediately with the job id, progress is polled from /onboarding/jobs/{job_id}
+@router.post("/onboarding/jobs", response_model=JobResponse, status_code=202)
+def create_onboarding_job(request: OnboardingRequest, db: Session = Depends(get_db), username: str = Depends(verify_role)):
+    return start_onboarding(db, request.symbols, submitted_by=username)
+
+@router.get("/onboarding/jobs/{job_id}", response_model=JobResponse)
+def get_onboarding_job(job_id: str, username: str = Depends(verify_role)):
+    job = job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/{symbol}", response_model=StockResponse)
-def get_stock(symbol: str, db: Session = Depends(get_db)):
-    service = StockService(db)
-    stock = service.get_stock(symbol)
+async def get_stock(symbol: str, db=Depends(get_read_db)):
+    service = AsyncStockService(db)
+    stock = await service.get_stock(symbol)
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
     return stock
@@ -217,19 +234,24 @@ example output:
 {   
     "stock_symbol": "AAPL",
     "date": "2021-01-04",
-    "close_price": 129.41
+    "close_price": 129.41,
+    "stale": false,
+    "as_of": "2021-01-04T10:15:00Z"
 }
+stale is true when the price is older than its cache TTL (Yahoo Finance unreachable), as_of is when it was fetched
 """
 @router.get("/{symbol}/price", response_model=StockPriceResponse)
 def get_current_stock_price(symbol: str, db: Session = Depends(get_db)):
     stock_service = StockService(db)
-    price = stock_service.get_current_stock_price(symbol)
-    if price is None:
+    quote = stock_service.get_current_stock_quote(symbol)
+    if quote.value is None:
         raise HTTPException(status_code=404, detail="Stock price not found")
     return StockPriceResponse(
         stock_symbol=symbol.upper(),
-        date=date.today().isoformat(),
-        close_price=price
+        date=(quote.as_of.date() if quote.stale else date.today()).isoformat(),
+        close_price=quote.value,
+        stale=quote.stale,
+        as_of=quote.as_of,
     )
 
 
@@ -300,12 +322,41 @@ def get_predefined_stock_prices(symbol: str, db: Session = Depends(get_db)):
 
     return response
 
+# same as above but for many stocks in one request, used by the stock list page
+"""
+example request:
+{
+    "symbols": ["THYAO", "AGHOL"]
+}
+example response:
+{
+    "THYAO": [{"stock_symbol": "THYAO", "date": "2025-01-20", "close_price": 285.75}, ...],
+    "AGHOL": [...]
+}
+"""
+@router.post("/prices/predefined", response_model=Dict[str, List[StockPriceResponse]])
+def get_predefined_stock_prices_bulk(request: PredefinedPricesRequest, db: Session = Depends(get_db)):
+    stock_service = StockService(db)
+    prices_by_symbol = stock_service.get_prices_in_predefined_dates(request.symbols)
+
+    return {
+        symbol: [
+            StockPriceResponse(
+                stock_symbol=price.stock_symbol,
+                date=price.date.isoformat(),
+                close_price=price.close_price
+            )
+            for price in prices
+        ]
+        for symbol, prices in prices_by_symbol.items()
+    }
+
 # Retrieve the income statement data for a given stock symbol
 # Endpoint to return all financial data for a given stock symbol
 @router.get("/financials/{symbol}", response_model=List[IncomeStatementResponse])
-def get_financial_data(symbol: str, db: Session = Depends(get_db)):
-    stock_service = StockService(db)
-    financials = stock_service.get_financial_data(symbol)
+async def get_financial_data(symbol: str, db=Depends(get_read_db)):
+    stock_service = AsyncStockService(db)
+    financials = await stock_service.get_financial_data(symbol)
     if not financials:
         raise HTTPException(status_code=404, detail="Financial data not found")
     
@@ -329,9 +380,9 @@ def get_financial_data(symbol: str, db: Session = Depends(get_db)):
 
 # Endpoint to return all balance sheet data for a given stock symbol
 @router.get("/balance-sheet/{symbol}", response_model=List[BalanceSheetResponse])
-def get_balance_sheet_data(symbol: str, db: Session = Depends(get_db)):
-    stock_service = StockService(db)
-    balance_sheets = stock_service.get_balance_sheet_data(symbol)
+async def get_balance_sheet_data(symbol: str, db=Depends(get_read_db)):
+    stock_service = AsyncStockService(db)
+    balance_sheets = await stock_service.get_balance_sheet_data(symbol)
     if not balance_sheets:
         raise HTTPException(status_code=404, detail="Balance sheet data not found")
     
@@ -354,9 +405,9 @@ def get_balance_sheet_data(symbol: str, db: Session = Depends(get_db)):
 
 # Endpoint to return all cash flow data for a given stock symbol
 @router.get("/cash-flow/{symbol}", response_model=List[CashFlowResponse])
-def get_cash_flow_data(symbol: str, db: Session = Depends(get_db)):
-    stock_service = StockService(db)
-    cash_flows = stock_service.get_cash_flow_data(symbol)
+async def get_cash_flow_data(symbol: str, db=Depends(get_read_db)):
+    stock_service = AsyncStockService(db)
+    cash_flows = await stock_service.get_cash_flow_data(symbol)
     if not cash_flows:
         raise HTTPException(status_code=404, detail="Cash flow data not found")
     
@@ -417,6 +468,17 @@ def add_dividend_to_db(request: DividendRequest, db: Session = Depends(get_db)):
     return {"message": "Dividend added successfully"}
 
 
+# refreshes income statements, balance sheets, cash flows and dividends in a background job
+# (all stocks in the db if no symbols are given); progress is polled from /onboarding/jobs/{job_id}
+@router.post("/fundamentals/refresh", response_model=JobResponse, status_code=202)
+def refresh_fundamentals_job(request: FundamentalsRefreshRequest, db: Session = Depends(get_db), username: str = Depends(verify_role)):
+    if request.symbols:
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in request.symbols))
+    else:
+        symbols = [row[0] for row in db.query(Stock.stock_symbol).all()]
+    return job_runner.submit("fundamentals", symbols, refresh_fundamentals, submitted_by=username)
+
+
 # ENDPOINT FOR SEARCHING STOCKS
 @router.get("/search/{query}", response_model=List[StockResponse])
 def search_stocks(query, db: Session = Depends(get_db)):
@@ -442,6 +504,12 @@ def get_stocks_in_sector(sector: str, db: Session = Depends(get_db)):
     return stocks
 
 
+# aggregates of every sector (company count, total / median market cap, top companies) for the sector dashboard
+@router.get("/sector-stats/all")
+def get_all_sector_stats(db: Session = Depends(get_db)):
+    service = StockService(db)
+    return service.get_all_sector_stats()
+
 """
     here is an example request: http://localhost:8001/api/stocks/sector-info/1
     here is an example response:
@@ -488,10 +556,22 @@ def get_sector_info(sector_id: int, db: Session = Depends(get_db)):
 
 
 # GET ALL THE STOCKS IN THE DB -> DETAİLED İNFO USING YAHOO FİNANCE
+# streamed as NDJSON (one stock info per line): cached stocks first, the rest as soon as yahoo answers
 @router.get("/stocks-all/{symbol}")
 def get_all_stocks(db: Session = Depends(get_db)):
-    service = StockService(db)
-    return service.get_all_stocks_in_detail()
+    symbols = [row[0] for row in db.query(Stock.stock_symbol).all()]
+    # the stream can take a while, do not hold the db connection for it
+    db.close()
+    lines = (_ndjson_line(info) for info in stream_stock_details(symbols))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+def _ndjson_line(info: dict) -> str:
+    # yahoo info may contain NaN / inf, which is not valid JSON
+    cleaned = {
+        key: None if isinstance(value, float) and not math.isfinite(value) else value
+        for key, value in info.items()
+    }
+    return json.dumps(cleaned, default=str) + "\n"
 
 # to return the sector of the given stock by symbol
 @router.get("/sector/{symbol}")
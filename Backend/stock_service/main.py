@@ -4,7 +4,7 @@ import logging
 import uvicorn
 
 # Third-party imports
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from sqlalchemy import text
@@ -13,7 +13,13 @@ from sqlalchemy.orm import Session
 # Local application imports
 from controllers.stock_controller import router as stock_router
 from models.models import Base
-from utils.db_context import engine, get_db
+from services.job_runner import job_runner
+from services.quote_refresher import quote_refresher, QUOTE_REFRESH_ENABLED
+from utils.db_context import SessionLocal, dispose_async_engine, engine, get_db
+from utils.cache import cache
+from common.invalidation import invalidation_subscriber
+from utils.search_index import search_index
+from common.yahoo_client import yahoo
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +49,35 @@ app.add_middleware(
 # Include routers
 app.include_router(stock_router)
 
+def _evict_local_quotes(symbols):
+    # the new prices are already in Redis; only this worker's local copies can be older
+    cache.evict_local([f"stock_price:{symbol}.IS" for symbol in symbols])
+
+invalidation_subscriber.on("quote", _evict_local_quotes)
+
+# Keep the quote cache warm in the background (only the leader worker actually refreshes),
+# listen for cache invalidations and load the search index
+@app.on_event("startup")
+async def startup_event():
+    invalidation_subscriber.start()
+    if QUOTE_REFRESH_ENABLED:
+        quote_refresher.start()
+    # build the typeahead index up front; if the db is not reachable yet the first search builds it
+    db = SessionLocal()
+    try:
+        search_index.rebuild(db)
+    except Exception as e:
+        logger.warning(f"Search index not built at startup: {e}")
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await quote_refresher.stop()
+    invalidation_subscriber.stop()
+    job_runner.shutdown()
+    await dispose_async_engine()
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -71,8 +106,24 @@ async def health_check(db: Session = Depends(get_db)):
             health["redis"] = "connected"
     except Exception as e:
         health["redis"] = str(e)
+    health["quote_refresher"] = quote_refresher.status()
+    health["cache"] = cache.stats()
+    # an open breaker degrades quotes but the service keeps serving cached data, so it stays healthy
+    health["yahoo"] = yahoo.status()
+    health["invalidation"] = invalidation_subscriber.status()
     status_code = 200 if health["status"] == "healthy" else 503
     return JSONResponse(status_code=status_code, content=health)
 
+@app.get("/cache/metrics")
+def cache_metrics(memory: bool = False, sample_size: int = Query(1000, ge=1, le=100000)):
+    """
+    Per-namespace cache hits, misses, errors, latency and value sizes of this worker.
+    With memory=true, Redis is also sampled for the memory each namespace takes.
+    """
+    metrics = {"tiers": cache.stats(), "namespaces": cache.metrics.snapshot()}
+    if memory:
+        metrics["memory"] = cache.memory_footprint(sample_size)
+    return metrics
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, DECIMAL, FLOAT, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Date, DECIMAL, FLOAT, Enum, Index, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from utils.db_context import Base
@@ -25,14 +25,36 @@ class Sector(Base):
     
     stocks = relationship("Stock", back_populates="sector")
 
+class SectorStats(Base):
+    """Aggregates of a sector, recomputed whenever one of its stocks is added or its market cap changes"""
+    __tablename__ = "sector_stats"
+
+    sector_id = Column(Integer, ForeignKey('sectors.sector_id'), primary_key=True)
+    company_count = Column(Integer, nullable=False, default=0)
+    total_market_cap = Column(DECIMAL(24, 2), nullable=False, default=0)
+    median_market_cap = Column(DECIMAL(20, 2))
+    top_companies = Column(JSON)  # largest stocks by market cap, biggest first
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    sector = relationship("Sector")
+
 class Stock(Base):
     __tablename__ = "stocks"
+    __table_args__ = (
+        # keyset pagination of the stock list
+        Index("idx_stocks_market_cap_symbol", "market_cap", "stock_symbol"),
+        Index("idx_stocks_price_change_symbol", "price_change_pct", "stock_symbol"),
+    )
     
     stock_symbol = Column(String(10), primary_key=True)
     name = Column(String(255), nullable=False)
     sector_id = Column(Integer, ForeignKey('sectors.sector_id'), nullable=False)
     market_cap = Column(DECIMAL(20, 2))
     last_updated = Column(DateTime, default=datetime.utcnow)
+    # latest quote, kept up to date by the quote refresher; used to sort the stock list by price change
+    last_price = Column(DECIMAL(10, 2))
+    # exact type: the keyset cursor compares it with = and <, which a binary FLOAT does not do reliably
+    price_change_pct = Column(DECIMAL(9, 4))
     
     sector = relationship("Sector", back_populates="stocks")
     financials = relationship("Financial", back_populates="stock")
@@ -44,6 +66,9 @@ class Stock(Base):
 
 class Financial(Base):
     __tablename__ = "financials"
+    __table_args__ = (
+        UniqueConstraint("stock_symbol", "quarter", name="uq_financials_symbol_quarter"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     stock_symbol = Column(String(10), ForeignKey('stocks.stock_symbol'), nullable=False)
@@ -54,6 +79,7 @@ class Financial(Base):
     net_profit = Column(DECIMAL(20, 2))
     eps = Column(FLOAT)
     operating_margin = Column(FLOAT)  # Added operating margin (%)
+    content_hash = Column(String(40))  # sha1 of the values, unchanged quarters are not rewritten
     created_at = Column(DateTime, default=datetime.utcnow)
     
     stock = relationship("Stock", back_populates="financials")
@@ -61,6 +87,9 @@ class Financial(Base):
 
 class BalanceSheet(Base):
     __tablename__ = "balance_sheets"
+    __table_args__ = (
+        UniqueConstraint("stock_symbol", "quarter", name="uq_balance_sheets_symbol_quarter"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     stock_symbol = Column(String(10), ForeignKey('stocks.stock_symbol'), nullable=False)
@@ -70,6 +99,7 @@ class BalanceSheet(Base):
     total_equity = Column(DECIMAL(20, 2))  # Added total equity
     current_assets = Column(DECIMAL(20, 2))  # Added current assets
     current_liabilities = Column(DECIMAL(20, 2))  # Added current liabilities
+    content_hash = Column(String(40))  # sha1 of the values, unchanged quarters are not rewritten
     created_at = Column(DateTime, default=datetime.utcnow)
     
     stock = relationship("Stock", back_populates="balance_sheets")
@@ -77,6 +107,9 @@ class BalanceSheet(Base):
 
 class CashFlow(Base):
     __tablename__ = "cash_flows"
+    __table_args__ = (
+        UniqueConstraint("stock_symbol", "quarter", name="uq_cash_flows_symbol_quarter"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     stock_symbol = Column(String(10), ForeignKey('stocks.stock_symbol'), nullable=False)
@@ -86,12 +119,16 @@ class CashFlow(Base):
     financing_cash_flow = Column(DECIMAL(20, 2))  # Added financing cash flow
     free_cash_flow = Column(DECIMAL(20, 2))  # Added free cash flow
     capital_expenditures = Column(DECIMAL(20, 2))  # Added capital expenditures
+    content_hash = Column(String(40))  # sha1 of the values, unchanged quarters are not rewritten
     created_at = Column(DateTime, default=datetime.utcnow)
     
     stock = relationship("Stock", back_populates="cash_flows")
 
 class Dividend(Base):
     __tablename__ = "dividends"
+    __table_args__ = (
+        UniqueConstraint("stock_symbol", "payment_date", name="uq_dividends_symbol_payment_date"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     stock_symbol = Column(String(10), ForeignKey('stocks.stock_symbol'), nullable=False)
@@ -103,15 +140,32 @@ class Dividend(Base):
 
 class StockPrice(Base):
     __tablename__ = "stock_prices"
+    __table_args__ = (
+        UniqueConstraint("stock_symbol", "date", name="uq_stock_prices_symbol_date"),
+    )
     
     price_id = Column(Integer, primary_key=True, autoincrement=True)
     stock_symbol = Column(String(10), ForeignKey('stocks.stock_symbol'), nullable=False)
     date = Column(Date, nullable=False)
+    open_price = Column(DECIMAL(10, 2))
+    high_price = Column(DECIMAL(10, 2))
+    low_price = Column(DECIMAL(10, 2))
     close_price = Column(DECIMAL(10, 2))
+    volume = Column(BigInteger)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     stock = relationship("Stock", back_populates="prices")
 
+# the contiguous date range of stock_prices rows that was already synced from yahoo finance for a stock
+# so that only the missing days around it are downloaded
+class StockPriceCoverage(Base):
+    __tablename__ = "stock_price_coverage"
+
+    stock_symbol = Column(String(10), ForeignKey('stocks.stock_symbol'), primary_key=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
 class Portfolio(Base):
     __tablename__ = "portfolios"
     
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime, date
-from typing import List, Optional
+from typing import Dict, List, Optional
 from decimal import Decimal
 
 class StockCreate(BaseModel):
@@ -40,6 +40,13 @@ class StockPriceResponse(BaseModel):
     stock_symbol: str
     date: str
     close_price: Optional[Decimal]
+    # set for a cached price served past its TTL, e.g. while Yahoo Finance is down
+    stale: bool = False
+    as_of: Optional[datetime] = None
+
+# predefined date prices (1w, 1m, 1y ... changes) for a whole page of stocks at once
+class PredefinedPricesRequest(BaseModel):
+    symbols: List[str] = Field(..., min_length=1, max_length=100)
 
 class PortfolioCreate(BaseModel):
     user_id: int
@@ -156,7 +163,11 @@ class StockWithPriceResponse(BaseModel):
     sector: str
     market_cap: Optional[Decimal]
     current_price: Optional[Decimal]
+    price_change_pct: Optional[float] = None
     last_updated: Optional[datetime]
+    # set when current_price is past its cache TTL or a last known good price (Yahoo Finance unreachable)
+    stale: bool = False
+    as_of: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -169,6 +180,7 @@ class PaginatedStockResponse(BaseModel):
     page: int
     pages: int
     limit: int
+    next_cursor: Optional[str] = None  # pass as ?cursor= to get the next page
 
 
 class OHLCResponse(BaseModel):
@@ -179,3 +191,34 @@ class OHLCResponse(BaseModel):
     low: float
     close: float
     volume: Optional[float] = None
+
+
+class OnboardingRequest(BaseModel):
+    """Symbols to onboard in one background job"""
+    symbols: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+class FundamentalsRefreshRequest(BaseModel):
+    """Symbols to refresh, all stocks in the db when empty"""
+    symbols: List[str] = Field(default_factory=list, max_length=1000)
+
+
+class JobItemStatus(BaseModel):
+    status: str  # queued, running, succeeded, failed or skipped
+    started_at: Optional[str] = None
+    duration_seconds: Optional[float] = None
+    detail: Optional[str] = None
+    error: Optional[str] = None
+
+
+class JobResponse(BaseModel):
+    """State of a background job with a per-symbol breakdown"""
+    job_id: str
+    kind: str
+    status: str  # queued, running or finished
+    submitted_by: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
+    total: int
+    counts: Dict[str, int]
+    items: Dict[str, JobItemStatus]
@@ -0,0 +1,67 @@
+from typing import TYPE_CHECKING, List, Optional, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.models import BalanceSheet, CashFlow, Financial, Portfolio, PortfolioHolding, Stock
+from services.stock_service import StockService
+
+if TYPE_CHECKING:
+    # the async extension (aiomysql, greenlet) is only needed with ASYNC_DB_ENABLED
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class AsyncStockService:
+    """
+    Async variants of the hot read paths of StockService, on an AsyncSession (aiomysql).
+    Waiting for MySQL does not hold a threadpool thread, so one worker can serve many of these reads at once.
+    Writes and everything that talks to yahoo finance stay in StockService.
+
+    The async engine is optional (ASYNC_DB_ENABLED); given a sync Session instead, every method runs the
+    matching StockService query in the threadpool.
+    """
+
+    def __init__(self, db: Union["AsyncSession", Session]):
+        self.db = db
+        self._sync = StockService(db) if isinstance(db, Session) else None
+
+    async def get_stock(self, symbol: str) -> Optional[Stock]:
+        if self._sync is not None:
+            return await run_in_threadpool(self._sync.get_stock, symbol)
+        # make upper case
+        symbol = symbol.upper()
+        return await self.db.get(Stock, symbol)
+
+    async def get_portfolio_holdings(self, portfolio_id: int) -> List[PortfolioHolding]:
+        if self._sync is not None:
+            return await run_in_threadpool(self._sync.get_portfolio_holdings, portfolio_id)
+        # check if the portfolio exists
+        portfolio = await self.db.get(Portfolio, portfolio_id)
+        if portfolio is None:
+            raise ValueError(f"Portfolio with id {portfolio_id} does not exists")
+
+        # otherwise return all holdings of the portfolio
+        result = await self.db.execute(select(PortfolioHolding).where(PortfolioHolding.portfolio_id == portfolio_id))
+        return list(result.scalars().all())
+
+    async def get_financial_data(self, stock_symbol: str) -> List[Financial]:
+        if self._sync is not None:
+            return await run_in_threadpool(self._sync.get_financial_data, stock_symbol)
+        return await self._statement_rows(Financial, stock_symbol)
+
+    async def get_balance_sheet_data(self, stock_symbol: str) -> List[BalanceSheet]:
+        if self._sync is not None:
+            return await run_in_threadpool(self._sync.get_balance_sheet_data, stock_symbol)
+        return await self._statement_rows(BalanceSheet, stock_symbol)
+
+    async def get_cash_flow_data(self, stock_symbol: str) -> List[CashFlow]:
+        if self._sync is not None:
+            return await run_in_threadpool(self._sync.get_cash_flow_data, stock_symbol)
+        return await self._statement_rows(CashFlow, stock_symbol)
+
+    async def _statement_rows(self, model, stock_symbol: str) -> list:
+        result = await self.db.execute(
+            select(model).where(model.stock_symbol == stock_symbol).order_by(model.quarter)
+        )
+        return list(result.scalars().all())
@@ -0,0 +1,190 @@
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+import yfinance as yf
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from models.models import BalanceSheet, CashFlow, Dividend, Financial, Stock
+from common import invalidation
+from utils.db_context import SessionLocal
+from common.yahoo_client import yahoo
+
+# db column -> yahoo finance line item, per quarterly statement
+INCOME_STATEMENT_FIELDS = {
+    "revenue": "Total Revenue",
+    "gross_profit": "Gross Profit",
+    "operating_income": "Operating Income",
+    "net_profit": "Net Income",
+    "eps": "Earnings Per Share",
+}
+BALANCE_SHEET_FIELDS = {
+    "total_assets": "Total Assets",
+    "total_liabilities": "Total Liabilities Net Minority Interest",
+    "total_equity": "Ordinary Shares Number",
+    "current_assets": "Current Assets",
+    "current_liabilities": "Current Liabilities",
+}
+CASH_FLOW_FIELDS = {
+    "operating_cash_flow": "Net Cash Provided by Operating Activities",
+    "investing_cash_flow": "Net Cash Used for Investing Activities",
+    "financing_cash_flow": "Net Cash Used Provided by Financing Activities",
+    "free_cash_flow": "Free Cash Flow",
+    "capital_expenditures": "Capital Expenditure",
+}
+
+# columns stored as FLOAT, everything else is DECIMAL(20, 2)
+_FLOAT_COLUMNS = {"eps", "operating_margin"}
+
+STATEMENTS = ("income_statement", "balance_sheet", "cash_flow", "dividends")
+
+
+def _content_hash(row: dict, columns: List[str]) -> str:
+    return hashlib.sha1(json.dumps([row[column] for column in columns], default=str).encode()).hexdigest()
+
+
+def statement_rows(statement: pd.DataFrame, fields: Dict[str, str], stock_symbol: str) -> List[dict]:
+    """
+    Map a quarterly yfinance statement (line items x quarters) to db rows in one pass over the frame.
+    Every row gets a content_hash of its values so unchanged quarters can be skipped.
+    """
+    if statement is None or statement.empty:
+        return []
+
+    statement = statement[~statement.index.duplicated()]
+    frame = statement.T.reindex(columns=list(fields.values()))
+    frame.columns = list(fields.keys())
+    frame = frame.apply(pd.to_numeric, errors="coerce")
+
+    if "operating_income" in frame and "revenue" in frame:
+        frame["operating_margin"] = frame["operating_income"] / frame["revenue"].where(frame["revenue"] != 0) * 100
+
+    # quarters yahoo lists without any of our line items
+    frame = frame.dropna(how="all")
+    if frame.empty:
+        return []
+
+    decimal_columns = [column for column in frame.columns if column not in _FLOAT_COLUMNS]
+    frame[decimal_columns] = frame[decimal_columns].round(2)
+
+    columns = list(frame.columns)
+    frame.insert(0, "quarter", pd.to_datetime(frame.index).date)
+    frame.insert(0, "stock_symbol", stock_symbol)
+    frame = frame.astype(object)
+    rows = frame.where(frame.notna(), None).to_dict("records")
+    for row in rows:
+        row["content_hash"] = _content_hash(row, columns)
+    return rows
+
+
+def dividend_rows(dividends: pd.Series, stock_symbol: str) -> List[dict]:
+    if dividends is None or dividends.empty:
+        return []
+    frame = pd.DataFrame({
+        "stock_symbol": stock_symbol,
+        "payment_date": dividends.index.date,
+        "amount": dividends.round(2).to_numpy(),
+    })
+    frame = frame.drop_duplicates(subset="payment_date", keep="last").astype(object)
+    return frame.to_dict("records")
+
+
+class FundamentalsPipeline:
+    """
+    Fetches the fundamentals of a stock through a single yf.Ticker and upserts them on
+    (stock_symbol, quarter) / (stock_symbol, payment_date), so refreshing never duplicates rows.
+    Quarters whose content hash did not change are not written at all.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def refresh(self, stock_symbol: str, statements: Iterable[str] = STATEMENTS) -> Dict[str, int]:
+        """
+        Refresh the given statements of a stock. Returns the number of rows written per statement.
+        Raises ValueError if the stock is not in the db.
+        """
+        stock_symbol = stock_symbol.upper()
+        if self.db.query(Stock.stock_symbol).filter(Stock.stock_symbol == stock_symbol).first() is None:
+            raise ValueError(f"Stock with symbol {stock_symbol} does not exists")
+
+        # add .IS to the end of the stock symbol since yahoo finance excepts that
+        ticker = yf.Ticker(f"{stock_symbol}.IS")
+        # every attribute is its own yahoo request, each one goes through the guarded client
+        fetch = lambda attribute: yahoo.call(lambda: getattr(ticker, attribute))
+        written = {}
+        try:
+            for statement in statements:
+                if statement == "income_statement":
+                    rows = statement_rows(fetch("quarterly_financials"), INCOME_STATEMENT_FIELDS, stock_symbol)
+                    written[statement] = self._upsert_statement(Financial, rows)
+                elif statement == "balance_sheet":
+                    rows = statement_rows(fetch("quarterly_balancesheet"), BALANCE_SHEET_FIELDS, stock_symbol)
+                    written[statement] = self._upsert_statement(BalanceSheet, rows)
+                elif statement == "cash_flow":
+                    rows = statement_rows(fetch("quarterly_cashflow"), CASH_FLOW_FIELDS, stock_symbol)
+                    written[statement] = self._upsert_statement(CashFlow, rows)
+                elif statement == "dividends":
+                    written[statement] = self._upsert_dividends(dividend_rows(fetch("dividends"), stock_symbol))
+                else:
+                    raise ValueError(f"Unknown statement {statement}")
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        if any(written.values()):
+            invalidation.publish("fundamentals", [stock_symbol])
+        return written
+
+    def _upsert_statement(self, model, rows: List[dict]) -> int:
+        if not rows:
+            return 0
+
+        stock_symbol = rows[0]["stock_symbol"]
+        stored = dict(
+            self.db.query(model.quarter, model.content_hash).filter(model.stock_symbol == stock_symbol).all()
+        )
+        changed = [row for row in rows if stored.get(row["quarter"]) != row["content_hash"]]
+        if not changed:
+            return 0
+
+        stmt = mysql_insert(model.__table__).values(changed)
+        stmt = stmt.on_duplicate_key_update({
+            column: stmt.inserted[column]
+            for column in changed[0]
+            if column not in ("stock_symbol", "quarter")
+        })
+        self.db.execute(stmt)
+        return len(changed)
+
+    def _upsert_dividends(self, rows: List[dict]) -> int:
+        if not rows:
+            return 0
+
+        stock_symbol = rows[0]["stock_symbol"]
+        stored = dict(
+            self.db.query(Dividend.payment_date, Dividend.amount).filter(Dividend.stock_symbol == stock_symbol).all()
+        )
+        changed = [
+            row for row in rows
+            if row["payment_date"] not in stored or float(stored[row["payment_date"]]) != row["amount"]
+        ]
+        if not changed:
+            return 0
+
+        stmt = mysql_insert(Dividend.__table__).values(changed)
+        stmt = stmt.on_duplicate_key_update(amount=stmt.inserted.amount)
+        self.db.execute(stmt)
+        return len(changed)
+
+
+def refresh_fundamentals(stock_symbol: str) -> Optional[str]:
+    """Job task: refresh all fundamentals of one stock with its own session."""
+    db = SessionLocal()
+    try:
+        written = FundamentalsPipeline(db).refresh(stock_symbol)
+        return ", ".join(f"{count} {statement}" for statement, count in written.items())
+    finally:
+        db.close()
@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Number of symbols processed at the same time by one worker process
+ONBOARDING_CONCURRENCY = int(os.getenv("ONBOARDING_CONCURRENCY", "4"))
+# How long a finished job can still be polled
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "86400"))
+# A running job is written to Redis at most this often (seconds); submitting and finishing always write it
+JOB_SNAPSHOT_INTERVAL = float(os.getenv("JOB_SNAPSHOT_INTERVAL", "1.0"))
+
+
+class JobRunner:
+    """
+    Runs per-symbol background jobs on a bounded thread pool.
+
+    A job is a list of symbols and a task that is called once per symbol. Every symbol gets its own
+    status and timing, and a failing symbol is only marked as failed, the others keep running.
+    Job state is mirrored to Redis, so a poll that lands on another uvicorn worker still sees it.
+    Every write serializes the whole job, so while it runs it is written at most once per
+    JOB_SNAPSHOT_INTERVAL instead of after every item update (which is quadratic in the job size);
+    other workers see its progress with at most that delay.
+    """
+
+    def __init__(self, max_workers: int = ONBOARDING_CONCURRENCY):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, dict] = {}
+        # job_id -> monotonic time of its last Redis write
+        self._stored_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def submit(self, kind: str, symbols: List[str], task: Callable[[str], Optional[str]],
+               skipped: Optional[Dict[str, str]] = None, submitted_by: Optional[str] = None) -> dict:
+        """
+        Queue task(symbol) for every symbol and return the initial job state.
+
+        task may return a short detail message; an exception marks the symbol as failed.
+        skipped maps symbols that should not be processed to the reason, they are reported as skipped.
+        """
+        skipped = skipped or {}
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "submitted_by": submitted_by,
+            "created_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+            "total": len(symbols),
+            "counts": {},
+            "items": {},
+        }
+        for symbol in symbols:
+            if symbol in skipped:
+                job["items"][symbol] = {"status": "skipped", "detail": skipped[symbol]}
+            else:
+                job["items"][symbol] = {"status": "queued"}
+            status = job["items"][symbol]["status"]
+            job["counts"][status] = job["counts"].get(status, 0) + 1
+
+        with self._lock:
+            self._jobs[job_id] = job
+            self._refresh_status(job)
+            if self._store(job, force=True) and job["status"] == "finished":
+                self._forget(job_id)
+            snapshot = self._snapshot(job)
+
+        for symbol in symbols:
+            if symbol in skipped:
+                continue
+            self._executor.submit(self._run_item, job_id, symbol, task)
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._snapshot(job)
+        # submitted on another worker
+        return cache.get_cache(self._cache_key(job_id))
+
+    def _run_item(self, job_id: str, symbol: str, task: Callable[[str], Optional[str]]):
+        self._update(job_id, symbol, {"status": "running", "started_at": datetime.utcnow().isoformat()})
+        started = time.perf_counter()
+        try:
+            detail = task(symbol)
+            update = {"status": "succeeded"}
+            if detail:
+                update["detail"] = detail
+        except Exception as e:
+            logger.error(f"Job {job_id}: {symbol} failed: {e}")
+            update = {"status": "failed", "error": str(e)}
+        update["duration_seconds"] = round(time.perf_counter() - started, 3)
+        self._update(job_id, symbol, update)
+
+    def _update(self, job_id: str, symbol: str, update: dict):
+        with self._lock:
+            job = self._jobs[job_id]
+            item = job["items"][symbol]
+            # the counts are kept up to date per update instead of recounted over every item
+            counts = job["counts"]
+            counts[item["status"]] -= 1
+            if not counts[item["status"]]:
+                del counts[item["status"]]
+            item.update(update)
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+            self._refresh_status(job)
+
+            finished = job["status"] == "finished"
+            if self._store(job, force=finished) and finished:
+                # finished jobs are served from Redis from now on
+                self._forget(job_id)
+
+    @staticmethod
+    def _refresh_status(job: dict):
+        counts = job["counts"]
+        if counts.get("queued", 0) + counts.get("running", 0) == 0:
+            job["status"] = "finished"
+            job["finished_at"] = datetime.utcnow().isoformat()
+        elif counts.get("queued", 0) < job["total"]:
+            job["status"] = "running"
+
+    def _store(self, job: dict, force: bool = False) -> bool:
+        """Write the job to Redis, unless it was written less than JOB_SNAPSHOT_INTERVAL ago and force is False."""
+        now = time.monotonic()
+        if not force and now - self._stored_at.get(job["job_id"], float("-inf")) < JOB_SNAPSHOT_INTERVAL:
+            return False
+        stored = cache.set_cache(self._cache_key(job["job_id"]), job, ttl=JOB_RETENTION)
+        if stored:
+            self._stored_at[job["job_id"]] = now
+        return stored
+
+    def _forget(self, job_id: str):
+        self._jobs.pop(job_id, None)
+        self._stored_at.pop(job_id, None)
+
+    @staticmethod
+    def _snapshot(job: dict) -> dict:
+        return {**job, "counts": dict(job["counts"]), "items": {k: dict(v) for k, v in job["items"].items()}}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global job runner instance
+job_runner = JobRunner()
@@ -0,0 +1,33 @@
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from models.models import Stock
+from services.job_runner import job_runner
+from services.stock_service import StockService
+from utils.db_context import SessionLocal
+
+
+def onboard_stock(symbol: str) -> Optional[str]:
+    """Create one stock with its financials. Runs on a job thread, so it uses its own session."""
+    db = SessionLocal()
+    try:
+        stock = StockService(db).create_stock(symbol)
+        return stock.name
+    finally:
+        db.close()
+
+
+def start_onboarding(db: Session, symbols: List[str], submitted_by: Optional[str] = None) -> dict:
+    """Queue an onboarding job for the given symbols. Symbols that are already in the db are skipped."""
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+    existing = {
+        row[0] for row in db.query(Stock.stock_symbol).filter(Stock.stock_symbol.in_(symbols)).all()
+    }
+    return job_runner.submit(
+        "onboarding",
+        symbols,
+        onboard_stock,
+        skipped={symbol: "Stock already exists" for symbol in existing},
+        submitted_by=submitted_by,
+    )
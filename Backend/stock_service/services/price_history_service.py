@@ -0,0 +1,432 @@
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from models.models import Stock, StockPrice, StockPriceCoverage
+from common import invalidation
+from utils.cache import cache
+from common.yahoo_client import yahoo
+
+# A bar synced on the same day it belongs to may still change (the session was open),
+# so it is downloaded again once the sync is older than this many seconds.
+# A range Yahoo returned no bars for is not asked for again for a stock within this window either.
+PRICE_SYNC_FRESHNESS = int(os.getenv("PRICE_SYNC_FRESHNESS", "600"))
+# Rows per multi-row INSERT ... ON DUPLICATE KEY UPDATE statement
+PRICE_INGEST_CHUNK_SIZE = int(os.getenv("PRICE_INGEST_CHUNK_SIZE", "1000"))
+# Tickers per yahoo finance download request
+PRICE_DOWNLOAD_BATCH_SIZE = int(os.getenv("PRICE_DOWNLOAD_BATCH_SIZE", "50"))
+
+# yfinance column -> stock_prices column
+_PRICE_COLUMNS = {
+    "Open": "open_price",
+    "High": "high_price",
+    "Low": "low_price",
+    "Close": "close_price",
+    "Volume": "volume",
+}
+
+# yfinance corporate action columns (actions=True)
+_ACTION_COLUMNS = ("Dividends", "Stock Splits")
+
+
+def _single_ticker_rows(frame: pd.DataFrame, stock_symbol: str) -> pd.DataFrame:
+    prices = frame.reindex(columns=list(_PRICE_COLUMNS)).rename(columns=_PRICE_COLUMNS)
+    # multi-ticker downloads contain NaN rows for days a ticker did not trade
+    prices = prices[prices["close_price"].notna()]
+    if prices.empty:
+        return prices
+
+    prices = prices.copy()
+    price_columns = ["open_price", "high_price", "low_price", "close_price"]
+    # rounded for compatibility with DECIMAL(10, 2)
+    prices[price_columns] = prices[price_columns].round(2)
+    prices["volume"] = prices["volume"].round().astype("Int64")
+    prices.insert(0, "date", prices.index.date)
+    prices.insert(0, "stock_symbol", stock_symbol)
+    return prices
+
+
+def frame_to_rows(frame: pd.DataFrame, stock_symbols: List[str]) -> List[dict]:
+    """
+    Convert a yfinance download into stock_prices rows with column operations instead of iterrows.
+
+    Multi-ticker downloads have (field, ticker) columns and are split per ticker; a flat frame
+    belongs to the single symbol in stock_symbols.
+    """
+    if frame is None or frame.empty:
+        return []
+
+    if isinstance(frame.columns, pd.MultiIndex):
+        parts = [
+            _single_ticker_rows(frame.xs(ticker, axis=1, level=1), ticker[:-3] if ticker.endswith(".IS") else ticker)
+            for ticker in frame.columns.get_level_values(1).unique()
+        ]
+    else:
+        parts = [_single_ticker_rows(frame, stock_symbols[0])]
+
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return []
+
+    rows = pd.concat(parts, ignore_index=True).astype(object)
+    # NaN / NA -> None so they are stored as NULL
+    return rows.where(rows.notna(), None).to_dict("records")
+
+
+def corporate_action_symbols(frame: pd.DataFrame, stock_symbols: List[str]) -> Set[str]:
+    """
+    Stocks with a dividend or split in a yfinance download made with actions=True. Yahoo adjusts all
+    earlier bars of such a stock, so the ones stored before no longer match the new download.
+    """
+    if frame is None or frame.empty:
+        return set()
+
+    fields = [field for field in _ACTION_COLUMNS if field in frame.columns.get_level_values(0)]
+    if not fields:
+        return set()
+    if not isinstance(frame.columns, pd.MultiIndex):
+        return {stock_symbols[0]} if (frame[fields].fillna(0) != 0).any().any() else set()
+
+    actions = (frame[fields].fillna(0) != 0).any()
+    tickers = actions[actions].index.get_level_values(1)
+    return {ticker[:-3] if ticker.endswith(".IS") else ticker for ticker in tickers}
+
+
+def _stored_value(column: str, value):
+    # a downloaded value as the DECIMAL(10, 2) / BIGINT column holds it
+    if value is None:
+        return None
+    return int(value) if column == "volume" else Decimal(f"{value:.2f}")
+
+
+def _empty_sync_key(stock_symbol: str, start: date, end: date) -> str:
+    return f"price_sync_empty:{stock_symbol}:{start.isoformat()}:{end.isoformat()}"
+
+
+def _gaps(coverage: Optional[StockPriceCoverage], start: date, end: date) -> List[Tuple[date, date]]:
+    end = min(end, date.today())
+    if start > end:
+        return []
+    if coverage is None:
+        return [(start, end)]
+
+    gaps = []
+    if start < coverage.start_date:
+        gaps.append((start, coverage.start_date - timedelta(days=1)))
+
+    # the last covered day is re-fetched when it was synced before that day was over
+    tail_may_change = coverage.synced_at is None or coverage.synced_at.date() <= coverage.end_date
+    tail_is_stale = (
+        coverage.synced_at is None
+        or (datetime.utcnow() - coverage.synced_at).total_seconds() > PRICE_SYNC_FRESHNESS
+    )
+    if end > coverage.end_date:
+        gap_start = coverage.end_date if tail_may_change else coverage.end_date + timedelta(days=1)
+        gaps.append((gap_start, end))
+    elif end == coverage.end_date and tail_may_change and tail_is_stale:
+        gaps.append((coverage.end_date, end))
+
+    return gaps
+
+
+class PriceHistoryService:
+    """
+    Local OHLCV store on top of the stock_prices table.
+
+    For every stock the date range that was already downloaded from Yahoo Finance is kept in
+    stock_price_coverage as one contiguous interval. A request only downloads the days before
+    and after that interval, then serves everything with one indexed range scan.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def missing_ranges(self, stock_symbol: str, start: date, end: date) -> List[Tuple[date, date]]:
+        """
+        Return the inclusive date ranges of [start, end] that still have to be fetched for a stock.
+        Gaps are always adjacent to the covered interval so it stays contiguous after they are filled.
+        """
+        return _gaps(self.db.get(StockPriceCoverage, stock_symbol.upper()), start, end)
+
+    def sync(self, stock_symbol: str, start: date, end: date) -> int:
+        """
+        Download only the missing parts of [start, end] for a stock and store them.
+        Returns the number of rows written.
+        """
+        return self.sync_many([stock_symbol], start, end)
+
+    def sync_many(self, stock_symbols: List[str], start: date, end: date) -> int:
+        """
+        Sync [start, end] for several stocks. Stocks with the same gaps are downloaded together,
+        so a whole page of stocks that were last synced at the same time costs one yahoo request.
+
+        The coverage of a stock only grows by the gaps Yahoo actually returned bars of it for. A stock
+        missing from a partial result (not listed yet, delisted, a partial failure) stays uncovered and
+        that gap is retried after PRICE_SYNC_FRESHNESS seconds. When the download succeeded but no stock
+        of the batch has a bar (weekends, holidays) the gap is covered for all of them.
+
+        Bars are stored split and dividend adjusted. When a gap contains a corporate action of a stock,
+        its older stored bars are on the previous adjustment, so the coverage is reset to the synced
+        range and the rest is downloaded again when it is next read.
+        """
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in stock_symbols))
+        coverages = self._load_coverages(symbols)
+
+        symbol_gaps = {symbol: _gaps(coverages.get(symbol), start, end) for symbol in symbols}
+        recently_empty = cache.get_many([
+            _empty_sync_key(symbol, gap_start, gap_end)
+            for symbol, gaps in symbol_gaps.items()
+            for gap_start, gap_end in gaps
+        ])
+
+        groups: Dict[Tuple[Tuple[date, date], ...], List[str]] = {}
+        for symbol, gaps in symbol_gaps.items():
+            gaps = tuple(gap for gap in gaps if _empty_sync_key(symbol, *gap) not in recently_empty)
+            if gaps:
+                groups.setdefault(gaps, []).append(symbol)
+
+        written = 0
+        for gaps, group in groups.items():
+            for i in range(0, len(group), PRICE_DOWNLOAD_BATCH_SIZE):
+                batch = group[i:i + PRICE_DOWNLOAD_BATCH_SIZE]
+                synced: Dict[str, Tuple[date, date]] = {}
+                empty = {}
+                changed = set()
+                adjusted = set()
+                for gap_start, gap_end in gaps:
+                    try:
+                        rows, actions = self._download_rows(batch, gap_start, gap_end)
+                    except Exception as e:
+                        print(f"An error occurred while fetching prices for {len(batch)} stocks {gap_start}..{gap_end}: {e}")
+                        continue
+
+                    changed.update(self._changed_completed_bars(rows))
+                    written += self._upsert_rows(rows)
+                    adjusted.update(actions)
+                    returned = {row["stock_symbol"] for row in rows}
+                    for symbol in batch:
+                        if symbol in returned or not returned:
+                            synced_start, synced_end = synced.get(symbol, (gap_start, gap_end))
+                            synced[symbol] = (min(synced_start, gap_start), max(synced_end, gap_end))
+                        else:
+                            empty[_empty_sync_key(symbol, gap_start, gap_end)] = True
+
+                for symbol, (synced_start, synced_end) in synced.items():
+                    if symbol in adjusted:
+                        self._reset_coverage(symbol, synced_start, synced_end)
+                    else:
+                        self._extend_coverage(symbol, synced_start, synced_end)
+                self.db.commit()
+                cache.set_many(empty, ttl=PRICE_SYNC_FRESHNESS)
+                invalidation.publish("price_history", changed | adjusted)
+        return written
+
+    def bulk_ingest(self, stock_symbols: List[str], start: date, end: date,
+                    chunk_size: int = PRICE_INGEST_CHUNK_SIZE) -> int:
+        """
+        Download [start, end] for many stocks and write it with multi-row upserts, chunk_size rows per statement.
+
+        Unlike sync this always downloads the whole range (e.g. to backfill or repair history).
+        Re-running it only overwrites the same (stock_symbol, date) rows, so it is idempotent.
+        Returns the number of rows written.
+        """
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in stock_symbols))
+        end = min(end, date.today())
+        if not symbols or start > end:
+            return 0
+
+        coverages = self._load_coverages(symbols)
+        written = 0
+        for i in range(0, len(symbols), PRICE_DOWNLOAD_BATCH_SIZE):
+            batch = symbols[i:i + PRICE_DOWNLOAD_BATCH_SIZE]
+            try:
+                rows, adjusted = self._download_rows(batch, start, end)
+            except Exception as e:
+                print(f"An error occurred while downloading prices for {batch}: {e}")
+                continue
+
+            changed = self._changed_completed_bars(rows)
+            written += self._upsert_rows(rows, chunk_size)
+            returned = {row["stock_symbol"] for row in rows}
+            # stocks without any bar in the range are not marked as covered, unless no stock has one
+            for symbol in batch:
+                if returned and symbol not in returned:
+                    continue
+                coverage = coverages.get(symbol)
+                if symbol in adjusted:
+                    # bars outside the range are on the adjustment before the corporate action
+                    self._reset_coverage(symbol, start, end)
+                # only widen the coverage when the ingested range touches it, so it stays one interval
+                elif coverage is None or (start <= coverage.end_date + timedelta(days=1)
+                                          and end >= coverage.start_date - timedelta(days=1)):
+                    self._extend_coverage(symbol, start, end)
+            self.db.commit()
+            invalidation.publish("price_history", changed | adjusted)
+            print(f"Stored {len(rows)} price rows for {len(batch)} stocks ({written} so far).")
+        return written
+
+    def get_prices(self, stock_symbol: str, start: date, end: date) -> List[StockPrice]:
+        """
+        Return the stored bars of a stock with start <= date < end (same convention as yahoo finance),
+        filling any gaps from Yahoo first.
+        """
+        stock_symbol = stock_symbol.upper()
+        self.sync(stock_symbol, start, end - timedelta(days=1))
+        return self.db.query(StockPrice).filter(
+            StockPrice.stock_symbol == stock_symbol,
+            StockPrice.date >= start,
+            StockPrice.date < end
+        ).order_by(StockPrice.date).all()
+
+    def get_close_history(self, stock_symbols: List[str], start: date, end: date) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Return the stored closes of several stocks with start <= date < end, read with one query.
+        Each stock maps to (dates as a sorted datetime64[D] array, close prices as an object array of Decimal).
+        """
+        rows = self.db.query(StockPrice.stock_symbol, StockPrice.date, StockPrice.close_price).filter(
+            StockPrice.stock_symbol.in_(stock_symbols),
+            StockPrice.date >= start,
+            StockPrice.date < end,
+            StockPrice.close_price.isnot(None)
+        ).order_by(StockPrice.stock_symbol, StockPrice.date).all()
+        if not rows:
+            return {}
+
+        frame = pd.DataFrame(rows, columns=["stock_symbol", "date", "close_price"])
+        return {
+            stock_symbol: (
+                group["date"].to_numpy(dtype="datetime64[D]"),
+                group["close_price"].to_numpy(dtype=object),
+            )
+            for stock_symbol, group in frame.groupby("stock_symbol", sort=False)
+        }
+
+    def _load_coverages(self, stock_symbols: List[str]) -> Dict[str, StockPriceCoverage]:
+        if not stock_symbols:
+            return {}
+        coverages = self.db.query(StockPriceCoverage).filter(
+            StockPriceCoverage.stock_symbol.in_(stock_symbols)
+        ).all()
+        return {coverage.stock_symbol: coverage for coverage in coverages}
+
+    def _changed_completed_bars(self, rows: List[dict]) -> Set[str]:
+        """
+        Symbols with a bar before today in rows that is not stored yet or differs from the stored one,
+        i.e. whose price history really changed. Today's bar is left out: it is downloaded again on every
+        sync while the session is open, and announcing it would drop the derived caches (and the ml price
+        matrix) of every stock every few minutes.
+        """
+        today = date.today()
+        past = [row for row in rows if row["date"] < today]
+        if not past:
+            return set()
+
+        columns = list(_PRICE_COLUMNS.values())
+        stored = {
+            (stored_row[0], stored_row[1]): tuple(stored_row[2:])
+            for stored_row in self.db.query(
+                StockPrice.stock_symbol, StockPrice.date, *[getattr(StockPrice, column) for column in columns]
+            ).filter(
+                StockPrice.stock_symbol.in_({row["stock_symbol"] for row in past}),
+                StockPrice.date >= min(row["date"] for row in past),
+                StockPrice.date < today,
+            )
+        }
+        return {
+            row["stock_symbol"] for row in past
+            if stored.get((row["stock_symbol"], row["date"]))
+            != tuple(_stored_value(column, row[column]) for column in columns)
+        }
+
+    def _download_rows(self, stock_symbols: List[str], start: date, end: date) -> Tuple[List[dict], Set[str]]:
+        """Download [start, end] of several stocks. Returns the rows and the stocks with a corporate action in it."""
+        yahoo_symbols = [f"{symbol}.IS" for symbol in stock_symbols]
+        # multi-year downloads of a whole batch can take minutes: bulk path, outside the shared breaker
+        frame = yahoo.call_bulk(lambda: yf.download(
+            yahoo_symbols,
+            start=start,
+            end=end + timedelta(days=1),  # yahoo finance treats end as exclusive
+            interval="1d",
+            group_by="column",
+            auto_adjust=True,  # same prices as Ticker.history
+            actions=True,  # dividends and splits, see corporate_action_symbols
+            progress=False,
+            threads=True,
+            timeout=yahoo.timeout,
+        ))
+        return frame_to_rows(frame, stock_symbols), corporate_action_symbols(frame, stock_symbols)
+
+    def _upsert_rows(self, rows: List[dict], chunk_size: int = PRICE_INGEST_CHUNK_SIZE) -> int:
+        table = StockPrice.__table__
+        for i in range(0, len(rows), chunk_size):
+            stmt = mysql_insert(table).values(rows[i:i + chunk_size])
+            stmt = stmt.on_duplicate_key_update(
+                open_price=stmt.inserted.open_price,
+                high_price=stmt.inserted.high_price,
+                low_price=stmt.inserted.low_price,
+                close_price=stmt.inserted.close_price,
+                volume=stmt.inserted.volume,
+            )
+            self.db.execute(stmt)
+        return len(rows)
+
+    def _extend_coverage(self, stock_symbol: str, start: date, end: date):
+        table = StockPriceCoverage.__table__
+        stmt = mysql_insert(table).values(
+            stock_symbol=stock_symbol,
+            start_date=start,
+            end_date=end,
+            synced_at=datetime.utcnow(),
+        )
+        # the synced range touches the existing one, so widening it keeps a single interval
+        stmt = stmt.on_duplicate_key_update(
+            start_date=func.least(table.c.start_date, stmt.inserted.start_date),
+            end_date=func.greatest(table.c.end_date, stmt.inserted.end_date),
+            synced_at=stmt.inserted.synced_at,
+        )
+        self.db.execute(stmt)
+
+    def _reset_coverage(self, stock_symbol: str, start: date, end: date):
+        # replaces the interval instead of widening it, so everything outside [start, end] is fetched again
+        table = StockPriceCoverage.__table__
+        stmt = mysql_insert(table).values(
+            stock_symbol=stock_symbol,
+            start_date=start,
+            end_date=end,
+            synced_at=datetime.utcnow(),
+        )
+        stmt = stmt.on_duplicate_key_update(
+            start_date=stmt.inserted.start_date,
+            end_date=stmt.inserted.end_date,
+            synced_at=stmt.inserted.synced_at,
+        )
+        self.db.execute(stmt)
+
+
+if __name__ == "__main__":
+    # backfill: python -m services.price_history_service --years 10 [SYMBOL ...]
+    import argparse
+    from utils.db_context import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Backfill daily OHLCV history into stock_prices")
+    parser.add_argument("symbols", nargs="*", help="stock symbols without .IS (default: every stock in the db)")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=PRICE_INGEST_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        symbols = args.symbols or [row[0] for row in db.query(Stock.stock_symbol).all()]
+        start = date.today() - timedelta(days=365 * args.years)
+        written = PriceHistoryService(db).bulk_ingest(symbols, start, date.today(), args.chunk_size)
+        print(f"Backfill done: {written} rows for {len(symbols)} stocks.")
+    finally:
+        db.close()
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Optional
+
+from models.models import Stock
+from services.stock_service import StockService
+from utils.cache import cache
+from utils.db_context import SessionLocal
+from utils.price_stream import publish_heartbeat
+
+logger = logging.getLogger(__name__)
+
+# How often the whole stock universe is refreshed. It has to stay below the 600 s TTL of the
+# stock_price / stock_info keys, otherwise keys expire between two cycles.
+QUOTE_REFRESH_INTERVAL = int(os.getenv("QUOTE_REFRESH_INTERVAL", "300"))
+# Number of symbols sent to Yahoo in a single multi-ticker download
+QUOTE_REFRESH_BATCH_SIZE = int(os.getenv("QUOTE_REFRESH_BATCH_SIZE", "50"))
+QUOTE_REFRESH_ENABLED = os.getenv("QUOTE_REFRESH_ENABLED", "true").lower() == "true"
+
+LEADER_KEY = "quote_refresher:leader"
+LAST_CYCLE_KEY = "quote_refresher:last_cycle"
+
+# Extend the leader lock only if we still own it, so a worker that lost the lock never steals it back
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class QuoteRefresher:
+    """
+    Keeps the stock_price keys of every stock in the `stocks` table warm, the stock_info keys
+    of the stocks somebody recently looked at, and the market caps of all stocks current.
+
+    Every uvicorn worker starts a refresher, but only the one holding the Redis leader lock
+    runs cycles, so the cluster as a whole refreshes each quote once per interval.
+    """
+
+    def __init__(self, interval: int = QUOTE_REFRESH_INTERVAL, batch_size: int = QUOTE_REFRESH_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.last_cycle: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+        if self.interval >= 600:
+            logger.warning(
+                f"QUOTE_REFRESH_INTERVAL={self.interval}s is not below the 600s quote TTL; "
+                "keys will expire between refresh cycles"
+            )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_forever(self):
+        while True:
+            try:
+                self.is_leader = await asyncio.to_thread(self._acquire_leadership)
+                if self.is_leader:
+                    self.last_cycle = await asyncio.to_thread(self.run_cycle)
+            except Exception as e:
+                logger.error(f"Quote refresh cycle failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _acquire_leadership(self) -> bool:
+        """Take or renew the cluster-wide leader lock. Without Redis there is nothing to keep warm."""
+        client = cache.redis_client
+        if client is None:
+            return False
+
+        # the lock outlives one interval so a healthy leader always renews it in time,
+        # and a dead leader is replaced after at most two intervals
+        lock_ttl = self.interval * 2
+        if client.set(LEADER_KEY, self.worker_id, nx=True, ex=lock_ttl):
+            logger.info(f"Quote refresher leadership acquired by {self.worker_id}")
+            return True
+        return bool(client.eval(_RENEW_SCRIPT, 1, LEADER_KEY, self.worker_id, lock_ttl))
+
+    def _renew_leadership(self) -> bool:
+        """
+        Extend the leader lock during a cycle, so a cycle that runs longer than the lock TTL does not
+        overlap with one started by the next leader. False when the lock is lost (or Redis is down).
+        """
+        client = cache.redis_client
+        if client is None:
+            return False
+        try:
+            renewed = bool(client.eval(_RENEW_SCRIPT, 1, LEADER_KEY, self.worker_id, self.interval * 2))
+        except Exception as e:
+            logger.error(f"Could not renew the quote refresher leadership: {e}")
+            renewed = False
+        if not renewed:
+            self.is_leader = False
+            logger.warning(f"Quote refresher {self.worker_id} lost leadership, stopping the current cycle")
+        return renewed
+
+    def run_cycle(self) -> dict:
+        """Refresh every stock's quote in batches and record how long it took."""
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+
+        db = SessionLocal()
+        try:
+            symbols = [row[0] for row in db.query(Stock.stock_symbol).all()]
+            service = StockService(db)
+
+            prices_refreshed = 0
+            info_refreshed = 0
+            market_caps_refreshed = 0
+            # the lock is renewed before every batch; a worker that lost it stops, the new leader takes over
+            completed = True
+            for i in range(0, len(symbols), self.batch_size):
+                if i and not self._renew_leadership():
+                    completed = False
+                    break
+                prices_refreshed += len(service.refresh_prices(symbols[i:i + self.batch_size], persist=True))
+
+            if completed and self._renew_leadership():
+                # recently read info keys that would expire before the next cycle (plus some slack for the cycle)
+                info_refreshed = service.refresh_expiring_stock_info(
+                    symbols, within=self.interval + 60, keep_going=self._renew_leadership
+                )
+                completed = self.is_leader
+            else:
+                completed = False
+
+            if completed and self._renew_leadership():
+                # the market caps of the whole universe, a slice of the least recently checked per cycle
+                market_caps_refreshed = service.refresh_market_caps(symbols, keep_going=self._renew_leadership)
+                completed = self.is_leader
+            else:
+                completed = False
+        finally:
+            db.close()
+
+        stats = {
+            "worker": self.worker_id,
+            "started_at": started_at.isoformat(),
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "symbols": len(symbols),
+            "prices_refreshed": prices_refreshed,
+            "info_refreshed": info_refreshed,
+            "market_caps_refreshed": market_caps_refreshed,
+            "completed": completed,
+        }
+        # shared through Redis so every worker can report the leader's last cycle
+        cache.set_cache(LAST_CYCLE_KEY, stats, ttl=86400)
+        # the price stream only carries changed prices; the heartbeat tells its consumers that the producer
+        # is alive and how often it refreshes, i.e. whether they can stop polling
+        if prices_refreshed:
+            publish_heartbeat(self.interval)
+        logger.info(f"Quote refresh cycle done: {stats}")
+        return stats
+
+    def status(self) -> dict:
+        return {
+            "enabled": QUOTE_REFRESH_ENABLED,
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "is_leader": self.is_leader,
+            "last_cycle": cache.get_cache(LAST_CYCLE_KEY) or self.last_cycle,
+        }
+
+
+# Global refresher instance
+quote_refresher = QuoteRefresher()
@@ -0,0 +1,83 @@
+import os
+import statistics
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session, joinedload
+
+from models.models import Sector, SectorStats, Stock
+
+# Number of largest companies kept per sector
+SECTOR_TOP_N = int(os.getenv("SECTOR_TOP_N", "10"))
+
+
+class SectorStatsService:
+    """
+    Maintains the sector_stats table: company count, total and median market cap and the
+    top-N companies of every sector. A sector is recomputed with one indexed query when one
+    of its stocks is created or its market cap changes, so reads never aggregate.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def recompute(self, sector_id: int) -> SectorStats:
+        """Recompute and store the aggregates of one sector. Does not commit."""
+        stocks = self.db.query(Stock).filter(Stock.sector_id == sector_id).order_by(Stock.market_cap.desc()).all()
+        market_caps = [stock.market_cap for stock in stocks if stock.market_cap is not None]
+
+        values = {
+            "sector_id": sector_id,
+            "company_count": len(stocks),
+            "total_market_cap": sum(market_caps, Decimal(0)),
+            "median_market_cap": statistics.median(market_caps) if market_caps else None,
+            "top_companies": [
+                {
+                    "stock_symbol": stock.stock_symbol,
+                    "market_cap": float(stock.market_cap) if stock.market_cap is not None else None,
+                    "name": stock.name,
+                    "sector_id": stock.sector_id,
+                    "last_updated": stock.last_updated.isoformat() if stock.last_updated else None,
+                }
+                for stock in stocks[:SECTOR_TOP_N]
+            ],
+            "updated_at": datetime.utcnow(),
+        }
+        stmt = mysql_insert(SectorStats.__table__).values(values)
+        stmt = stmt.on_duplicate_key_update({
+            column: stmt.inserted[column] for column in values if column != "sector_id"
+        })
+        self.db.execute(stmt)
+        return self.db.get(SectorStats, sector_id, populate_existing=True)
+
+    def recompute_many(self, sector_ids: Iterable[int]):
+        for sector_id in set(sector_ids):
+            self.recompute(sector_id)
+        self.db.commit()
+
+    def recompute_all(self):
+        self.recompute_many(row[0] for row in self.db.query(Sector.sector_id).all())
+
+    def get(self, sector_id: int) -> Optional[SectorStats]:
+        stats = self.db.get(SectorStats, sector_id)
+        if stats is None:
+            # first read of a sector that was never materialized (e.g. created before this table existed)
+            if self.db.get(Sector, sector_id) is None:
+                return None
+            stats = self.recompute(sector_id)
+            self.db.commit()
+        return stats
+
+    def get_all(self) -> List[SectorStats]:
+        """Stats of every sector in one read; sectors missing from the table are materialized first."""
+        missing = [
+            row[0] for row in self.db.query(Sector.sector_id)
+            .outerjoin(SectorStats, SectorStats.sector_id == Sector.sector_id)
+            .filter(SectorStats.sector_id.is_(None)).all()
+        ]
+        if missing:
+            self.recompute_many(missing)
+        return self.db.query(SectorStats).options(joinedload(SectorStats.sector)) \
+            .order_by(SectorStats.total_market_cap.desc()).all()
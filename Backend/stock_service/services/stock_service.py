@@ -1,14 +1,262 @@
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from datetime import date
-from decimal import Decimal
-from typing import List, Optional
-import yfinance as yf  # New import
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime  # New import
 import pandas as pd
+import numpy as np
+import base64
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from models.models import *
 from datetime import timedelta
-from utils.cache import cache
+from utils.cache import CachedValue, cache
+from common import invalidation
+from utils.price_stream import publish_prices
+from utils.search_index import search_index
+from common.yahoo_client import yahoo
+from services.fundamentals_service import FundamentalsPipeline
+from services.price_history_service import PriceHistoryService
+from services.sector_stats_service import SectorStatsService
+
+# Parallel yahoo finance info requests for the detailed stock listing
+STOCK_DETAIL_CONCURRENCY = int(os.getenv("STOCK_DETAIL_CONCURRENCY", "8"))
+# The quote refresher keeps a stock_info key warm only while somebody read it within this many seconds,
+# and refreshes at most STOCK_INFO_REFRESH_LIMIT of them (most recently read first) per cycle
+STOCK_INFO_KEEP_WARM = int(os.getenv("STOCK_INFO_KEEP_WARM", "3600"))
+STOCK_INFO_REFRESH_LIMIT = int(os.getenv("STOCK_INFO_REFRESH_LIMIT", "200"))
+# Besides those, every cycle re-fetches the info of the MARKET_CAP_REFRESH_LIMIT stocks whose market cap
+# was checked longest ago, so the market caps of the whole universe stay current whether read or not
+MARKET_CAP_REFRESH_LIMIT = int(os.getenv("MARKET_CAP_REFRESH_LIMIT", "100"))
+# sorted set of symbol -> time its info was last read
+STOCK_INFO_READS_KEY = "stock_info_reads"
+
+# stale prices found by get_current_quotes are re-downloaded here, one batch at a time
+_price_refresh_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-refresh")
+_refreshing_prices = set()
+_refreshing_prices_lock = threading.Lock()
+
+# sort options of the paginated stock list
+STOCK_SORT_COLUMNS = {
+    "symbol": Stock.stock_symbol,
+    "market_cap": Stock.market_cap,
+    "price_change": Stock.price_change_pct,
+}
+STOCK_COUNT_CACHE_KEY = "stocks:count"
+PRICE_CHANGE_QUANTUM = Decimal("0.0001")
+
+# stock_price / stock_info keys are fresh for QUOTE_TTL seconds and served stale for QUOTE_STALE_TTL
+# more while a background refresh runs. A last-known-good copy is kept for QUOTE_LAST_GOOD_TTL so
+# pages keep working with a marked stale value when Yahoo Finance is down.
+QUOTE_TTL = 600
+QUOTE_STALE_TTL = int(os.getenv("QUOTE_STALE_TTL", "300"))
+QUOTE_LAST_GOOD_TTL = int(os.getenv("QUOTE_LAST_GOOD_TTL", str(7 * 24 * 3600)))
+
+
+def _download_last_quotes(yahoo_symbols: List[str]) -> Dict[str, Tuple[float, Optional[float]]]:
+    """
+    Download the latest and the previous close for many tickers with a single multi-ticker yfinance request.
+    Symbols must already carry the .IS suffix; tickers without data are left out of the result
+    (and are not asked for again while they are in the negative cache).
+    """
+    yahoo_symbols = [symbol for symbol in yahoo_symbols if not yahoo.is_known_missing(symbol)]
+    if not yahoo_symbols:
+        return {}
+
+    data = yahoo.download(
+        yahoo_symbols,
+        period="5d",
+        interval="1d",
+        group_by="column",
+        auto_adjust=False,
+        progress=False,
+        threads=True,
+    )
+    if data is None or data.empty or "Close" not in data:
+        return {}
+
+    closes = data["Close"]
+    # older yfinance versions return a plain Series when a single ticker is requested
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(name=yahoo_symbols[0])
+
+    # the last row is NaN for tickers that have not traded yet today, so take the last two closes each
+    # ticker actually has (carrying the last one forward would compare it with itself: a false 0%)
+    quotes = {}
+    for symbol in closes.columns:
+        traded = closes[symbol].dropna().iloc[-2:]
+        if traded.empty:
+            continue
+        quotes[symbol] = (float(traded.iloc[-1]), float(traded.iloc[0]) if len(traded) == 2 else None)
+    for symbol in yahoo_symbols:
+        if symbol not in quotes:
+            yahoo.mark_missing(symbol)
+    return quotes
+
+
+def _price_change_pct(last: float, previous: Optional[float]) -> Optional[Decimal]:
+    """Daily change in percent, quantized to the DECIMAL(9, 4) price_change_pct column."""
+    if not previous:
+        return None
+    return Decimal(str((last / previous - 1) * 100)).quantize(PRICE_CHANGE_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def _encode_cursor(value, stock_symbol: str) -> str:
+    raw = json.dumps([None if value is None else str(value), stock_symbol])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        value, stock_symbol = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return value, str(stock_symbol)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _nearest_indices(sorted_dates: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    For every target date return the index of the closest date in sorted_dates with one binary search each.
+    On a tie the earlier date wins.
+    """
+    if len(sorted_dates) == 1:
+        return np.zeros(len(targets), dtype=int)
+
+    right = np.clip(np.searchsorted(sorted_dates, targets, side="left"), 1, len(sorted_dates) - 1)
+    left = right - 1
+    take_left = (targets - sorted_dates[left]) <= (sorted_dates[right] - targets)
+    return np.where(take_left, left, right)
+
+
+def _fetch_info(yahoo_symbol: str) -> Optional[dict]:
+    return yahoo.info(yahoo_symbol)
+
+
+def _cache_infos(infos: Dict[str, dict]):
+    cache.set_many(infos, ttl=QUOTE_TTL, stale_ttl=QUOTE_STALE_TTL, last_good_ttl=QUOTE_LAST_GOOD_TTL)
+
+
+def _refresh_prices_in_background(stock_symbols: List[str]):
+    """Re-download the prices of these symbols off the request path; symbols already being refreshed are skipped."""
+    with _refreshing_prices_lock:
+        symbols = [symbol for symbol in stock_symbols if symbol not in _refreshing_prices]
+        _refreshing_prices.update(symbols)
+    if not symbols:
+        return
+
+    def refresh():
+        try:
+            # without persist refresh_prices never touches the session, so none is needed
+            StockService(None).refresh_prices(symbols)
+        except Exception as e:
+            print(f"An error occurred while refreshing {len(symbols)} stale prices: {e}")
+        finally:
+            with _refreshing_prices_lock:
+                _refreshing_prices.difference_update(symbols)
+
+    _price_refresh_pool.submit(refresh)
+
+
+def _record_info_reads(stock_symbols: List[str]):
+    # what refresh_expiring_stock_info keeps warm; a failed write only means a key may age out
+    if not stock_symbols or cache.redis_client is None:
+        return
+    now = time.time()
+    try:
+        cache.redis_client.zadd(STOCK_INFO_READS_KEY, {symbol.upper(): now for symbol in stock_symbols})
+    except Exception as e:
+        print(f"An error occurred while recording stock info reads: {e}")
+
+
+def _recent_info_reads(max_age: int) -> Dict[str, float]:
+    """Symbols whose info was read in the last max_age seconds -> time of the last read; older reads are dropped."""
+    if cache.redis_client is None:
+        return {}
+    cutoff = time.time() - max_age
+    try:
+        pipe = cache.redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(STOCK_INFO_READS_KEY, "-inf", cutoff)
+        pipe.zrangebyscore(STOCK_INFO_READS_KEY, cutoff, "+inf", withscores=True)
+        _, reads = pipe.execute()
+    except Exception as e:
+        print(f"An error occurred while reading stock info reads: {e}")
+        return {}
+    return {(symbol.decode() if isinstance(symbol, bytes) else symbol): score for symbol, score in reads}
+
+
+def stream_stock_details(stock_symbols: List[str]):
+    """
+    Yield the yahoo finance info of every stock as soon as it is available.
+    Cached entries come first (one MGET), the misses are fetched on a pool of STOCK_DETAIL_CONCURRENCY
+    threads and yielded in completion order and written back in pipelined batches. Symbols Yahoo
+    failed for come last, as their last known good info ("stale", "as_of") or {"stock_symbol", "error"}.
+    """
+    cache_keys = {symbol: f"stock_info:{symbol.upper()}.IS" for symbol in stock_symbols}
+    _record_info_reads(list(cache_keys))
+    cached = cache.get_many(list(cache_keys.values()))
+
+    misses = []
+    for symbol, cache_key in cache_keys.items():
+        if cache_key in cached:
+            # copy, the cached dict must stay as yahoo returned it
+            yield {**cached[cache_key], "stock_symbol": symbol}
+        else:
+            misses.append(symbol)
+    if not misses:
+        return
+
+    pool = ThreadPoolExecutor(max_workers=STOCK_DETAIL_CONCURRENCY)
+    fetched: Dict[str, dict] = {}
+    failed: Dict[str, str] = {}
+    try:
+        futures = {pool.submit(_fetch_info, f"{symbol.upper()}.IS"): symbol for symbol in misses}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                info = future.result()
+            except Exception as e:
+                failed[symbol] = str(e)
+                continue
+            if info is None:
+                yield {"stock_symbol": symbol, "error": "No data found"}
+                continue
+            fetched[cache_keys[symbol]] = info
+            if len(fetched) >= STOCK_DETAIL_CONCURRENCY:
+                _cache_infos(fetched)
+                fetched = {}
+            yield {**info, "stock_symbol": symbol}
+
+        if failed:
+            last_good = cache.get_last_good_many([cache_keys[symbol] for symbol in failed], QUOTE_LAST_GOOD_TTL)
+            for symbol, error in failed.items():
+                entry = last_good.get(cache_keys[symbol])
+                if entry is None:
+                    yield {"stock_symbol": symbol, "error": error}
+                else:
+                    yield {**entry.value, "stock_symbol": symbol, "stale": True, "as_of": entry.as_of.isoformat()}
+    finally:
+        # the client may disconnect mid-stream, do not keep fetching for it
+        pool.shutdown(wait=False, cancel_futures=True)
+        _cache_infos(fetched)
+
+
+# how far back each of the predefined price points is
+PREDEFINED_DATE_OFFSETS = {
+    "current": 0,
+    "one_week": 7,
+    "one_month": 30,
+    "three_months": 90,
+    "six_months": 180,
+    "one_year": 365,
+    "three_years": 3 * 365,
+    "five_years": 5 * 365,
+}
+
 
 class StockService:
     def __init__(self, db: Session):
@@ -28,8 +276,9 @@ class StockService:
         
         # add .IS to the end of the stock symbol since yahoo finance excepts that
         symbol += ".IS"
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        info = yahoo.info(symbol)
+        if info is None:
+            raise ValueError(f"No data available for stock {symbol}")
 
         sector_info = info.get("industry", None)
         if sector_info is None:
@@ -38,10 +287,15 @@ class StockService:
         # then check sector exists if not create
         sector_obj = self.db.query(Sector).filter(Sector.name == sector_info).first()
         if not sector_obj:
-            sector_obj = Sector(name=sector_info)
-            self.db.add(sector_obj)
-            self.db.commit()
-            self.db.refresh(sector_obj)
+            try:
+                sector_obj = Sector(name=sector_info)
+                self.db.add(sector_obj)
+                self.db.commit()
+                self.db.refresh(sector_obj)
+            except IntegrityError:
+                # created in the meantime by a concurrent onboarding
+                self.db.rollback()
+                sector_obj = self.db.query(Sector).filter(Sector.name == sector_info).one()
         
         # then create the stock object
         stock = Stock(
@@ -55,9 +309,10 @@ class StockService:
         self.db.refresh(stock)
 
         # after the creation of a stock, we need to extract the financials and add them to the db
-        self.add_income_statement(stock.stock_symbol)
-        self.add_balance_sheet(stock.stock_symbol)
-        self.add_cash_flow(stock.stock_symbol)
+        search_index.add(stock)
+        cache.delete_cache(STOCK_COUNT_CACHE_KEY)
+        SectorStatsService(self.db).recompute_many([stock.sector_id])
+        self._refresh_fundamentals(stock.stock_symbol, ("income_statement", "balance_sheet", "cash_flow"))
         return stock
 
     # Create stock manually without using yahoo finance
@@ -90,6 +345,9 @@ class StockService:
         self.db.add(stock)
         self.db.commit()
         self.db.refresh(stock)
+        search_index.add(stock)
+        cache.delete_cache(STOCK_COUNT_CACHE_KEY)
+        SectorStatsService(self.db).recompute_many([stock.sector_id])
         return stock
     
     # function to get basic info about a stock from db
@@ -101,27 +359,27 @@ class StockService:
     
     # function to get detailed info about a stock using yahoo finance
     def get_stock_info(self, symbol: str) -> dict:
+        """Yahoo finance info of a stock; a stale or last-known-good copy carries "stale" and "as_of"."""
         #check if the stock exists in the db
         stock = self.db.query(Stock).filter(Stock.stock_symbol == symbol).first()
 
         stock_symbol = symbol.upper()
+        _record_info_reads([stock_symbol])
         # add .IS to the end of the stock symbol since yahoo finance excepts that
         stock_symbol += ".IS"
 
-        # Check cache first
-        cache_key = f"stock_info:{stock_symbol}"
-        cached_info = cache.get_cache(cache_key)
-        if cached_info:
-            print(f"✓ Cache hit for {cache_key}")
-            return cached_info
-
-        # Cache miss - fetch from Yahoo Finance
-        stock = yf.Ticker(stock_symbol)
-        info = stock.info
-
-        # Store in cache with 10-minute TTL
-        cache.set_cache(cache_key, info, ttl=600)
-        return info
+        # Cache first; on a miss only one caller fetches from Yahoo Finance, concurrent ones wait for it
+        entry = cache.get_or_refresh(
+            f"stock_info:{stock_symbol}",
+            lambda: yahoo.info(stock_symbol),
+            ttl=QUOTE_TTL,
+            stale_ttl=QUOTE_STALE_TTL,
+            last_good_ttl=QUOTE_LAST_GOOD_TTL,
+        )
+        if entry.value and entry.stale:
+            # copy, the cached dict must stay as yahoo returned it
+            return {**entry.value, "stale": True, "as_of": entry.as_of.isoformat()}
+        return entry.value
 
     def get_sector_of_stock(self, symbol: str) -> Optional[Sector]:
         symbol = symbol.upper() # Ensure symbol is uppercase
@@ -141,100 +399,48 @@ class StockService:
             Retrieve the stock symbols and names of all stocks in the database.
             Then using yahoo finance, fetch detailed information about each stock.
         """
-        stocks = self.db.query(Stock).all()
-        stock_info = []
-        for stock in stocks:
-            stock_symbol = stock.stock_symbol
-            stock_symbol += ".IS"
-            stock = yf.Ticker(stock_symbol)
-            info = stock.info
-
-            info["stock_symbol"] = stock_symbol[:-3]  # remove .IS from the end
-            stock_info.append(info)
-        return stock_info
+        symbols = [row[0] for row in self.db.query(Stock.stock_symbol).all()]
+        return list(stream_stock_details(symbols))
          
     
     # search for stocks by symbol or name
-    def search_stocks(self, query: str) -> List[Stock]:
-        print(f"Searching for stocks with query: {query}")
-        results = self.db.query(Stock).filter(
-            (Stock.stock_symbol.ilike(f"%{query}%")) | (Stock.name.ilike(f"%{query}%"))
-        ).all()
-        print(f"Found {len(results)} stocks")
-
-        # return first 5 if length is greater than 5
-        if len(results) > 5:
-            return results[:5]
-
-        return results
+    def search_stocks(self, query: str) -> List[dict]:
+        """Top 5 stocks for a typeahead query, ranked by the in-memory search index (exact symbol first)."""
+        return search_index.search(query, self.db, limit=5)
 
     # services related to stock prices
     def add_stock_price(self, stock_symbol: str, start_date: str, end_date: str):
-        try:    
-            # first check stock is in stocks db
-            stock = self.db.query(Stock).filter(Stock.stock_symbol == stock_symbol).first()
-            if stock is None:
-                raise ValueError(f"Stock with symbol {stock_symbol} does not exists")
-
-            # date, symbol comb uniqueness satisfied thorugh db definition
-            # then, start adding data
-            stock_symbol = stock_symbol.upper()
-
-            # add .IS to the end of the stock symbol since yahoo finance excepts that
-            stock_symbol += ".IS"
-            # Fetch stock data using yfinance 
-            stock_data = yf.download(stock_symbol, start=start_date, end=end_date)
-
-            # Check if data is available
-            if stock_data.empty:
-                print(f"No data available for {stock_symbol} from {start_date} to {end_date}")
-                return
-            
-            prices = []
-            dates = []
-
-            # Iterate through the data and add closing prices
-            for date, row in stock_data.iterrows():
-                # check whether the las
-
-                # Extract the Close price explicitly using multi-index handling
-                if 'Close' in row.index:
-                    close_price_series = row['Close']
-                    # Ensure close_price is the specific value for the stock
-                    if isinstance(close_price_series, pd.Series):
-                        close_price = close_price_series.get(stock_symbol, None)
-                    else:
-                        close_price = close_price_series
-                else:
-                    close_price = None
-
-                #print(date)
-                #print(close_price)
-                prices.append(close_price)
-                dates.append(date)
-
-            stock_symbol = stock_symbol[:-3]
-            for price, date in zip(prices, dates):
-                # there is no null data in prices
+        self.add_stock_prices([stock_symbol], start_date, end_date)
 
-                # Convert to Decimal for compatibility with DECIMAL(10, 2)
-                close_price = Decimal(f"{price:.2f}")
-
-                # Add the stock price record to the database
-                stock_price = StockPrice(
-                    stock_symbol=stock_symbol,
-                    date=date.date(),  # Convert timestamp to date
-                    close_price=close_price,  # Store as Decimal
-                )
-                self.db.add(stock_price)
-            
-            # Commit all new records to the database
-            self.db.commit()  # Moved this line to commit after adding all prices
-            print(f"Closing prices for {stock_symbol} added successfully.")
+    def add_stock_prices(self, stock_symbols: List[str], start_date: str, end_date: str) -> int:
+        """
+        Store the daily prices of several stocks for start_date <= date < end_date.
+        All stocks are downloaded together and written with chunked multi-row upserts,
+        so running it again for the same range does not create duplicates.
+        """
+        try:
+            # first check the stocks are in stocks db
+            stock_symbols = [symbol.upper() for symbol in stock_symbols]
+            known = {
+                row[0] for row in self.db.query(Stock.stock_symbol).filter(Stock.stock_symbol.in_(stock_symbols)).all()
+            }
+            for stock_symbol in stock_symbols:
+                if stock_symbol not in known:
+                    raise ValueError(f"Stock with symbol {stock_symbol} does not exists")
+
+            # end_date is exclusive here (same as yahoo finance), bulk_ingest takes an inclusive end
+            written = PriceHistoryService(self.db).bulk_ingest(
+                stock_symbols,
+                date.fromisoformat(start_date),
+                date.fromisoformat(end_date) - timedelta(days=1),
+            )
+            print(f"{written} daily prices for {', '.join(stock_symbols)} added successfully.")
+            return written
 
         except Exception as e:
             self.db.rollback()  # Rollback in case of an error
             print(f"An error occurred while adding stock prices: {e}")
+            return 0
 
     # following to adds to db and extract from db
     def get_stock_price_on_date(self, stock_symbol: str, date: str) -> Optional[Decimal]:
@@ -257,120 +463,414 @@ class StockService:
         ).all()
     
     # Function to get the current stock price for a given stock symbol using yahoo finance, no db interaction
-    def get_current_stock_price(self, stock_symbol: str) -> StockPrice:
+    def get_current_stock_price(self, stock_symbol: str) -> Optional[float]:
         """
             Using the yahoo finance api, get the current stock price for the given stock symbol
         """
+        return self.get_current_stock_quote(stock_symbol).value
+
+    def get_current_stock_quote(self, stock_symbol: str) -> CachedValue:
+        """
+            Current price with its freshness: while Yahoo Finance is down the last known good price
+            is returned with stale=True and the time it was fetched (value None if there is none).
+        """
+        stock_symbol = stock_symbol.upper()
+        # add .IS to the end of the stock symbol since yahoo finance excepts that
+        stock_symbol += ".IS"
+
         try:
-            stock_symbol = stock_symbol.upper()
-            # add .IS to the end of the stock symbol since yahoo finance excepts that
-            stock_symbol += ".IS"
-
-            # Check cache first
-            cache_key = f"stock_price:{stock_symbol}"
-            cached_price = cache.get_cache(cache_key)
-            if cached_price is not None:
-                print(f"✓ Cache hit for {cache_key}")
-                return cached_price
-
-            # Cache miss - fetch from Yahoo Finance
-            stock = yf.Ticker(stock_symbol)
-            info = stock.info
-            current_price = info.get("currentPrice", None)
-
-            # Store in cache with 10-minute TTL
-            if current_price is not None:
-                cache.set_cache(cache_key, current_price, ttl=600)
-
-            return current_price
+            # Cache first; on a miss only one caller fetches from Yahoo Finance, concurrent ones wait for it
+            # (a missing price is not cached)
+            return cache.get_or_refresh(
+                f"stock_price:{stock_symbol}",
+                lambda: (yahoo.info(stock_symbol) or {}).get("currentPrice", None),
+                ttl=QUOTE_TTL,
+                stale_ttl=QUOTE_STALE_TTL,
+                last_good_ttl=QUOTE_LAST_GOOD_TTL,
+            )
         except Exception as e:
             print(f"An error occurred while fetching stock price: {e}")
+            return CachedValue(None)
+
+    def get_current_quotes(self, stock_symbols: List[str]) -> Dict[str, CachedValue]:
+        """
+            Batch version of get_current_stock_quote.
+            All cache keys are read in one pipelined round trip and every miss is fetched with one multi-ticker
+            download, so the cost stays flat no matter how many symbols are asked for. Prices past their soft
+            TTL are returned stale while one background download refreshes them; misses Yahoo has no price
+            for fall back to their last known good price (stale), or CachedValue(None) without one.
+        """
+        # keep the request order but drop duplicates
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in stock_symbols))
+        cache_keys = {symbol: f"stock_price:{symbol}.IS" for symbol in symbols}
+
+        entries = cache.get_many_entries(list(cache_keys.values()), ttl=QUOTE_TTL, stale_ttl=QUOTE_STALE_TTL)
+        quotes = {symbol: entries.get(cache_keys[symbol], CachedValue(None)) for symbol in symbols}
+
+        stale = [symbol for symbol, quote in quotes.items() if quote.stale]
+        if stale:
+            _refresh_prices_in_background(stale)
+
+        missing = [symbol for symbol, quote in quotes.items() if quote.value is None]
+        if missing:
+            fetched_at = time.time()
+            fetched = self.refresh_prices(missing)
+            for symbol, price in fetched.items():
+                quotes[symbol] = CachedValue(price, False, fetched_at)
+
+            failed = [symbol for symbol in missing if symbol not in fetched]
+            last_good = cache.get_last_good_many([cache_keys[symbol] for symbol in failed], QUOTE_LAST_GOOD_TTL)
+            for symbol in failed:
+                if cache_keys[symbol] in last_good:
+                    quotes[symbol] = last_good[cache_keys[symbol]]
+        return quotes
+
+    def get_current_prices(self, stock_symbols: List[str]) -> Dict[str, Optional[float]]:
+        """Prices of get_current_quotes, without their freshness."""
+        return {symbol: quote.value for symbol, quote in self.get_current_quotes(stock_symbols).items()}
+
+    def refresh_prices(self, stock_symbols: List[str], persist: bool = False) -> Dict[str, float]:
+        """
+            Download the latest prices for the given symbols in one request and write them to the
+            stock_price cache keys, whether or not they are still cached. Used for cache misses
+            and by the background quote refresher, which also persists them (persist=True) as
+            stocks.last_price / price_change_pct so the stock list can be sorted by price change.
+        """
+        symbols = [symbol.upper() for symbol in stock_symbols]
+        try:
+            fetched = _download_last_quotes([f"{symbol}.IS" for symbol in symbols])
+        except Exception as e:
+            print(f"An error occurred while fetching stock prices for {len(symbols)} symbols: {e}")
+            return {}
+
+        quotes = {}
+        for symbol in symbols:
+            quote = fetched.get(f"{symbol}.IS")
+            if quote is not None:
+                quotes[symbol] = quote
+        prices = {symbol: last for symbol, (last, _) in quotes.items()}
+
+        keys = {symbol: f"stock_price:{symbol}.IS" for symbol in prices}
+        previous = cache.get_many(list(keys.values()))
+        cache.set_many(
+            {keys[symbol]: price for symbol, price in prices.items()},
+            ttl=QUOTE_TTL,
+            stale_ttl=QUOTE_STALE_TTL,
+            last_good_ttl=QUOTE_LAST_GOOD_TTL,
+        )
+        invalidation.publish("quote", prices)
+        # only prices that moved go to the price stream (alert triggering in the watchlist service)
+        publish_prices({symbol: price for symbol, price in prices.items() if previous.get(keys[symbol]) != price})
+        if persist and quotes:
+            self._store_quotes(quotes)
+        return prices
+
+    def _store_quotes(self, quotes: Dict[str, Tuple[float, Optional[float]]]):
+        try:
+            self.db.bulk_update_mappings(Stock, [
+                {
+                    "stock_symbol": symbol,
+                    "last_price": Decimal(f"{last:.2f}"),
+                    "price_change_pct": _price_change_pct(last, previous),
+                }
+                for symbol, (last, previous) in quotes.items()
+            ])
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            print(f"An error occurred while storing quotes: {e}")
+
+    def get_stocks_page(self, sort: str = "symbol", order: str = "asc", limit: int = 10,
+                        cursor: Optional[str] = None, page: int = 1) -> Tuple[List[Stock], Optional[str]]:
+        """
+            One page of stocks (with their sector loaded in the same query) and the cursor of the next page.
+
+            With a cursor the page is read with a keyset condition on (sort column, stock_symbol), so a deep
+            page costs the same as the first one. Without a cursor `page` falls back to OFFSET.
+            Stocks without a value for the sort column always come last.
+        """
+        if sort not in STOCK_SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {', '.join(STOCK_SORT_COLUMNS)}")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be asc or desc")
+
+        column = STOCK_SORT_COLUMNS[sort]
+        descending = order == "desc"
+        query = self.db.query(Stock).options(joinedload(Stock.sector))
+
+        if cursor:
+            value, last_symbol = _decode_cursor(cursor)
+            if column is Stock.stock_symbol:
+                query = query.filter(column < last_symbol if descending else column > last_symbol)
+            elif value is None:
+                query = query.filter(column.is_(None), Stock.stock_symbol > last_symbol)
+            else:
+                # both sort columns are DECIMAL, so the boundary row compares exactly
+                value = Decimal(value)
+                after = column < value if descending else column > value
+                query = query.filter(or_(
+                    column.is_(None),
+                    after,
+                    and_(column == value, Stock.stock_symbol > last_symbol),
+                ))
+
+        if column is Stock.stock_symbol:
+            query = query.order_by(column.desc() if descending else column.asc())
+        else:
+            # MySQL sorts NULL first; keep them at the end in both directions
+            query = query.order_by(column.is_(None), column.desc() if descending else column.asc(), Stock.stock_symbol)
+
+        if not cursor and page > 1:
+            query = query.offset((page - 1) * limit)
+        # one extra row tells whether there is a next page
+        stocks = query.limit(limit + 1).all()
+
+        next_cursor = None
+        if len(stocks) > limit:
+            stocks = stocks[:limit]
+            last = stocks[-1]
+            next_cursor = _encode_cursor(getattr(last, column.key), last.stock_symbol)
+        return stocks, next_cursor
+
+    def count_stocks(self) -> int:
+        """Number of stocks, cached; create_stock invalidates it."""
+        return cache.get_or_set(
+            STOCK_COUNT_CACHE_KEY, lambda: self.db.query(func.count(Stock.stock_symbol)).scalar(), ttl=3600
+        )
+
+    def refresh_expiring_stock_info(self, stock_symbols: List[str], within: int,
+                                    keep_going: Optional[Callable[[], bool]] = None) -> int:
+        """
+            Re-fetch stock_info entries that are still cached, will expire in the next `within` seconds and
+            were read in the last STOCK_INFO_KEEP_WARM seconds; at most STOCK_INFO_REFRESH_LIMIT of them,
+            most recently read first. Entries nobody reads are left to expire, so the refresh cost follows usage
+            (their market caps are kept current by refresh_market_caps). `keep_going` is called between batches
+            and stops the refresh when it returns False (e.g. leadership was lost).
+        """
+        reads = _recent_info_reads(STOCK_INFO_KEEP_WARM)
+        cache_keys = {
+            f"stock_info:{symbol.upper()}.IS": symbol.upper() for symbol in stock_symbols if symbol.upper() in reads
+        }
+        ttls = cache.get_ttls(list(cache_keys))
+
+        # the key outlives its soft TTL by QUOTE_STALE_TTL
+        expiring = [cache_key for cache_key, ttl in ttls.items() if ttl - QUOTE_STALE_TTL <= within]
+        expiring.sort(key=lambda cache_key: reads[cache_keys[cache_key]], reverse=True)
+        expiring = expiring[:STOCK_INFO_REFRESH_LIMIT]
+        return self._refresh_stock_info([cache_keys[cache_key] for cache_key in expiring], keep_going)
+
+    def refresh_market_caps(self, stock_symbols: List[str], limit: int = MARKET_CAP_REFRESH_LIMIT,
+                            keep_going: Optional[Callable[[], bool]] = None) -> int:
+        """
+            Re-fetch the info of the `limit` stocks among stock_symbols whose market cap was checked longest
+            ago (stocks.last_updated, never checked first) and store their market caps. Called every quote
+            refresh cycle, it walks through the whole universe in turn. Returns the number of stocks refreshed.
+        """
+        symbols = [symbol.upper() for symbol in stock_symbols]
+        if not symbols or limit <= 0:
+            return 0
+        oldest = [
+            row[0] for row in self.db.query(Stock.stock_symbol)
+            .filter(Stock.stock_symbol.in_(symbols))
+            .order_by(Stock.last_updated.is_(None).desc(), Stock.last_updated, Stock.stock_symbol)
+            .limit(limit)
+        ]
+        started_at = datetime.utcnow()
+        refreshed = self._refresh_stock_info(oldest, keep_going)
+        # stocks whose info failed or has no market cap move to the back too, instead of being retried every cycle
+        self.db.query(Stock).filter(
+            Stock.stock_symbol.in_(oldest),
+            or_(Stock.last_updated.is_(None), Stock.last_updated < started_at),
+        ).update({Stock.last_updated: started_at}, synchronize_session=False)
+        self.db.commit()
+        return refreshed
+
+    def _refresh_stock_info(self, stock_symbols: List[str], keep_going: Optional[Callable[[], bool]] = None) -> int:
+        """
+            Fetch the info of these stocks, write it to the stock_info keys and store the market caps.
+            Yahoo has no batch endpoint for info, so it runs on a pool of STOCK_DETAIL_CONCURRENCY threads,
+            in batches written back one pipeline each; `keep_going` is checked between batches.
+        """
+        refreshed = 0
+        batch_size = STOCK_DETAIL_CONCURRENCY * 4
+        with ThreadPoolExecutor(max_workers=STOCK_DETAIL_CONCURRENCY) as pool:
+            for i in range(0, len(stock_symbols), batch_size):
+                if i and keep_going is not None and not keep_going():
+                    break
+                futures = {
+                    pool.submit(_fetch_info, f"{symbol}.IS"): symbol for symbol in stock_symbols[i:i + batch_size]
+                }
+                infos = {}
+                market_caps = {}
+                for future in as_completed(futures):
+                    symbol = futures[future]
+                    try:
+                        info = future.result()
+                    except Exception as e:
+                        print(f"An error occurred while refreshing the info of {symbol}: {e}")
+                        continue
+                    if info:
+                        infos[f"stock_info:{symbol}.IS"] = info
+                        if info.get("marketCap"):
+                            market_caps[symbol] = info["marketCap"]
+
+                # written back with one pipelined round trip per batch
+                _cache_infos(infos)
+                self.update_market_caps(market_caps)
+                refreshed += len(infos)
+        return refreshed
+
+    def update_market_caps(self, market_caps: Dict[str, float]) -> int:
+        """
+            Store freshly fetched market caps (symbol -> market cap) and recompute the stats of the sectors
+            whose stocks changed. last_updated is set for every stock given, changed or not, since it tells
+            refresh_market_caps when the market cap was last checked.
+            Returns the number of stocks whose market cap changed.
+        """
+        if not market_caps:
+            return 0
+
+        stocks = self.db.query(Stock).filter(Stock.stock_symbol.in_(list(market_caps))).all()
+        changed = 0
+        changed_sectors = set()
+        now = datetime.utcnow()
+        for stock in stocks:
+            market_cap = Decimal(market_caps[stock.stock_symbol]).quantize(Decimal("0.01"))
+            stock.last_updated = now
+            if stock.market_cap != market_cap:
+                stock.market_cap = market_cap
+                changed += 1
+                changed_sectors.add(stock.sector_id)
+
+        if changed_sectors:
+            self.db.flush()
+            # commits the new market caps together with the sector stats
+            SectorStatsService(self.db).recompute_many(changed_sectors)
+            # search results are ordered by market cap
+            search_index.invalidate()
+        else:
+            self.db.commit()
+        return changed
 
 
     def get_stock_ohlc_in_range(self, stock_symbol: str, start_date: str, end_date: str):
         """Retrieve OHLC candlestick data for a given stock symbol and date range."""
         try:
-            stock_symbol = stock_symbol.upper() + '.IS'
-            stock = yf.Ticker(stock_symbol)
-            stock_data = stock.history(start=start_date, end=end_date)
-            ohlc_data = []
-            for date_idx, row in stock_data.iterrows():
-                ohlc_data.append({
-                    'time': date_idx.strftime('%Y-%m-%d'),
-                    'open': round(float(row['Open']), 2),
-                    'high': round(float(row['High']), 2),
-                    'low': round(float(row['Low']), 2),
-                    'close': round(float(row['Close']), 2),
-                    'volume': round(float(row['Volume']), 0) if 'Volume' in row else None,
-                })
-            return ohlc_data
+            stock_symbol = stock_symbol.upper()
+            if self.get_stock(stock_symbol) is None:
+                # prices can only be stored for stocks in the stocks table, others still come straight from yahoo
+                return self._fetch_ohlc_from_yahoo(stock_symbol, start_date, end_date)
+
+            prices = PriceHistoryService(self.db).get_prices(
+                stock_symbol, date.fromisoformat(start_date), date.fromisoformat(end_date)
+            )
+            return [
+                {
+                    'time': price.date.strftime('%Y-%m-%d'),
+                    'open': float(price.open_price),
+                    'high': float(price.high_price),
+                    'low': float(price.low_price),
+                    'close': float(price.close_price),
+                    'volume': float(price.volume) if price.volume is not None else None,
+                }
+                for price in prices
+                # rows written before OHLCV was stored only have a close price
+                if None not in (price.open_price, price.high_price, price.low_price, price.close_price)
+            ]
         except Exception as e:
+            self.db.rollback()
             print(f'An error occurred while fetching OHLC data: {e}')
             return []
 
-    # Function to get close price of a stock for a given date range using yahoo finance
+    def _fetch_ohlc_from_yahoo(self, stock_symbol: str, start_date: str, end_date: str):
+        stock_data = yahoo.history(stock_symbol + '.IS', start=start_date, end=end_date)
+        if stock_data is None:
+            return []
+        ohlc_data = []
+        for date_idx, row in stock_data.iterrows():
+            ohlc_data.append({
+                'time': date_idx.strftime('%Y-%m-%d'),
+                'open': round(float(row['Open']), 2),
+                'high': round(float(row['High']), 2),
+                'low': round(float(row['Low']), 2),
+                'close': round(float(row['Close']), 2),
+                'volume': round(float(row['Volume']), 0) if 'Volume' in row else None,
+            })
+        return ohlc_data
+
+    # Function to get close price of a stock for a given date range, served from the local price store
     def get_stock_price_in_range(self, stock_symbol: str, start_date: str, end_date: str) -> List[StockPrice]:
         """
-        Retrieve the stock prices for a given stock symbol and date range using Yahoo Finance.
+        Retrieve the stock prices for a given stock symbol and date range.
+        Missing days are synced from Yahoo Finance into stock_prices first, the rest is read from MySQL.
         """
         try:
             stock_symbol = stock_symbol.upper()
-            # add .IS to the end of the stock symbol since yahoo finance excepts that
-            stock_symbol += ".IS"
-            stock = yf.Ticker(stock_symbol)
-            stock_data = stock.history(start=start_date, end=end_date)
-            stock_prices = []
-            for date, row in stock_data.iterrows():
-                close_price = Decimal(row['Close'])
-                stock_price = StockPrice(
-                    stock_symbol=stock_symbol[:-3],  # remove .IS from the end
-                    date=date.date(),
-                    close_price=close_price
-                )
-                stock_prices.append(stock_price)
-            return stock_prices
+            if self.get_stock(stock_symbol) is None:
+                return self._fetch_prices_from_yahoo(stock_symbol, start_date, end_date)
+
+            return PriceHistoryService(self.db).get_prices(
+                stock_symbol, date.fromisoformat(start_date), date.fromisoformat(end_date)
+            )
         except Exception as e:
+            self.db.rollback()
             print(f"An error occurred while fetching stock prices: {e}")
+            return []
+
+    def _fetch_prices_from_yahoo(self, stock_symbol: str, start_date: str, end_date: str) -> List[StockPrice]:
+        stock_data = yahoo.history(stock_symbol + ".IS", start=start_date, end=end_date)
+        if stock_data is None:
+            return []
+        return [
+            StockPrice(
+                stock_symbol=stock_symbol,
+                date=date_idx.date(),
+                close_price=Decimal(row['Close'])
+            )
+            for date_idx, row in stock_data.iterrows()
+        ]
 
     def get_prices_of_stock_in_predefined_dates(self, stock_symbol: str) -> List[StockPrice]:
         stock = self.db.query(Stock).filter(Stock.stock_symbol == stock_symbol).first()
         if stock is None:
             raise ValueError(f"Stock with symbol {stock_symbol} does not exist")
 
-        stock_symbol += ".IS"
-        stock = yf.Ticker(stock_symbol)
-        stock_data = stock.history(period="5y")
-
-        # Ensure stock_data index is timezone-naive
-        stock_data.index = stock_data.index.tz_localize(None)
-
-        stock_prices = []
-        date_intervals = {
-            "current": date.today(),
-            "one_week" : date.today() - timedelta(days=7),
-            "one_month" : date.today() - timedelta(days=30),
-            "three_months" : date.today() - timedelta(days=90),
-            "six_months" : date.today() - timedelta(days=180),
-            "one_year" : date.today() - timedelta(days=365),
-            "three_years" : date.today() - timedelta(days=3*365),
-            "five_years" : date.today() - timedelta(days=5*365)
-        }
+        return self.get_prices_in_predefined_dates([stock.stock_symbol]).get(stock.stock_symbol, [])
 
-        for target_date in date_intervals.values():
-            # Convert target_date to timezone-naive Timestamp
-            target_timestamp = pd.Timestamp(target_date).tz_localize(None)
-            
-            # find the closest date in the stock data
-            closest_date = min(stock_data.index, key=lambda x: abs(x - target_timestamp))
-            closest_price = stock_data.loc[closest_date]['Close']
-            stock_price = StockPrice(
-                stock_symbol=stock_symbol[:-3],  # remove .IS from the end
-                date=closest_date.date(),
-                close_price=closest_price
-            )
-            stock_prices.append(stock_price)
+    def get_prices_in_predefined_dates(self, stock_symbols: List[str]) -> Dict[str, List[StockPrice]]:
+        """
+        Prices of many stocks at the predefined dates (today, 1 week, 1 month, ... 5 years ago).
+        The 5 year histories come from the local price store (only gaps are downloaded) with a single query,
+        and every target date is resolved to the closest trading day with a binary search.
+        Symbols that are not in the stocks table are left out.
+        """
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in stock_symbols))
+        known = [row[0] for row in self.db.query(Stock.stock_symbol).filter(Stock.stock_symbol.in_(symbols)).all()]
+        if not known:
+            return {}
+
+        today = date.today()
+        targets = np.array(
+            [today - timedelta(days=days) for days in PREDEFINED_DATE_OFFSETS.values()], dtype="datetime64[D]"
+        )
+        # a week of slack so the five year target has trading days on both sides
+        start = today - timedelta(days=max(PREDEFINED_DATE_OFFSETS.values()) + 7)
+
+        history = PriceHistoryService(self.db)
+        history.sync_many(known, start, today)
+        closes_by_symbol = history.get_close_history(known, start, today + timedelta(days=1))
 
-        return stock_prices
+        result = {}
+        for stock_symbol, (dates, closes) in closes_by_symbol.items():
+            result[stock_symbol] = [
+                StockPrice(
+                    stock_symbol=stock_symbol,
+                    date=dates[i].item(),
+                    close_price=closes[i]
+                )
+                for i in _nearest_indices(dates, targets)
+            ]
+        return result
 
 
         
@@ -379,176 +879,34 @@ class StockService:
         """
         Fetch and add quarterly income statement data for the given stock symbol.
         """
-        try:
-            # check if the stock exists
-            stock = self.db.query(Stock).filter(Stock.stock_symbol == stock_symbol).first()
-            if stock is None:
-                raise ValueError(f"Stock with symbol {stock_symbol} does not exists")
-            
-            # add .IS to the end of the stock symbol since yahoo finance excepts that
-            stock_symbol += ".IS"
-
-            stock = yf.Ticker(stock_symbol)
-            income_statement = stock.quarterly_financials
-
-            if income_statement.empty:
-                print(f"No income statement data available for {stock_symbol}.")
-                return
-
-            for quarter, data in income_statement.items():
-                # Strip timestamp from the quarter if it exists
-                quarter_date = datetime.fromisoformat(str(quarter).split()[0]).date()
-
-                # check if revenue is null, if it is, do not add the record
-                if data.get("Total Revenue", 0) is None:
-                    continue
-
-                financial = Financial(
-                    stock_symbol=stock_symbol[:-3], # remove .IS from the end
-                    quarter=quarter_date,
-                    revenue=Decimal(data.get("Total Revenue", 0)) if not pd.isna(data.get("Total Revenue", 0)) else None,
-                    gross_profit=Decimal(data.get("Gross Profit", 0)) if not pd.isna(data.get("Gross Profit", 0)) else None,
-                    operating_income=Decimal(data.get("Operating Income", 0)) if not pd.isna(data.get("Operating Income", 0)) else None,
-                    net_profit=Decimal(data.get("Net Income", 0)) if not pd.isna(data.get("Net Income", 0)) else None,
-                    eps=data.get("Earnings Per Share", None),
-                    operating_margin=(
-                        Decimal(data.get("Operating Income", 0)) / Decimal(data.get("Total Revenue", 1)) * 100
-                        if not pd.isna(data.get("Operating Income", 0)) and not pd.isna(data.get("Total Revenue", 1))
-                        else None
-                    ),
-                )
-                self.db.add(financial)
-
-            self.db.commit()
-            print(f"Income statement data for {stock_symbol[:-3]} added successfully.")
-        except Exception as e:
-            self.db.rollback()
-            print(f"An error occurred while adding income statement data: {e}")
+        self._refresh_fundamentals(stock_symbol, ("income_statement",))
 
     def add_balance_sheet(self, stock_symbol: str):
         """
         Fetch and add quarterly balance sheet data for the given stock symbol.
         """
-        try:    
-            # check if the stock exists
-            stock = self.db.query(Stock).filter(Stock.stock_symbol == stock_symbol).first()
-            if stock is None:
-                raise ValueError(f"Stock with symbol {stock_symbol} does not exists")
-            
-            # add .IS to the end of the stock symbol since yahoo finance excepts that
-            stock_symbol += ".IS"
-
-            stock = yf.Ticker(stock_symbol)
-            balance_sheet = stock.quarterly_balancesheet
-
-            if balance_sheet.empty:
-                print(f"No balance sheet data available for {stock_symbol}.")
-                return
-
-            for quarter, data in balance_sheet.items():
-                # Strip timestamp from the quarter if it exists
-                quarter_date = datetime.fromisoformat(str(quarter).split()[0]).date()
-
-                # check if total assets is null, if it is, do not add the record
-                if data.get("Total Assets", 0) is None:
-                    continue
-
-                balance = BalanceSheet(
-                    stock_symbol=stock_symbol[:-3],  # remove .IS from the end
-                    quarter=quarter_date,
-                    total_assets=Decimal(data.get("Total Assets", 0)) if not pd.isna(data.get("Total Assets", 0)) else None,
-                    total_liabilities=Decimal(data.get("Total Liabilities Net Minority Interest", 0)) if not pd.isna(data.get("Total Liabilities Net Minority Interest", 0)) else None,
-                    total_equity=Decimal(data.get("Ordinary Shares Number", 0)) if not pd.isna(data.get("Ordinary Shares Number", 0)) else None,
-                    current_assets=Decimal(data.get("Current Assets", 0)) if not pd.isna(data.get("Current Assets", 0)) else None,
-                    current_liabilities=Decimal(data.get("Current Liabilities", 0)) if not pd.isna(data.get("Current Liabilities", 0)) else None,
-                )
-                self.db.add(balance)
-
-            self.db.commit()
-            print(f"Balance sheet data for {stock_symbol[:-3]} added successfully.")
-        except Exception as e:
-            self.db.rollback()
-            print(f"An error occurred while adding balance sheet data: {e}")
+        self._refresh_fundamentals(stock_symbol, ("balance_sheet",))
 
     def add_cash_flow(self, stock_symbol: str):
         """
         Fetch and add quarterly cash flow data for the given stock symbol.
         """
-        try:
-            # check if the stock exists
-            stock = self.db.query(Stock).filter(Stock.stock_symbol == stock_symbol).first()
-            if stock is None:
-                raise ValueError(f"Stock with symbol {stock_symbol} does not exists")
-
-            # add .IS to the end of the stock symbol since yahoo finance excepts that
-            stock_symbol += ".IS"
-
-            stock = yf.Ticker(stock_symbol)
-            cash_flow = stock.quarterly_cashflow
-
-            if cash_flow.empty:
-                print(f"No cash flow data available for {stock_symbol}.")
-                return
-
-            for quarter, data in cash_flow.items():
-                quarter_date = datetime.fromisoformat(str(quarter).split()[0]).date()
-
-                # check if operating cash flow is null, if it is, do not add the record
-                if data.get("free_cash_flow", 0) is None:
-                    continue 
-
-                flow = CashFlow(
-                    stock_symbol=stock_symbol[:-3],  # remove .IS from the end
-                    quarter=quarter_date,
-                    operating_cash_flow=Decimal(data.get("Net Cash Provided by Operating Activities", 0)) if not pd.isna(data.get("Net Cash Provided by Operating Activities", 0)) else None,
-                    investing_cash_flow=Decimal(data.get("Net Cash Used for Investing Activities", 0)) if not pd.isna(data.get("Net Cash Used for Investing Activities", 0)) else None,
-                    financing_cash_flow=Decimal(data.get("Net Cash Used Provided by Financing Activities", 0)) if not pd.isna(data.get("Net Cash Used Provided by Financing Activities", 0)) else None,
-                    free_cash_flow=Decimal(data.get("Free Cash Flow", 0)) if not pd.isna(data.get("Free Cash Flow", 0)) else None,
-                    capital_expenditures=Decimal(data.get("Capital Expenditure", 0)) if not pd.isna(data.get("Capital Expenditure", 0)) else None,
-                )
-                self.db.add(flow)
-
-            self.db.commit()
-            print(f"Cash flow data for {stock_symbol[:-3]} added successfully.")
-        except Exception as e:
-            self.db.rollback()
-            print(f"An error occurred while adding cash flow data: {e}")
+        self._refresh_fundamentals(stock_symbol, ("cash_flow",))
 
     def add_dividend(self, stock_symbol: str):
         """
         Fetch and add dividend data for the given stock symbol.
         """
-        try:
-            # check if the stock exists
-            stock = self.db.query(Stock).filter(Stock.stock_symbol == stock_symbol).first()
-            if stock is None:
-                raise ValueError(f"Stock with symbol {stock_symbol} does not exists")
-
-            # add .IS to the end of the stock symbol since yahoo finance excepts that
-            stock_symbol += ".IS"
-
-            stock = yf.Ticker(stock_symbol)
-            dividends = stock.dividends
-
-            if dividends.empty:
-                print(f"No dividend data available for {stock_symbol}.")
-                return
-
-            for date, amount in dividends.items():
-                dividend = Dividend(
-                    stock_symbol=stock_symbol[:-3],  # remove .IS from the end
-                    payment_date=date.date(),
-                    amount=Decimal(amount),
-                )
-                self.db.add(dividend)
+        self._refresh_fundamentals(stock_symbol, ("dividends",))
 
-            self.db.commit()
-            print(f"Dividend data for {stock_symbol[:-3]} added successfully.")
+    def _refresh_fundamentals(self, stock_symbol: str, statements):
+        try:
+            written = FundamentalsPipeline(self.db).refresh(stock_symbol, statements)
+            print(f"Fundamentals for {stock_symbol.upper()} refreshed: {written}")
         except Exception as e:
-            self.db.rollback()
-            print(f"An error occurred while adding dividend data: {e}")
+            print(f"An error occurred while adding {', '.join(statements)} data: {e}")
 
-    # services related to returning them
+    # services related to returning them
 
     # Function to return all financial data for a given stock symbol
     def get_financial_data(self, stock_symbol: str) -> List[Financial]:
@@ -654,35 +1012,41 @@ class StockService:
     
 
     # services related to sectors
-    def get_sector_info(self, sector_id: int): 
-        sector = self.db.query(Sector).filter(Sector.sector_id == sector_id).first()
-        if not sector:
+    def get_sector_info(self, sector_id: int):
+        stats = SectorStatsService(self.db).get(sector_id)
+        if stats is None:
             raise ValueError(f"No sector with id {sector_id} exists")
-        
-        # we will collect some info about the sector
-        number_of_companies_from_that_sector = self.db.query(Stock).filter(Stock.sector_id == sector_id).count()
-        
-        total_market_cap = self.db.query(Stock).filter(Stock.sector_id == sector_id).with_entities(Stock.market_cap).all()
-        total_market_cap = sum([float(x[0]) for x in total_market_cap])
-
-        # first three companies with the highest market cap
-        top_3_companies = self.db.query(Stock).filter(Stock.sector_id == sector_id).order_by(Stock.market_cap.desc()).limit(3).all()
 
         return {
-            "sector": sector,
-            "number_of_companies": number_of_companies_from_that_sector,
-            "total_market_cap": total_market_cap,
-            "top_3_companies": top_3_companies
-        }        
+            "sector": stats.sector,
+            "number_of_companies": stats.company_count,
+            "total_market_cap": float(stats.total_market_cap),
+            "median_market_cap": float(stats.median_market_cap) if stats.median_market_cap is not None else None,
+            "top_3_companies": (stats.top_companies or [])[:3],
+            "top_companies": stats.top_companies or [],
+            "updated_at": stats.updated_at,
+        }
+
+    # aggregates of every sector for the sector dashboard, one read
+    def get_all_sector_stats(self) -> List[dict]:
+        return [
+            {
+                "sector": stats.sector,
+                "number_of_companies": stats.company_count,
+                "total_market_cap": float(stats.total_market_cap),
+                "median_market_cap": float(stats.median_market_cap) if stats.median_market_cap is not None else None,
+                "top_companies": stats.top_companies or [],
+                "updated_at": stats.updated_at,
+            }
+            for stats in SectorStatsService(self.db).get_all()
+        ]
 
     # function to get all stocks in a sector
     def get_stocks_in_sector(self, sector: str) -> List[Stock]:
-        sector_obj = self.db.query(Sector).filter(Sector.name == sector).first()
-        if sector_obj == None:
+        stocks = self.db.query(Stock).join(Sector).filter(Sector.name == sector).all()
+        if not stocks and self.db.query(Sector.sector_id).filter(Sector.name == sector).first() is None:
             raise ValueError(f"No sector with name {sector} exists")
-        if sector_obj:
-            return self.db.query(Stock).filter(Stock.sector_id == sector_obj.sector_id).all()
-        return []
+        return stocks
     
     # function to get all sectors
     def get_all_sectors(self) -> List[Sector]:
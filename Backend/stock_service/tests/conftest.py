@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# the service modules import utils.db_context / utils.cache at import time: point them at a throwaway
+# sqlite file and an unreachable Redis (the cache then runs disabled)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/stock_service_tests.db")
+os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:1/0")
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the service's own packages, and Backend/ for the shared `common` package
+sys.path[:0] = [SERVICE_DIR, os.path.dirname(SERVICE_DIR)]
+
+from models.models import Base  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def redis_cache():
+    """A RedisCache on an in-memory fakeredis server; two caches on the same server act as two workers."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from utils.cache import RedisCache
+
+    server = fakeredis.FakeServer()
+
+    def make():
+        redis_cache = RedisCache()
+        redis_cache.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        redis_cache.binary_client = fakeredis.FakeRedis(server=server)
+        return redis_cache
+
+    return make
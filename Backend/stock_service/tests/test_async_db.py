@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from models.models import Base, Sector, Stock
+from services.async_stock_service import AsyncStockService
+from utils import db_context
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture
+def async_db(tmp_path, monkeypatch):
+    path = tmp_path / "async.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Sector(sector_id=1, name="Banks"))
+        session.add(Stock(stock_symbol="AKBNK", name="Akbank", sector_id=1))
+        session.commit()
+    engine.dispose()
+
+    monkeypatch.setattr(db_context, "ASYNC_DB_ENABLED", True)
+    monkeypatch.setattr(db_context, "ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(db_context, "_async_engine", None)
+    monkeypatch.setattr(db_context, "_async_session_factory", None)
+
+
+async def _read_with(dependency, read):
+    # what FastAPI does with a generator dependency: take the session, then close it after the request
+    sessions = dependency()
+    db = await sessions.__anext__()
+    try:
+        return await read(db)
+    finally:
+        await sessions.aclose()
+
+
+def test_read_db_yields_an_async_session_when_enabled(async_db):
+    async def read(db):
+        assert not isinstance(db, Session)
+        stock = await AsyncStockService(db).get_stock("akbnk")
+        return stock.name
+
+    async def run():
+        try:
+            name = await _read_with(db_context.get_read_db, read)
+            assert db_context.get_async_engine() is db_context.get_async_engine()
+            return name
+        finally:
+            await db_context.dispose_async_engine()
+
+    assert asyncio.run(run()) == "Akbank"
+
+
+def test_read_db_falls_back_to_a_sync_session(monkeypatch):
+    monkeypatch.setattr(db_context, "ASYNC_DB_ENABLED", False)
+
+    async def read(db):
+        return isinstance(db, Session)
+
+    assert asyncio.run(_read_with(db_context.get_read_db, read))
@@ -0,0 +1,44 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_concurrent_misses_fetch_once(redis_cache):
+    cache = redis_cache()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"price": 41.5}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: cache.get_or_set("stock_price:AKBNK.IS", fetch, ttl=60), range(8)))
+
+    assert results == [{"price": 41.5}] * 8
+    assert len(calls) == 1
+    assert cache.stats()["single_flight"]["coalesced"] == 7
+
+
+def test_other_worker_waits_for_the_lock_holder(redis_cache):
+    leader, follower = redis_cache(), redis_cache()
+    # the leader worker holds the fetch lock of the key
+    leader.redis_client.set("lock:stock_price:AKBNK.IS", "leader", ex=30)
+
+    def finish():
+        time.sleep(0.2)
+        leader.set_cache("stock_price:AKBNK.IS", 41.5, ttl=60)
+        leader.redis_client.delete("lock:stock_price:AKBNK.IS")
+
+    threading.Thread(target=finish).start()
+    fetched = []
+    value = follower.get_or_set("stock_price:AKBNK.IS", lambda: fetched.append(1) or 40.0, ttl=60)
+
+    assert value == 41.5
+    assert fetched == []
+
+
+def test_failed_fetch_is_not_cached(redis_cache):
+    cache = redis_cache()
+    assert cache.get_or_set("stock_price:AKBNK.IS", lambda: None, ttl=60) is None
+    assert cache.get_or_set("stock_price:AKBNK.IS", lambda: 41.5, ttl=60) == 41.5
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+KEY = "stock_price:AKBNK.IS"
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_fresh_value_is_served_without_fetching(redis_cache):
+    cache = redis_cache()
+    cache.set_cache(KEY, 41.5, ttl=60, stale_ttl=300)
+
+    entry = cache.get_or_refresh(KEY, lambda: pytest.fail("fetched a fresh key"), ttl=60, stale_ttl=300)
+
+    assert entry.value == 41.5
+    assert not entry.stale
+
+
+def test_stale_value_is_served_while_one_refresh_runs(redis_cache):
+    cache = redis_cache()
+    cache.set_cache(KEY, 41.5, ttl=60, stale_ttl=300)
+    # past the soft TTL, still inside the hard one
+    cache.redis_client.expire(KEY, 100)
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return 42.0
+
+    first = cache.get_or_refresh(KEY, fetch, ttl=60, stale_ttl=300)
+    cache.local.clear()
+    second = cache.get_or_refresh(KEY, fetch, ttl=60, stale_ttl=300)
+    release.set()
+
+    assert (first.value, first.stale) == (41.5, True)
+    assert (second.value, second.stale) == (41.5, True)
+    assert _wait_for(lambda: cache.get_cache(KEY) == 42.0 and not cache._refreshing)
+    assert len(calls) == 1
+
+
+def test_failed_fetch_falls_back_to_the_last_good_value(redis_cache):
+    cache = redis_cache()
+    cache.set_cache(KEY, 41.5, ttl=60, stale_ttl=300, last_good_ttl=3600)
+    # past the hard TTL: only the last-known-good copy is left
+    cache.redis_client.delete(KEY)
+    cache.local.clear()
+
+    def fetch():
+        raise ConnectionError("yahoo is down")
+
+    entry = cache.get_or_refresh(KEY, fetch, ttl=60, stale_ttl=300, last_good_ttl=3600)
+
+    assert (entry.value, entry.stale) == (41.5, True)
+    with pytest.raises(ConnectionError):
+        cache.get_or_refresh("stock_price:GARAN.IS", fetch, ttl=60, stale_ttl=300, last_good_ttl=3600)
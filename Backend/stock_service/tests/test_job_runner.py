@@ -0,0 +1,51 @@
+import threading
+
+from services import job_runner as job_runner_module
+from services.job_runner import JobRunner
+
+
+class _RecordingCache:
+    def __init__(self):
+        self.values = {}
+        self.writes = 0
+
+    def set_cache(self, key, value, ttl=600):
+        self.writes += 1
+        self.values[key] = {**value, "items": {k: dict(v) for k, v in value["items"].items()}}
+        return True
+
+    def get_cache(self, key):
+        return self.values.get(key)
+
+
+def test_running_job_is_written_to_redis_throttled(monkeypatch):
+    cache = _RecordingCache()
+    monkeypatch.setattr(job_runner_module, "cache", cache)
+    monkeypatch.setattr(job_runner_module, "JOB_SNAPSHOT_INTERVAL", 60.0)
+    runner = JobRunner(max_workers=4)
+    symbols = [f"S{i:03d}" for i in range(200)]
+    done = threading.Event()
+
+    def task(symbol):
+        if symbol == "S007":
+            raise ValueError("no data")
+        if symbol == symbols[-1]:
+            done.set()
+        return None
+
+    job = runner.submit("onboarding", symbols, task, skipped={"S000": "already exists"})
+    assert done.wait(5)
+    for _ in range(100):
+        stored = runner.get(job["job_id"])
+        if stored["status"] == "finished":
+            break
+        done.wait(0.01)
+    runner.shutdown()
+
+    # the submit and the finish, instead of two writes per item
+    assert cache.writes == 2
+    assert stored["status"] == "finished"
+    assert stored["counts"] == {"skipped": 1, "failed": 1, "succeeded": 198}
+    assert stored["items"]["S007"]["error"] == "no data"
+    # finished jobs are served from Redis
+    assert runner._jobs == {}
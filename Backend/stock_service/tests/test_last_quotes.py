@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from services import stock_service
+from services.stock_service import _download_last_quotes
+
+
+def test_last_quotes_skip_tickers_that_have_not_traded_today(monkeypatch):
+    index = pd.date_range("2024-03-04", periods=3, freq="B", name="Date")
+    closes = pd.DataFrame(
+        {"AKBNK.IS": [10.0, 11.0, 12.0], "GARAN.IS": [20.0, 22.0, np.nan], "THYAO.IS": [np.nan, np.nan, 30.0]},
+        index=index,
+    )
+    frame = pd.concat({"Close": closes}, axis=1)
+    monkeypatch.setattr(stock_service.yahoo, "download", lambda yahoo_symbols, **kwargs: frame)
+
+    quotes = _download_last_quotes(["AKBNK.IS", "GARAN.IS", "THYAO.IS"])
+
+    assert quotes == {
+        "AKBNK.IS": (12.0, 11.0),
+        # before its first trade of the day the change is the previous session's, not 0%
+        "GARAN.IS": (22.0, 20.0),
+        "THYAO.IS": (30.0, None),
+    }
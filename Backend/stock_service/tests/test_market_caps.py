@@ -0,0 +1,40 @@
+from datetime import datetime
+from decimal import Decimal
+
+from models.models import Sector, Stock
+from services import stock_service
+from services.stock_service import StockService
+
+
+def test_market_caps_are_refreshed_least_recently_checked_first(db, monkeypatch):
+    db.add(Sector(sector_id=1, name="Banks"))
+    for symbol, checked_at in (("AKBNK", datetime(2024, 1, 3)), ("GARAN", datetime(2024, 1, 1)),
+                               ("THYAO", datetime(2024, 1, 2))):
+        db.add(Stock(stock_symbol=symbol, name=symbol, sector_id=1, market_cap=Decimal(1), last_updated=checked_at))
+    db.commit()
+
+    fetched = []
+
+    def fetch_info(yahoo_symbol):
+        fetched.append(yahoo_symbol)
+        # THYAO's info comes back without a market cap
+        return {"marketCap": 2e9} if yahoo_symbol == "GARAN.IS" else {"longName": yahoo_symbol}
+
+    monkeypatch.setattr(stock_service, "_fetch_info", fetch_info)
+    monkeypatch.setattr(stock_service, "_cache_infos", lambda infos: None)
+    # the sector stats upsert is MySQL specific
+    monkeypatch.setattr(stock_service.SectorStatsService, "recompute_many", lambda self, sector_ids: db.commit())
+    invalidated = []
+    monkeypatch.setattr(stock_service.search_index, "invalidate", lambda: invalidated.append(1))
+
+    refreshed = StockService(db).refresh_market_caps(["AKBNK", "GARAN", "THYAO"], limit=2)
+
+    assert refreshed == 2
+    assert sorted(fetched) == ["GARAN.IS", "THYAO.IS"]
+    stocks = {stock.stock_symbol: stock for stock in db.query(Stock)}
+    assert stocks["GARAN"].market_cap == Decimal("2000000000.00")
+    # the search index orders by market cap
+    assert invalidated == [1]
+    # both go to the back of the rotation, AKBNK is next
+    assert stocks["GARAN"].last_updated > stocks["AKBNK"].last_updated
+    assert stocks["THYAO"].last_updated > stocks["AKBNK"].last_updated
@@ -0,0 +1,41 @@
+import numpy as np
+
+from services.stock_service import _nearest_indices
+
+
+def _dates(*days):
+    return np.array(days, dtype="datetime64[D]")
+
+
+def test_each_target_gets_the_closest_trading_day():
+    dates = _dates("2024-03-01", "2024-03-04", "2024-03-05", "2024-03-08")
+    targets = _dates("2024-03-02", "2024-03-03", "2024-03-05", "2024-03-07")
+
+    assert _nearest_indices(dates, targets).tolist() == [0, 1, 2, 3]
+
+
+def test_tie_goes_to_the_earlier_date():
+    dates = _dates("2024-03-05", "2024-03-07")
+
+    assert _nearest_indices(dates, _dates("2024-03-06")).tolist() == [0]
+
+
+def test_targets_outside_the_range_clamp_to_the_ends():
+    dates = _dates("2024-03-04", "2024-03-05", "2024-03-06")
+    targets = _dates("2023-12-31", "2024-12-31")
+
+    assert _nearest_indices(dates, targets).tolist() == [0, 2]
+
+
+def test_single_date_matches_everything():
+    assert _nearest_indices(_dates("2024-03-04"), _dates("2024-01-01", "2024-06-01")).tolist() == [0, 0]
+
+
+def test_matches_a_linear_scan():
+    rng = np.random.default_rng(5)
+    dates = np.sort(np.unique(rng.integers(19000, 20000, 300))).astype("datetime64[D]")
+    targets = rng.integers(18900, 20100, 500).astype("datetime64[D]")
+
+    # the earliest of the closest dates, as min() over (distance, index) picks it
+    expected = [min(range(len(dates)), key=lambda i: (abs(dates[i] - target), i)) for target in targets]
+    assert _nearest_indices(dates, targets).tolist() == expected
@@ -0,0 +1,139 @@
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from models.models import StockPrice
+from services import price_history_service
+from services.price_history_service import PriceHistoryService
+
+START = date(2024, 3, 4)
+END = date(2024, 3, 8)
+
+
+def _download(tickers, dividends=()):
+    """A multi-ticker yfinance frame in which only `tickers` have bars, and `dividends` a dividend on the last day."""
+    index = pd.date_range(START, END, freq="B", name="Date")
+    columns = {}
+    for ticker in tickers:
+        for field in ("Open", "High", "Low", "Close"):
+            columns[(field, ticker)] = [10.0 + i for i in range(len(index))]
+        columns[("Volume", ticker)] = [1000] * len(index)
+        columns[("Dividends", ticker)] = [0.0] * (len(index) - 1) + [1.5 if ticker in dividends else 0.0]
+    return pd.DataFrame(columns, index=index)
+
+
+class _DictCache:
+    def __init__(self):
+        self.values = {}
+
+    def get_many(self, keys):
+        return {key: self.values[key] for key in keys if key in self.values}
+
+    def set_many(self, values, ttl=600, **kwargs):
+        self.values.update(values)
+        return True
+
+
+@pytest.fixture
+def service(db, monkeypatch):
+    service = PriceHistoryService(db)
+    service.downloads = []
+    service.covered = {}
+    service.published = set()
+
+    # the upserts are MySQL specific; record what would be written instead
+    monkeypatch.setattr(service, "_upsert_rows", lambda rows, chunk_size=None: len(rows))
+    monkeypatch.setattr(
+        service, "_extend_coverage", lambda symbol, start, end: service.covered.__setitem__(symbol, (start, end))
+    )
+    monkeypatch.setattr(
+        service, "_reset_coverage", lambda symbol, start, end: service.covered.__setitem__(symbol, ("reset", start, end))
+    )
+    monkeypatch.setattr(price_history_service, "cache", _DictCache())
+    monkeypatch.setattr(
+        price_history_service.invalidation, "publish", lambda kind, symbols: service.published.update(symbols)
+    )
+    return service
+
+
+def _yahoo_returns(monkeypatch, service, tickers, dividends=()):
+    def download(yahoo_symbols, **kwargs):
+        service.downloads.append(list(yahoo_symbols))
+        return _download([ticker for ticker in tickers if ticker in yahoo_symbols], dividends)
+
+    monkeypatch.setattr(price_history_service.yf, "download", download)
+
+
+def test_partial_batch_only_covers_returned_symbols(service, monkeypatch):
+    _yahoo_returns(monkeypatch, service, ["AKBNK.IS"])
+
+    written = service.sync_many(["AKBNK", "GARAN"], START, END)
+
+    assert written == 5
+    assert service.covered == {"AKBNK": (START, END)}
+
+
+def test_symbol_without_rows_is_retried_after_the_window(service, monkeypatch):
+    _yahoo_returns(monkeypatch, service, ["AKBNK.IS"])
+    service.sync_many(["AKBNK", "GARAN"], START, END)
+
+    # inside the retry window GARAN is not downloaded again
+    service.sync_many(["GARAN"], START, END)
+    assert service.downloads == [["AKBNK.IS", "GARAN.IS"]]
+
+    # once the empty marker expired it is, and covered as soon as Yahoo has its bars
+    price_history_service.cache.values.clear()
+    _yahoo_returns(monkeypatch, service, ["GARAN.IS"])
+    service.sync_many(["GARAN"], START, END)
+    assert service.downloads[-1] == ["GARAN.IS"]
+    assert service.covered["GARAN"] == (START, END)
+
+
+def test_only_new_or_changed_completed_bars_are_published(service, db, monkeypatch):
+    _yahoo_returns(monkeypatch, service, ["AKBNK.IS", "GARAN.IS"])
+    # AKBNK already has exactly these bars, GARAN has a different close on the last day
+    for symbol in ("AKBNK", "GARAN"):
+        for i, day in enumerate(pd.date_range(START, END, freq="B").date):
+            close = Decimal(f"{10.0 + i:.2f}") if (symbol, day) != ("GARAN", END) else Decimal("99.00")
+            db.add(StockPrice(
+                stock_symbol=symbol, date=day, open_price=close, high_price=close, low_price=close,
+                close_price=close, volume=1000,
+            ))
+    db.commit()
+
+    service.sync_many(["AKBNK", "GARAN"], START, END)
+
+    assert service.published == {"GARAN"}
+
+
+def test_todays_bar_alone_is_not_published(service, monkeypatch):
+    today = pd.Timestamp.today().normalize()
+    frame = pd.DataFrame(
+        {(field, "AKBNK.IS"): [10.0] for field in ("Open", "High", "Low", "Close", "Volume")},
+        index=pd.DatetimeIndex([today], name="Date"),
+    )
+    monkeypatch.setattr(price_history_service.yf, "download", lambda yahoo_symbols, **kwargs: frame)
+
+    service.sync_many(["AKBNK"], today.date(), today.date())
+
+    assert service.published == set()
+
+
+def test_range_without_any_bars_is_covered(service, monkeypatch):
+    saturday, sunday = date(2024, 3, 9), date(2024, 3, 10)
+    _yahoo_returns(monkeypatch, service, [])
+
+    service.sync_many(["AKBNK", "GARAN"], saturday, sunday)
+
+    assert service.covered == {"AKBNK": (saturday, sunday), "GARAN": (saturday, sunday)}
+
+
+def test_corporate_action_resets_the_coverage(service, monkeypatch):
+    _yahoo_returns(monkeypatch, service, ["AKBNK.IS", "GARAN.IS"], dividends=["GARAN.IS"])
+
+    service.sync_many(["AKBNK", "GARAN"], START, END)
+
+    assert service.covered == {"AKBNK": (START, END), "GARAN": ("reset", START, END)}
+    assert "GARAN" in service.published
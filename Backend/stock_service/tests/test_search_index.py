@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+import pytest
+
+from models.models import Sector, Stock
+from utils.search_index import StockSearchIndex, _IndexState, fold
+
+
+def _entry(symbol, name, market_cap=None):
+    return {"stock_symbol": symbol, "name": name, "sector_id": 1, "market_cap": market_cap, "last_updated": None}
+
+
+@pytest.mark.parametrize("text", ["İŞBANK", "isbank", "ISBANK", "işbank", "Işbank"])
+def test_dotted_and_dotless_i_fold_alike(text):
+    assert fold(text) == "isbank"
+
+
+def test_fold_drops_turkish_letters_and_accents():
+    assert fold("  Ereğli Demir Çelik  ") == "eregli demir celik"
+    assert fold("Türk Hava Yolları") == "turk hava yollari"
+    assert fold("Café Öz") == "cafe oz"
+
+
+@pytest.fixture
+def index():
+    return _IndexState([
+        _entry("ISCTR", "Türkiye İş Bankası", 300e9),
+        _entry("ISMEN", "İş Yatırım Menkul Değerler", 50e9),
+        _entry("GARAN", "Türkiye Garanti Bankası", 400e9),
+        _entry("THYAO", "Türk Hava Yolları", 350e9),
+        _entry("ISDMR", "İskenderun Demir ve Çelik", None),
+        _entry("AKBNK", "Akbank", 250e9),
+    ])
+
+
+def _symbols(results):
+    return [entry["stock_symbol"] for entry in results]
+
+
+def test_exact_symbol_first_then_symbol_prefixes_by_market_cap(index):
+    assert _symbols(index.search("ısmen", 10))[0] == "ISMEN"
+    # symbol prefixes, bigger companies first, unknown market cap last
+    assert _symbols(index.search("is", 3)) == ["ISCTR", "ISMEN", "ISDMR"]
+
+
+def test_name_matches_rank_by_tier_then_market_cap(index):
+    # "Bankası" is a later word of GARAN and ISCTR (bigger first), Akbank only contains it
+    assert _symbols(index.search("bank", 10)) == ["GARAN", "ISCTR", "AKBNK"]
+    # all three names start with it: by market cap
+    assert _symbols(index.search("türk", 10)) == ["GARAN", "THYAO", "ISCTR"]
+
+
+def test_substring_needs_the_letters_in_order(index):
+    assert _symbols(index.search("yoll", 10)) == ["THYAO"]
+    assert index.search("llo", 10) == []
+    assert index.search("  ", 10) == []
+
+
+def test_invalidated_index_picks_up_new_market_caps(db):
+    db.add(Sector(sector_id=1, name="Banks"))
+    db.add(Stock(stock_symbol="ISCTR", name="Türkiye İş Bankası", sector_id=1, market_cap=Decimal(300)))
+    db.add(Stock(stock_symbol="ISMEN", name="İş Yatırım", sector_id=1, market_cap=Decimal(50)))
+    db.commit()
+    index = StockSearchIndex()
+    assert _symbols(index.search("is", db, 2)) == ["ISCTR", "ISMEN"]
+
+    db.get(Stock, "ISMEN").market_cap = Decimal(500)
+    db.commit()
+    index.invalidate()
+
+    assert _symbols(index.search("is", db, 2)) == ["ISMEN", "ISCTR"]
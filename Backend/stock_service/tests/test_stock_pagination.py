@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from models.models import Sector, Stock
+from services.stock_service import StockService
+
+
+def _add_stocks(db, changes):
+    db.add(Sector(sector_id=1, name="Banks"))
+    for symbol, change in changes.items():
+        db.add(Stock(stock_symbol=symbol, name=symbol, sector_id=1, price_change_pct=change))
+    db.commit()
+
+
+def _all_pages(service, **kwargs):
+    symbols, cursor = [], None
+    for _ in range(20):
+        stocks, cursor = service.get_stocks_page(cursor=cursor, **kwargs)
+        symbols.extend(stock.stock_symbol for stock in stocks)
+        if cursor is None:
+            return symbols
+    raise AssertionError(f"pagination did not end: {symbols}")
+
+
+def test_keyset_page_boundary_between_equal_price_changes(db):
+    # AKBNK and GARAN share a price change that is not exact in binary floating point,
+    # and limit=1 puts a page boundary between them
+    _add_stocks(db, {
+        "AKBNK": Decimal("1.1000"),
+        "GARAN": Decimal("1.1000"),
+        "THYAO": Decimal("-0.3333"),
+        "ASELS": Decimal("2.0100"),
+        "SISE": None,
+    })
+    service = StockService(db)
+
+    assert _all_pages(service, sort="price_change", order="asc", limit=1) == ["THYAO", "AKBNK", "GARAN", "ASELS", "SISE"]
+    assert _all_pages(service, sort="price_change", order="desc", limit=1) == ["ASELS", "AKBNK", "GARAN", "THYAO", "SISE"]
+    assert _all_pages(service, sort="price_change", order="asc", limit=2) == ["THYAO", "AKBNK", "GARAN", "ASELS", "SISE"]
+
+
+def test_price_change_is_stored_quantized(db):
+    _add_stocks(db, {"AKBNK": None})
+    StockService(db)._store_quotes({"AKBNK": (11.0, 10.0 / 1.0000003)})
+
+    stored = db.get(Stock, "AKBNK").price_change_pct
+    assert stored == Decimal("10.0000")
@@ -1,39 +1,168 @@
 import redis
-import json
 import os
 import logging
-from typing import Optional, Any
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
+from typing import Optional, Any, Callable, Dict, List, NamedTuple, Set, Tuple
+
+from common import cache_codecs
+from common.cache_metrics import CacheMetrics, memory_footprint
 
 logger = logging.getLogger(__name__)
 
+# In-process tier in front of Redis: max entries and how long (seconds) an entry is served locally.
+# Kept short because another worker may change or delete the key in Redis meanwhile.
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "2048"))
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", "5"))
+# Longest time a single-flight fetch may take before waiting callers give up and fetch themselves
+SINGLE_FLIGHT_TIMEOUT = int(os.getenv("SINGLE_FLIGHT_TIMEOUT", "30"))
+# Threads refreshing entries that get_or_refresh served stale
+STALE_REFRESH_WORKERS = int(os.getenv("STALE_REFRESH_WORKERS", "4"))
+
+# Last-known-good copies of get_or_refresh entries live under this prefix
+LAST_GOOD_PREFIX = "lkg:"
+# Local-tier suffix for get_or_refresh results, which carry their age next to the value
+_ENTRY_SUFFIX = "#entry"
+
+# Release the single-flight lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LocalLRU:
+    """
+    Thread-safe, size-bounded LRU of decoded values with a per-entry expiry.
+    Values are shared between callers, so they must be treated as read-only.
+    """
+
+    def __init__(self, max_size: int = LOCAL_CACHE_SIZE, ttl: float = LOCAL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + min(self.ttl, ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_matching(self, pattern: str):
+        with self._lock:
+            for key in [key for key in self._entries if fnmatchcase(key, pattern)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _Flight:
+    """One in-progress fetch that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[Exception] = None
+
+
+class CachedValue(NamedTuple):
+    """Result of get_or_refresh."""
+    value: Any
+    # past its soft TTL, or a last-known-good copy served because the upstream fetch failed
+    stale: bool = False
+    # unix time the value was fetched from upstream, when known
+    stored_at: Optional[float] = None
+
+    @property
+    def as_of(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self.stored_at, tz=timezone.utc) if self.stored_at is not None else None
+
 class RedisCache:
     """
     Redis cache manager for caching stock data with 10-minute TTL.
+
+    Reads go through a small in-process LRU first (LOCAL_CACHE_TTL seconds), then Redis.
+    get_or_set coalesces concurrent misses of a key into one upstream fetch, within the process
+    and across workers (Redis lock). get_or_refresh adds stale-while-revalidate and a last-known-good
+    fallback on top of it for data whose upstream can be slow or down.
     """
 
     def __init__(self):
+        self.local = LocalLRU()
+        self._inflight: Dict[str, _Flight] = {}
+        self._inflight_lock = threading.Lock()
+        self._refreshing: Set[str] = set()
+        self._refresh_pool = ThreadPoolExecutor(max_workers=STALE_REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+        self._stats = {
+            "local": {"hits": 0, "misses": 0},
+            "redis": {"hits": 0, "misses": 0},
+            "single_flight": {"fetches": 0, "coalesced": 0},
+            "stale": {"served": 0, "refreshes": 0, "last_good": 0},
+        }
+        self._stats_lock = threading.Lock()
+        # per-namespace hits, latency and value sizes (see cache_metrics)
+        self.metrics = CacheMetrics()
+
         redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
         try:
             self.redis_client = redis.from_url(redis_url, decode_responses=True)
             # Test connection
             self.redis_client.ping()
+            # cached values are binary (see cache_codecs); locks and counters stay on the text client
+            self.binary_client = redis.from_url(redis_url)
             logger.info("Connected to Redis cache")
         except Exception as e:
             logger.warning(f"Redis connection failed: {e}. Cache will be disabled.")
             self.redis_client = None
+            self.binary_client = None
 
     def _is_connected(self) -> bool:
         """Check if Redis is connected."""
         return self.redis_client is not None
 
-    def set_cache(self, key: str, value: Any, ttl: int = 600) -> bool:
+    def set_cache(self, key: str, value: Any, ttl: int = 600, stale_ttl: int = 0, last_good_ttl: int = 0) -> bool:
         """
         Set a value in Redis cache with TTL.
 
         Args:
             key: Cache key
-            value: Value to cache (will be JSON serialized)
+            value: Value to cache (serialized by cache_codecs)
             ttl: Time to live in seconds (default: 600 = 10 minutes)
+            stale_ttl: Extra seconds the value is kept to be served stale by get_or_refresh
+            last_good_ttl: If set, also keep a last-known-good copy for this many seconds
 
         Returns:
             True if successful, False otherwise
@@ -42,10 +171,16 @@ class RedisCache:
             return False
 
         try:
-            json_value = json.dumps(value, default=str)
-            self.redis_client.setex(key, ttl, json_value)
+            started = time.perf_counter()
+            pipe = self.binary_client.pipeline(transaction=False)
+            size = self._queue_set(pipe, key, value, ttl, stale_ttl, last_good_ttl)
+            pipe.execute()
+            self.metrics.record_set({key: size}, time.perf_counter() - started)
+            self.local.set(key, value, ttl)
+            self.local.delete(key + _ENTRY_SUFFIX)
             return True
         except Exception as e:
+            self.metrics.record_error([key])
             logger.error(f"Cache set error for key {key}: {e}")
             return False
 
@@ -62,15 +197,147 @@ class RedisCache:
         if not self._is_connected():
             return None
 
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local", "hits")
+            self.metrics.local_hit(key)
+            return value
+        self._count("local", "misses")
+
         try:
-            cached_value = self.redis_client.get(key)
+            started = time.perf_counter()
+            cached_value = self.binary_client.get(key)
+            self.metrics.record_get([key], [bool(cached_value)], time.perf_counter() - started)
             if cached_value:
-                return json.loads(cached_value)
+                value = cache_codecs.decode(cached_value)
+                self._count("redis", "hits")
+                self.local.set(key, value)
+                return value
+            self._count("redis", "misses")
             return None
         except Exception as e:
+            self.metrics.record_error([key])
             logger.error(f"Cache get error for key {key}: {e}")
             return None
 
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Get several values from Redis cache in a single MGET round trip.
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Dict of key -> cached value, only for the keys that were found
+        """
+        if not self._is_connected() or not keys:
+            return {}
+
+        result = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                result[key] = value
+                self.metrics.local_hit(key)
+            else:
+                remote_keys.append(key)
+        self._count("local", "hits", len(result))
+        self._count("local", "misses", len(remote_keys))
+        if not remote_keys:
+            return result
+
+        try:
+            started = time.perf_counter()
+            cached_values = self.binary_client.mget(remote_keys)
+            self.metrics.record_get(remote_keys, [bool(v) for v in cached_values], time.perf_counter() - started)
+        except Exception as e:
+            self.metrics.record_error(remote_keys)
+            logger.error(f"Cache mget error for {len(remote_keys)} keys: {e}")
+            return result
+
+        for key, cached_value in zip(remote_keys, cached_values):
+            if not cached_value:
+                self._count("redis", "misses")
+                continue
+            try:
+                result[key] = cache_codecs.decode(cached_value)
+                self._count("redis", "hits")
+                self.local.set(key, result[key])
+            except Exception as e:
+                self.metrics.record_error([key])
+                logger.error(f"Cache decode error for key {key}: {e}")
+        return result
+
+    def set_many(self, values: Dict[str, Any], ttl: int = 600, stale_ttl: int = 0, last_good_ttl: int = 0) -> bool:
+        """
+        Set several values in Redis cache with one pipelined round trip.
+
+        Args:
+            values: Dict of key -> value (values are serialized by cache_codecs)
+            ttl: Time to live in seconds (default: 600 = 10 minutes)
+            stale_ttl: Extra seconds the values are kept to be served stale by get_or_refresh
+            last_good_ttl: If set, also keep last-known-good copies for this many seconds
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self._is_connected() or not values:
+            return False
+
+        try:
+            started = time.perf_counter()
+            pipe = self.binary_client.pipeline(transaction=False)
+            sizes = {
+                key: self._queue_set(pipe, key, value, ttl, stale_ttl, last_good_ttl)
+                for key, value in values.items()
+            }
+            pipe.execute()
+            self.metrics.record_set(sizes, time.perf_counter() - started)
+            for key, value in values.items():
+                self.local.set(key, value, ttl)
+                self.local.delete(key + _ENTRY_SUFFIX)
+            return True
+        except Exception as e:
+            self.metrics.record_error(values)
+            logger.error(f"Cache set_many error for {len(values)} keys: {e}")
+            return False
+
+    @staticmethod
+    def _queue_set(pipe, key: str, value: Any, ttl: int, stale_ttl: int, last_good_ttl: int) -> int:
+        """Queue the writes of one value on pipe; returns the encoded size in bytes."""
+        payload = cache_codecs.encode(value)
+        # the key lives until the hard TTL; get_or_refresh tells fresh from stale by the time left
+        pipe.setex(key, ttl + stale_ttl, payload)
+        if last_good_ttl:
+            pipe.setex(LAST_GOOD_PREFIX + key, last_good_ttl, payload)
+        return len(payload)
+
+    def get_ttls(self, keys: List[str]) -> Dict[str, int]:
+        """
+        Get the remaining time to live of several keys with one pipelined round trip.
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Dict of key -> remaining TTL in seconds, only for keys that exist and have an expiry
+        """
+        if not self._is_connected() or not keys:
+            return {}
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.ttl(key)
+            ttls = pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache ttl error for {len(keys)} keys: {e}")
+            return {}
+
+        # -2 means the key does not exist, -1 means it has no expiry
+        return {key: ttl for key, ttl in zip(keys, ttls) if ttl is not None and ttl >= 0}
+
     def delete_cache(self, key: str) -> bool:
         """
         Delete a value from Redis cache.
@@ -84,13 +351,55 @@ class RedisCache:
         if not self._is_connected():
             return False
 
+        self.local.delete(key)
+        self.local.delete(key + _ENTRY_SUFFIX)
         try:
             self.redis_client.delete(key)
             return True
         except Exception as e:
+            self.metrics.record_error([key])
             logger.error(f"Cache delete error for key {key}: {e}")
             return False
 
+    def evict_local(self, keys: List[str]):
+        """Drop keys from this process's local tier only, e.g. after another worker wrote them."""
+        for key in keys:
+            self.local.delete(key)
+            self.local.delete(key + _ENTRY_SUFFIX)
+
+    def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        """
+        Delete every key matching a Redis glob pattern (e.g. "stock_info:*").
+
+        Keys are found with SCAN, never KEYS (which blocks Redis on a large keyspace), and removed
+        with UNLINK in batches of batch_size so the memory is freed in the background.
+
+        Args:
+            pattern: Redis glob pattern
+            batch_size: SCAN count hint and keys per UNLINK
+
+        Returns:
+            Number of keys deleted
+        """
+        if not self._is_connected():
+            return 0
+
+        self.local.delete_matching(pattern)
+        self.local.delete_matching(pattern + _ENTRY_SUFFIX)
+        deleted = 0
+        try:
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self.redis_client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += self.redis_client.unlink(*batch)
+        except Exception as e:
+            logger.error(f"Cache delete error for pattern {pattern}: {e}")
+        return deleted
+
     def flush_all(self) -> bool:
         """
         Clear all cache (use with caution).
@@ -101,6 +410,7 @@ class RedisCache:
         if not self._is_connected():
             return False
 
+        self.local.clear()
         try:
             self.redis_client.flushdb()
             return True
@@ -108,6 +418,320 @@ class RedisCache:
             logger.error(f"Cache flush error: {e}")
             return False
 
+    def get_or_set(self, key: str, fetch: Callable[[], Any], ttl: int = 600) -> Any:
+        """
+        Return the cached value of key, or call fetch() once to produce it.
+
+        Concurrent misses for the same key are coalesced: inside this process the other callers wait
+        for the first one, and across workers a short Redis lock lets a single worker fetch while the
+        others poll for its result. A None result is returned but not cached. If the fetch fails, or
+        the waiting takes longer than SINGLE_FLIGHT_TIMEOUT, each waiting caller falls back to fetching
+        on its own.
+
+        Args:
+            key: Cache key
+            fetch: Callable producing the value on a miss
+            ttl: Time to live in seconds (default: 600 = 10 minutes)
+
+        Returns:
+            The cached or fetched value
+        """
+        value = self.get_cache(key)
+        if value is not None:
+            return value
+        return self._single_flight(key, fetch, lambda: self._fetch_once(key, fetch, ttl))
+
+    def _single_flight(self, key: str, fetch: Callable[[], Any], load: Callable[[], Any]) -> Any:
+        """Run load() for the first caller of key in this process; the others wait for its result."""
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            self._count("single_flight", "coalesced")
+            if flight.done.wait(SINGLE_FLIGHT_TIMEOUT) and flight.error is None:
+                return flight.value
+            return fetch()
+
+        try:
+            flight.value = load()
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _fetch_once(self, key: str, fetch: Callable[[], Any], ttl: int, stale_ttl: int = 0,
+                    last_good_ttl: int = 0) -> Any:
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self._is_connected() and self.redis_client.set(lock_key, token, nx=True, ex=SINGLE_FLIGHT_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Single-flight lock error for key {key}: {e}")
+            acquired = False
+
+        if self._is_connected() and not acquired:
+            # another worker is fetching the same key, wait for its result
+            self._count("single_flight", "coalesced")
+            deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = self.get_cache(key)
+                if value is not None:
+                    return value
+                try:
+                    if not self.redis_client.exists(lock_key):
+                        break
+                except Exception:
+                    break
+
+        try:
+            self._count("single_flight", "fetches")
+            value = fetch()
+            if value is not None:
+                self.set_cache(key, value, ttl, stale_ttl, last_good_ttl)
+            return value
+        finally:
+            if acquired:
+                try:
+                    self.redis_client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.error(f"Single-flight unlock error for key {key}: {e}")
+
+    def get_or_refresh(self, key: str, fetch: Callable[[], Any], ttl: int = 600, stale_ttl: int = 300,
+                       last_good_ttl: int = 0) -> CachedValue:
+        """
+        get_or_set with a soft and a hard TTL and a last-known-good fallback.
+
+        A value is fresh for ttl seconds (soft TTL) and stays in Redis for stale_ttl seconds more
+        (hard TTL). In between it is returned immediately, marked stale, while one background refresh
+        per key replaces it. Past the hard TTL the value is fetched as in get_or_set; if that fetch
+        fails or returns None, the last value stored within last_good_ttl seconds is returned, marked
+        stale. Without a last-known-good copy a failed fetch raises as in get_or_set.
+
+        Args:
+            key: Cache key
+            fetch: Callable producing the value
+            ttl: Soft time to live in seconds
+            stale_ttl: Seconds after the soft TTL during which the stale value is served
+            last_good_ttl: How long (seconds) a last-known-good copy is kept, 0 to keep none
+
+        Returns:
+            CachedValue with the value, whether it is stale and when it was fetched
+        """
+        entry_key = key + _ENTRY_SUFFIX
+        entry = self.local.get(entry_key)
+        if entry is not None:
+            self._count("local", "hits")
+            self.metrics.local_hit(key)
+            if entry.stale:
+                self._count("stale", "served")
+            return entry
+        self._count("local", "misses")
+
+        cached = self._get_with_ttl(key)
+        if cached is not None:
+            self._count("redis", "hits")
+            value, remaining = cached
+            stale = remaining <= stale_ttl
+            entry = CachedValue(value, stale, time.time() - (ttl + stale_ttl - remaining))
+            if stale:
+                self._count("stale", "served")
+                self._refresh_in_background(key, fetch, ttl, stale_ttl, last_good_ttl)
+                self.local.set(entry_key, entry)
+            else:
+                # never serve it as fresh from the local tier past its soft TTL
+                self.local.set(entry_key, entry, remaining - stale_ttl)
+            return entry
+        self._count("redis", "misses")
+
+        error = None
+        try:
+            value = self._single_flight(
+                key, fetch, lambda: self._fetch_once(key, fetch, ttl, stale_ttl, last_good_ttl)
+            )
+        except Exception as e:
+            value, error = None, e
+        if value is not None:
+            return CachedValue(value, False, time.time())
+
+        last_good = self.get_last_good(key, last_good_ttl) if last_good_ttl else None
+        if last_good is not None:
+            logger.warning(f"Serving last known good value of {key} after failed fetch: {error}")
+            return last_good
+        if error is not None:
+            raise error
+        return CachedValue(None)
+
+    def get_many_entries(self, keys: List[str], ttl: int = 600, stale_ttl: int = 300) -> Dict[str, CachedValue]:
+        """
+        Batch read of get_or_refresh keys in one pipelined round trip: each found key comes back as a
+        CachedValue marked stale when it is past its soft TTL. Nothing is fetched or refreshed; keys that
+        are not cached are left out.
+        """
+        if not self._is_connected() or not keys:
+            return {}
+
+        result = {}
+        remote_keys = []
+        for key in keys:
+            entry = self.local.get(key + _ENTRY_SUFFIX)
+            if entry is not None:
+                result[key] = entry
+                self.metrics.local_hit(key)
+            else:
+                remote_keys.append(key)
+        self._count("local", "hits", len(result))
+        self._count("local", "misses", len(remote_keys))
+        if not remote_keys:
+            return result
+
+        try:
+            started = time.perf_counter()
+            pipe = self.binary_client.pipeline(transaction=False)
+            for key in remote_keys:
+                pipe.get(key)
+                pipe.pttl(key)
+            replies = pipe.execute()
+            self.metrics.record_get(remote_keys, [bool(raw) for raw in replies[::2]], time.perf_counter() - started)
+        except Exception as e:
+            self.metrics.record_error(remote_keys)
+            logger.error(f"Cache get error for {len(remote_keys)} keys: {e}")
+            return result
+
+        now = time.time()
+        for key, raw, remaining_ms in zip(remote_keys, replies[::2], replies[1::2]):
+            if not raw:
+                self._count("redis", "misses")
+                continue
+            try:
+                value = cache_codecs.decode(raw)
+            except Exception as e:
+                self.metrics.record_error([key])
+                logger.error(f"Cache decode error for key {key}: {e}")
+                continue
+            self._count("redis", "hits")
+            remaining = max(remaining_ms, 0) / 1000
+            entry = CachedValue(value, remaining <= stale_ttl, now - (ttl + stale_ttl - remaining))
+            if entry.stale:
+                self._count("stale", "served")
+                self.local.set(key + _ENTRY_SUFFIX, entry)
+            else:
+                self.local.set(key + _ENTRY_SUFFIX, entry, remaining - stale_ttl)
+            result[key] = entry
+        return result
+
+    def get_last_good(self, key: str, last_good_ttl: int) -> Optional[CachedValue]:
+        """The last-known-good copy of a get_or_refresh key (always marked stale), or None."""
+        return self.get_last_good_many([key], last_good_ttl).get(key)
+
+    def get_last_good_many(self, keys: List[str], last_good_ttl: int) -> Dict[str, CachedValue]:
+        """Last-known-good copies of several keys in one pipelined round trip; keys without one are left out."""
+        if not self._is_connected() or not keys:
+            return {}
+        last_good_keys = [LAST_GOOD_PREFIX + key for key in keys]
+        try:
+            started = time.perf_counter()
+            pipe = self.binary_client.pipeline(transaction=False)
+            for last_good_key in last_good_keys:
+                pipe.get(last_good_key)
+                pipe.pttl(last_good_key)
+            replies = pipe.execute()
+            self.metrics.record_get(last_good_keys, [bool(raw) for raw in replies[::2]], time.perf_counter() - started)
+        except Exception as e:
+            self.metrics.record_error(last_good_keys)
+            logger.error(f"Cache last good error for {len(keys)} keys: {e}")
+            return {}
+
+        result = {}
+        now = time.time()
+        for key, raw, remaining_ms in zip(keys, replies[::2], replies[1::2]):
+            if not raw:
+                continue
+            try:
+                value = cache_codecs.decode(raw)
+            except Exception as e:
+                logger.error(f"Cache decode error for key {key}: {e}")
+                continue
+            result[key] = CachedValue(value, True, now - (last_good_ttl - max(remaining_ms, 0) / 1000))
+        self._count("stale", "last_good", len(result))
+        return result
+
+    def _get_with_ttl(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Decoded value and remaining TTL (seconds) of a key, read in one round trip."""
+        if not self._is_connected():
+            return None
+        try:
+            started = time.perf_counter()
+            pipe = self.binary_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, remaining_ms = pipe.execute()
+            self.metrics.record_get([key], [bool(raw)], time.perf_counter() - started)
+            if not raw:
+                return None
+            return cache_codecs.decode(raw), max(remaining_ms, 0) / 1000
+        except Exception as e:
+            self.metrics.record_error([key])
+            logger.error(f"Cache get error for key {key}: {e}")
+            return None
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Any], ttl: int, stale_ttl: int,
+                               last_good_ttl: int):
+        with self._inflight_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._refresh_pool.submit(self._refresh, key, fetch, ttl, stale_ttl, last_good_ttl)
+
+    def _refresh(self, key: str, fetch: Callable[[], Any], ttl: int, stale_ttl: int, last_good_ttl: int):
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            # the lock keeps the other workers from refreshing the same stale key at the same time
+            if not self.redis_client.set(lock_key, token, nx=True, ex=SINGLE_FLIGHT_TIMEOUT):
+                return
+            try:
+                self._count("stale", "refreshes")
+                value = fetch()
+                if value is not None:
+                    self.set_cache(key, value, ttl, stale_ttl, last_good_ttl)
+            finally:
+                self.redis_client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            with self._inflight_lock:
+                self._refreshing.discard(key)
+
+    def memory_footprint(self, sample_size: int = 1000) -> dict:
+        """Sampled Redis memory per key namespace (see cache_metrics.memory_footprint)."""
+        if not self._is_connected():
+            return {}
+        try:
+            return memory_footprint(self.redis_client, sample_size)
+        except Exception as e:
+            logger.error(f"Cache memory sampling error: {e}")
+            return {"error": str(e)}
+
+    def _count(self, tier: str, counter: str, amount: int = 1):
+        if amount:
+            with self._stats_lock:
+                self._stats[tier][counter] += amount
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit / miss counters per tier, single-flight and stale-serving counters of this process."""
+        with self._stats_lock:
+            stats = {tier: dict(counters) for tier, counters in self._stats.items()}
+        stats["local"]["size"] = len(self.local)
+        return stats
+
 
 # Global cache instance
 cache = RedisCache()
@@ -18,6 +18,18 @@ engine = create_engine(
     pool_pre_ping=True
 )
 
+# Async engine for the read paths that run on the event loop (same database, aiomysql driver).
+# Optional: only with ASYNC_DB_ENABLED=true, and created on first use, so aiomysql / greenlet are not
+# needed otherwise. Without it the same reads run on the sync session in the threadpool.
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "false").lower() == "true"
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("mysql+pymysql://", "mysql+aiomysql://", 1)
+)
+
+_async_engine = None
+_async_session_factory = None
+
 # Base class for models
 Base = declarative_base()
 
@@ -31,3 +43,46 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_async_engine():
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        # imported here so the async driver stack is only needed with ASYNC_DB_ENABLED
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            pool_size=20,
+            max_overflow=10,
+            pool_recycle=3600,
+            pool_pre_ping=True
+        )
+        # objects stay usable after commit since lazy loading is not possible in async code
+        _async_session_factory = async_sessionmaker(
+            _async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+        )
+    return _async_engine
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+# Dependency to get an async database session (requires ASYNC_DB_ENABLED)
+async def get_async_db():
+    get_async_engine()
+    async with _async_session_factory() as db:
+        yield db
+
+# Dependency for the read paths of AsyncStockService: an async session when ASYNC_DB_ENABLED,
+# otherwise a sync one (AsyncStockService then runs the StockService query in the threadpool)
+async def get_read_db():
+    if ASYNC_DB_ENABLED:
+        async for db in get_async_db():
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
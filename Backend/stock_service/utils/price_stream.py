@@ -0,0 +1,69 @@
+"""
+Producer side of the price-update stream.
+
+Every changed quote is appended to the PRICE_STREAM Redis Stream as {symbol, price, ts} (symbol without
+the .IS suffix). Consumers such as the watchlist service read it with a consumer group, so each event is
+processed by one replica of a consumer and survives a consumer restart until it is acknowledged.
+The stream is capped at about PRICE_STREAM_MAXLEN entries.
+
+Only changed prices are written, so a quiet stream does not tell whether the producer is alive. After
+every successful refresh cycle the producer writes a heartbeat key with its refresh interval; consumers
+trust the stream only while the heartbeat is fresh and the interval is short enough for them.
+"""
+import json
+import logging
+import os
+import socket
+import time
+from typing import Dict
+
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PRICE_STREAM = os.getenv("PRICE_STREAM", "prices:updates")
+PRICE_STREAM_MAXLEN = int(os.getenv("PRICE_STREAM_MAXLEN", "100000"))
+PRICE_STREAM_HEARTBEAT = os.getenv("PRICE_STREAM_HEARTBEAT", "prices:heartbeat")
+
+_SOURCE = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def publish_prices(prices: Dict[str, float]) -> int:
+    """Append one event per symbol to the price stream. Returns the number of events written."""
+    if not prices or cache.redis_client is None:
+        return 0
+    ts = f"{time.time():.3f}"
+    try:
+        pipe = cache.redis_client.pipeline(transaction=False)
+        for symbol, price in prices.items():
+            # approximate trimming (~) lets Redis drop whole stream nodes, which is much cheaper
+            pipe.xadd(
+                PRICE_STREAM,
+                {"symbol": symbol.upper(), "price": f"{price:.4f}", "ts": ts},
+                maxlen=PRICE_STREAM_MAXLEN,
+                approximate=True,
+            )
+        pipe.execute()
+        return len(prices)
+    except Exception as e:
+        logger.error(f"Could not publish {len(prices)} price updates: {e}")
+        return 0
+
+
+def publish_heartbeat(interval: int) -> bool:
+    """
+    Record that a refresh cycle just completed and the next one is due in `interval` seconds. The key
+    expires after a few missed cycles, so a dead producer is noticed even without comparing timestamps.
+    """
+    if cache.redis_client is None:
+        return False
+    try:
+        cache.redis_client.set(
+            PRICE_STREAM_HEARTBEAT,
+            json.dumps({"ts": time.time(), "interval": interval, "source": _SOURCE}),
+            ex=max(1, interval * 3),
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Could not publish the price stream heartbeat: {e}")
+        return False
@@ -0,0 +1,201 @@
+import bisect
+import logging
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.models import Stock
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever a worker changes the stocks table, so the other workers rebuild their index
+VERSION_KEY = "search_index:version"
+# How often (seconds) a worker checks the version key
+VERSION_CHECK_INTERVAL = 5.0
+
+# Turkish letters folded to their ASCII base letter. Done before lower(), because "İ".lower()
+# gives "i" + a combining dot and "I".lower() gives "i" instead of "ı"; folding both dotted and
+# dotless i to "i" lets "isbank", "İşbank" and "ISBANK" all match each other.
+_TURKISH_FOLD = str.maketrans({
+    "İ": "i", "I": "i", "ı": "i",
+    "Ş": "s", "ş": "s",
+    "Ğ": "g", "ğ": "g",
+    "Ü": "u", "ü": "u",
+    "Ö": "o", "ö": "o",
+    "Ç": "c", "ç": "c",
+})
+
+
+def fold(text: str) -> str:
+    """Turkish-aware, accent-insensitive lower case form used for both indexing and queries."""
+    text = (text or "").translate(_TURKISH_FOLD).lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).strip()
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _IndexState:
+    """Immutable snapshot of the index; searches read one snapshot while a rebuild builds the next."""
+
+    def __init__(self, entries: List[dict]):
+        self.entries = entries
+        self.symbols: Dict[str, int] = {}
+        # sorted (key, entry index) pairs; symbols and every word of the name, for prefix lookups
+        self.prefix_keys: List[Tuple[str, int]] = []
+        self.trigrams: Dict[str, Set[int]] = {}
+        self.folded: List[Tuple[str, str]] = []
+
+        for i, entry in enumerate(entries):
+            symbol = fold(entry["stock_symbol"])
+            name = fold(entry["name"])
+            self.folded.append((symbol, name))
+            self.symbols[symbol] = i
+            self.prefix_keys.append((symbol, i))
+            self.prefix_keys.extend((word, i) for word in set(name.split()))
+            for gram in _trigrams(symbol) | _trigrams(name):
+                self.trigrams.setdefault(gram, set()).add(i)
+        self.prefix_keys.sort()
+
+    def _prefix_matches(self, query: str) -> Set[int]:
+        start = bisect.bisect_left(self.prefix_keys, (query, -1))
+        matches = set()
+        for key, i in self.prefix_keys[start:]:
+            if not key.startswith(query):
+                break
+            matches.add(i)
+        return matches
+
+    def _substring_matches(self, query: str) -> Set[int]:
+        grams = _trigrams(query)
+        if not grams:
+            return set()
+        candidates = None
+        for gram in sorted(grams, key=lambda g: len(self.trigrams.get(g, ()))):
+            postings = self.trigrams.get(gram)
+            if not postings:
+                return set()
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+        # trigrams can match out of order, confirm the real substring
+        return {i for i in candidates if query in self.folded[i][0] or query in self.folded[i][1]}
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        query = fold(query)
+        if not query:
+            return []
+
+        ranked: Dict[int, int] = {}
+        exact = self.symbols.get(query)
+        if exact is not None:
+            ranked[exact] = 0
+        for i in self._prefix_matches(query) | self._substring_matches(query):
+            if i in ranked:
+                continue
+            symbol, name = self.folded[i]
+            if symbol.startswith(query):
+                ranked[i] = 1
+            elif name.startswith(query):
+                ranked[i] = 2
+            elif any(word.startswith(query) for word in name.split()):
+                ranked[i] = 3
+            else:
+                ranked[i] = 4
+
+        # same tier: bigger companies first
+        order = sorted(ranked, key=lambda i: (ranked[i], -(self.entries[i]["market_cap"] or 0), self.folded[i][0]))
+        return [self.entries[i] for i in order[:limit]]
+
+
+class StockSearchIndex:
+    """
+    In-process typeahead index over stock symbols and names.
+
+    Built from the stocks table at startup. A stock added on this worker is indexed immediately;
+    other workers notice the bumped Redis version key within VERSION_CHECK_INTERVAL and rebuild.
+    Changes to many stocks at once (market caps, which order the results) go through invalidate:
+    every worker, this one included, rebuilds on its next search.
+    """
+
+    def __init__(self):
+        self._state: Optional[_IndexState] = None
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry(stock: Stock) -> dict:
+        return {
+            "stock_symbol": stock.stock_symbol,
+            "name": stock.name,
+            "sector_id": stock.sector_id,
+            "market_cap": float(stock.market_cap) if stock.market_cap is not None else None,
+            "last_updated": stock.last_updated,
+        }
+
+    def rebuild(self, db: Session) -> _IndexState:
+        started = time.perf_counter()
+        version = cache.get_cache(VERSION_KEY)
+        entries = [self._entry(stock) for stock in db.query(Stock).all()]
+        state = _IndexState(entries)
+        with self._lock:
+            self._state = state
+            self._version = version
+            self._checked_at = time.monotonic()
+        logger.info(f"Search index built: {len(entries)} stocks in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return state
+
+    def add(self, stock: Stock):
+        """Index a new or changed stock on this worker and tell the other workers to rebuild."""
+        with self._lock:
+            entries = [] if self._state is None else [
+                entry for entry in self._state.entries if entry["stock_symbol"] != stock.stock_symbol
+            ]
+            entries.append(self._entry(stock))
+            self._state = _IndexState(entries)
+        version = self._bump_version()
+        if version is not None:
+            with self._lock:
+                self._version = version
+
+    def invalidate(self):
+        """The indexed stocks changed in the database: rebuild on the next search, on every worker."""
+        with self._lock:
+            self._state = None
+        self._bump_version()
+
+    @staticmethod
+    def _bump_version() -> Optional[str]:
+        if cache.redis_client is None:
+            return None
+        try:
+            return str(cache.redis_client.incr(VERSION_KEY))
+        except Exception as e:
+            logger.error(f"Could not bump search index version: {e}")
+            return None
+
+    def _is_stale(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        version = cache.get_cache(VERSION_KEY)
+        return version is not None and str(version) != str(self._version)
+
+    def search(self, query: str, db: Session, limit: int = 5) -> List[dict]:
+        # one snapshot per search, invalidate may drop self._state in the meantime
+        state = self._state
+        if state is None or self._is_stale():
+            state = self.rebuild(db)
+        return state.search(query, limit)
+
+
+# Global search index instance
+search_index = StockSearchIndex()
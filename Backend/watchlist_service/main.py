@@ -3,6 +3,7 @@ import os
 import logging
 import uvicorn
 import asyncio
+import time
 
 # Third-party imports
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,8 +15,11 @@ from sqlalchemy.orm import Session
 # Local application imports
 from controllers.watchlist_controller import router as stock_router
 from models.models import Base
-from utils.db_context import engine, get_db
-from utils.websocket_manager import websocket_manager
+from utils.db_context import SessionLocal, engine, get_db
+from utils.alert_index import alert_index
+from utils.price_stream import price_stream_consumer
+from utils.websocket_manager import HEARTBEAT_REPLY, websocket_manager
+from common.yahoo_client import yahoo
 from services.watchlist_service import WatchlistService
 
 logger = logging.getLogger(__name__)
@@ -59,26 +63,69 @@ async def root():
 async def health_check(db: Session = Depends(get_db)):
     try:
         db.execute(text("SELECT 1"))
-        return {"status": "healthy", "database": "connected"}
+        return {
+            "status": "healthy",
+            "database": "connected",
+            "yahoo": yahoo.status(),
+            "alerts": alert_index.status(),
+            "price_stream": price_stream_consumer.status(),
+            "websockets": websocket_manager.status(),
+        }
     except Exception as e:
-        return JSONResponse(status_code=503, content={"status": "unhealthy", "database": str(e)})
+        return JSONResponse(
+            status_code=503, content={"status": "unhealthy", "database": str(e), "yahoo": yahoo.status()}
+        )
+
+# Seconds between two polling scans while the price stream cannot replace polling (see PriceStreamConsumer.healthy)
+ALERT_POLL_INTERVAL = int(os.getenv("ALERT_POLL_INTERVAL", "60"))
+# Even with a working stream a full scan runs this often, for alerts set on a price that has not moved since
+ALERT_FULL_SCAN_INTERVAL = int(os.getenv("ALERT_FULL_SCAN_INTERVAL", "900"))
+
+async def send_notifications(notifications: list[dict]):
+    for notification in notifications:
+        message = (f"🚨 Stock Alert: {notification['stock_symbol']} is near your target price of "
+                   f"{notification['target_price']}! Current price: {notification['current_price']}")
+        await websocket_manager.send_update(notification["user_id"], message)
+
+def _evaluate_price_updates(prices) -> list[dict]:
+    db = SessionLocal()
+    try:
+        return WatchlistService(db).evaluate_price_updates(prices)
+    finally:
+        db.close()
+
+def _check_price_alerts() -> list[dict]:
+    # a fresh session per scan: one held for the lifetime of the loop keeps a pooled connection
+    # checked out and never sees the server close it
+    db = SessionLocal()
+    try:
+        return WatchlistService(db).check_price_alerts()
+    finally:
+        db.close()
 
+# Event-driven path: evaluate only the alerts of the stocks whose price changed.
+# The service is synchronous (database, Yahoo), so it runs in a worker thread instead of blocking the event loop.
+async def handle_price_updates(prices):
+    notifications = await asyncio.to_thread(_evaluate_price_updates, prices)
+    await send_notifications(notifications)
+
+# Polling fallback: full scan while the price stream is down or its producer refreshes less often than we poll
 async def background_task():
-    db = next(get_db())  # Get database session
-    service = WatchlistService(db)
-    
+    last_full_scan = float("-inf")
+
     while True:
-        notifications = service.check_price_alerts()
+        if not price_stream_consumer.healthy or time.monotonic() - last_full_scan >= ALERT_FULL_SCAN_INTERVAL:
+            try:
+                await send_notifications(await asyncio.to_thread(_check_price_alerts))
+            except Exception as e:
+                logger.error(f"Price alert scan failed: {e}")
+            last_full_scan = time.monotonic()
 
-        for notification in notifications:
-            message = (f"🚨 Stock Alert: {notification['stock_symbol']} is near your target price of "
-                       f"{notification['target_price']}! Current price: {notification['current_price']}")
-            await websocket_manager.send_update(notification["user_id"], message)
-        
-        await asyncio.sleep(60)  # Run every 60 seconds
+        await asyncio.sleep(ALERT_POLL_INTERVAL)
 
 @app.on_event("startup")
 async def startup_event():
+    asyncio.create_task(price_stream_consumer.run(handle_price_updates))
     asyncio.create_task(background_task())  # Start background task
 
 
@@ -89,15 +136,21 @@ async def startup_event():
 # WebSocket endpoint
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: int):
-    await websocket_manager.connect(websocket, user_id)  # Accept connection and add to manager
+    connection = await websocket_manager.connect(websocket, user_id)  # Accept connection and add to manager
     try:
         while True:
             data = await websocket.receive_text()  # Wait for message from the client
+            websocket_manager.touch(connection)
+            if data == HEARTBEAT_REPLY:
+                continue
             logger.debug(f"Received data from user {user_id}: {data}")
-            await websocket.send_text(f"Message received: {data}")
+            websocket_manager.send_to(connection, f"Message received: {data}")
     except WebSocketDisconnect:
-        await websocket_manager.disconnect(user_id)
-        logger.info(f"User {user_id} disconnected.")
+        pass
+    except RuntimeError:
+        pass  # the manager closed the socket (idle, overflow or failed send)
+    finally:
+        await websocket_manager.disconnect(connection)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, DECIMAL, FLOAT, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Date, DECIMAL, FLOAT, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from utils.db_context import Base
@@ -108,11 +108,18 @@ class Dividend(Base):
 
 class StockPrice(Base):
     __tablename__ = "stock_prices"
+    __table_args__ = (
+        UniqueConstraint("stock_symbol", "date", name="uq_stock_prices_symbol_date"),
+    )
     
     price_id = Column(Integer, primary_key=True, autoincrement=True)
     stock_symbol = Column(String(10), ForeignKey('stocks.stock_symbol'), nullable=False)
     date = Column(Date, nullable=False)
+    open_price = Column(DECIMAL(10, 2))
+    high_price = Column(DECIMAL(10, 2))
+    low_price = Column(DECIMAL(10, 2))
     close_price = Column(DECIMAL(10, 2))
+    volume = Column(BigInteger)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     stock = relationship("Stock", back_populates="prices")
@@ -164,6 +171,9 @@ class WatchlistItem(Base):
     stock_symbol = Column(String(10), ForeignKey('stocks.stock_symbol'), nullable=False)
     # bu fiyat gerçekleşirse beni uyar
     alert_price = Column(DECIMAL(10, 2), nullable=True)  
+    # armed -> fired when the price comes within 1% of alert_price, fired -> armed once it moved away again
+    alert_state = Column(Enum('armed', 'fired', name='alert_states'), nullable=False, default='armed', server_default='armed')
+    alert_fired_at = Column(DateTime, nullable=True)
     added_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship to Watchlist
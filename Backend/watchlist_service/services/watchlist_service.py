@@ -1,11 +1,20 @@
-from typing import List, Optional
+import logging
+import os
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime, date
 from models.models import Watchlist, WatchlistItem, Stock, User
 from sqlalchemy.exc import SQLAlchemyError
 from decimal import Decimal
-import yfinance as yf
+import pandas as pd
+from utils.alert_index import ARMED, FIRED, Alert, alert_index
 from utils.websocket_manager import websocket_manager
+from common.yahoo_client import yahoo
+
+logger = logging.getLogger(__name__)
+
+# tickers per multi-ticker yahoo finance download in the alert cycle
+ALERT_PRICE_BATCH_SIZE = int(os.getenv("ALERT_PRICE_BATCH_SIZE", "100"))
 
 
 # in the watchlist service we do not return detailed info of the stocks in the watchlist
@@ -125,6 +134,7 @@ class WatchlistService:
         if item:
             self.db.delete(item)
             self.db.commit()
+            alert_index.remove(item_id)
             return True
         return False
     
@@ -136,6 +146,7 @@ class WatchlistService:
         if watchlist:
             self.db.delete(watchlist)
             self.db.commit()
+            alert_index.remove_watchlist(watchlist_id)
             return True
         return False
     
@@ -149,8 +160,12 @@ class WatchlistService:
             raise ValueError(f"Watchlist item with id {item_id} does not exist")
 
         item.alert_price = alert_price
+        # a new target starts armed; the cooldown still counts from the last time the alert fired
+        item.alert_state = ARMED
         self.db.commit()
         self.db.refresh(item)
+        alert_index.upsert(Alert(item.item_id, item.watchlist_id, item.watchlist.user_id, item.stock_symbol,
+                                 item.alert_price, item.alert_state, item.alert_fired_at))
         return item
 
     def remove_alert_price(self, item_id: int) -> WatchlistItem:
@@ -162,8 +177,10 @@ class WatchlistService:
             raise ValueError(f"Watchlist item with id {item_id} does not exist")
 
         item.alert_price = None
+        item.alert_state = ARMED
         self.db.commit()
         self.db.refresh(item)
+        alert_index.remove(item_id)
         return item
     
     # to learn the price of the stock in the watchlist
@@ -175,50 +192,133 @@ class WatchlistService:
             stock_symbol = stock_symbol.upper()
             # add .IS to the end of the stock symbol since yahoo finance excepts that
             stock_symbol += ".IS"
-            stock = yf.Ticker(stock_symbol)
-            info = stock.info
+            info = yahoo.info(stock_symbol) or {}
             current_price = info.get("currentPrice", None)
-            print(f"Current price of {stock_symbol}: {current_price}")
+            logger.debug(f"Current price of {stock_symbol}: {current_price}")
             # we need to return the price as decimal.Decimal
             return Decimal(current_price) if current_price is not None else None
         except Exception as e:
-            print(f"An error occurred while fetching stock price: {e}")
+            logger.error(f"An error occurred while fetching stock price: {e}")
     
+    def get_current_stock_prices(self, stock_symbols: List[str]) -> Dict[str, Decimal]:
+        """
+            Latest price (rounded to 2 decimals) of many stocks, with one multi-ticker yahoo finance
+            download per ALERT_PRICE_BATCH_SIZE symbols. Stocks without data are left out.
+        """
+        prices = {}
+        for i in range(0, len(stock_symbols), ALERT_PRICE_BATCH_SIZE):
+            batch = [f"{symbol.upper()}.IS" for symbol in stock_symbols[i:i + ALERT_PRICE_BATCH_SIZE]]
+            try:
+                data = yahoo.download(batch, period="5d", interval="1d", group_by="column",
+                                      auto_adjust=False, progress=False, threads=True)
+            except Exception as e:
+                logger.error(f"An error occurred while fetching stock prices for {len(batch)} stocks: {e}")
+                continue
+            if data is None or data.empty or "Close" not in data:
+                continue
+
+            closes = data["Close"]
+            # older yfinance versions return a plain Series when a single ticker is requested
+            if isinstance(closes, pd.Series):
+                closes = closes.to_frame(name=batch[0])
+            # the last row is NaN for stocks that have not traded yet today, so carry the previous close forward
+            for yahoo_symbol, price in closes.ffill().iloc[-1].items():
+                if not pd.isna(price):
+                    prices[yahoo_symbol[:-len(".IS")]] = Decimal(f"{price:.2f}")
+        return prices
+
     """
         - background task that periodically checks stock prices and notifies the user when the price is within 1% of their target alert price
         - Use WebSockets to notify the user.
     """
 
+    def load_alerts(self) -> List[Alert]:
+        """
+        All alerts with their owner, loaded with one joined query.
+        """
+        rows = (
+            self.db.query(WatchlistItem.item_id, WatchlistItem.watchlist_id, Watchlist.user_id,
+                          WatchlistItem.stock_symbol, WatchlistItem.alert_price, WatchlistItem.alert_state,
+                          WatchlistItem.alert_fired_at)
+            .join(Watchlist, Watchlist.watchlist_id == WatchlistItem.watchlist_id)
+            .filter(WatchlistItem.alert_price.isnot(None))
+            .all()
+        )
+        return [Alert(*row) for row in rows]
+
     def check_price_alerts(self) -> list[dict]:
         """
         Checks if any watchlist stocks are within 1% of their target price.
-        Returns a list of notifications.
+        Returns a list of notifications, one per alert that fired in this check: an alert that fired
+        stays quiet until the price moved out of its re-arm band and its cooldown is over.
+
+        Each distinct stock with alerts is priced once (in batched downloads) however many users watch
+        it, and the alert index returns only the alerts whose band contains the price.
+        """
+        alert_index.ensure_loaded(self.load_alerts)
+        symbols = alert_index.symbols()
+        prices = self.get_current_stock_prices(symbols)
+        logger.info(f"Checking {len(alert_index)} price alerts on {len(symbols)} stocks ({len(prices)} priced)")
+        return self._evaluate_alerts(prices)
+
+    def evaluate_price_updates(self, prices: Dict[str, Decimal]) -> list[dict]:
+        """
+        Notifications for the alerts of the stocks whose price changed (events of the price stream);
+        alerts of other stocks are not looked at.
         """
-        watchlist_items = self.db.query(WatchlistItem).filter(WatchlistItem.alert_price.isnot(None)).all()
+        alert_index.ensure_loaded(self.load_alerts)
+        return self._evaluate_alerts(prices)
+
+    def _evaluate_alerts(self, prices: Dict[str, Decimal]) -> list[dict]:
+        fired, rearmed = [], []
+        for stock_symbol, current_price in prices.items():
+            symbol_fired, symbol_rearmed = alert_index.evaluate(stock_symbol, current_price)
+            fired.extend((alert, current_price) for alert in symbol_fired)
+            rearmed.extend(symbol_rearmed)
+
         notifications = []
+        for alert, current_price in self._persist_alert_transitions(fired, rearmed):
+            notifications.append({
+                "user_id": alert.user_id,
+                "stock_symbol": alert.stock_symbol,
+                "target_price": alert.target_price,
+                "current_price": current_price
+            })
 
-        for item in watchlist_items:
-            current_price = self.get_current_stock_price(item.stock_symbol)
-            # take the 2 decimal 
-            current_price = "{:.2f}".format(current_price) if current_price is not None else None
-            current_price = Decimal(current_price)
-            
-            if current_price is None:
-                continue  # Skip if price is not available
-
-            print(f"Checking price alert for {item.stock_symbol}. Current price: {current_price}, Target price: {item.alert_price}")
-            
-            target_price = item.alert_price
-            if abs(current_price - target_price) / target_price <= 0.01:
-                watchlist = self.db.query(Watchlist).filter(Watchlist.watchlist_id == item.watchlist_id).first()
-                user_id = watchlist.user_id if watchlist else None
-                
-                if user_id:
-                    notifications.append({
-                        "user_id": user_id,
-                        "stock_symbol": item.stock_symbol,
-                        "target_price": target_price,
-                        "current_price": current_price
-                    })
-        
-        return notifications
\ No newline at end of file
+        return notifications
+
+    def _persist_alert_transitions(self, fired: list, rearmed: List[Alert]) -> list:
+        """
+        Store the state changes decided by the alert index. An alert is only marked fired if it is still
+        armed in the database, so when several workers see the same price only one of them notifies.
+        Returns the fired (alert, price) pairs that were stored.
+        """
+        if not fired and not rearmed:
+            return []
+        try:
+            if rearmed:
+                self.db.query(WatchlistItem).filter(
+                    WatchlistItem.item_id.in_([alert.item_id for alert in rearmed]),
+                    WatchlistItem.alert_state == FIRED,
+                ).update({WatchlistItem.alert_state: ARMED}, synchronize_session=False)
+
+            stored = []
+            for alert, current_price in fired:
+                updated = self.db.query(WatchlistItem).filter(
+                    WatchlistItem.item_id == alert.item_id,
+                    WatchlistItem.alert_state == ARMED,
+                ).update({WatchlistItem.alert_state: FIRED, WatchlistItem.alert_fired_at: alert.fired_at},
+                         synchronize_session=False)
+                if updated:
+                    stored.append((alert, current_price))
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            alert_index.invalidate()
+            logger.error(f"An error occurred while storing alert states: {e}")
+            return []
+
+        if len(stored) < len(fired):
+            # another worker changed some of these alerts first, so this index is behind the database
+            alert_index.invalidate()
+        return stored
@@ -0,0 +1,6 @@
+import os
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the service's own packages, and Backend/ for the shared `common` package
+sys.path[:0] = [SERVICE_DIR, os.path.dirname(SERVICE_DIR)]
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from utils.alert_index import ARMED, FIRED, Alert, AlertIndex
+
+
+def _alert(item_id, target, **kwargs):
+    return Alert(item_id=item_id, watchlist_id=1, user_id=7, stock_symbol="AKBNK", target_price=Decimal(target), **kwargs)
+
+
+def _ids(alerts):
+    return sorted(alert.item_id for alert in alerts)
+
+
+def test_only_alerts_within_one_percent_fire():
+    index = AlertIndex()
+    index.load([_alert(1, "100"), _alert(2, "101"), _alert(3, "98"), _alert(4, "100.5")])
+
+    fired, rearmed = index.evaluate("AKBNK", Decimal("100.00"))
+
+    assert _ids(fired) == [1, 2, 4]
+    assert all(alert.state == FIRED and alert.fired_at is not None for alert in fired)
+    assert rearmed == []
+    assert index.evaluate("GARAN", Decimal("100.00")) == ([], [])
+
+
+def test_fired_alert_rearms_only_outside_the_wider_band(monkeypatch):
+    monkeypatch.setattr("utils.alert_index.ALERT_COOLDOWN", 0)
+    index = AlertIndex()
+    index.load([_alert(1, "100")])
+    assert _ids(index.evaluate("AKBNK", Decimal("100.00"))[0]) == [1]
+
+    # out of the 1% band but inside the 2% re-arm band: stays fired, does not fire again on the way back
+    assert index.evaluate("AKBNK", Decimal("101.50")) == ([], [])
+    assert index.evaluate("AKBNK", Decimal("100.20")) == ([], [])
+
+    fired, rearmed = index.evaluate("AKBNK", Decimal("103.00"))
+    assert fired == [] and _ids(rearmed) == [1] and rearmed[0].state == ARMED
+    assert _ids(index.evaluate("AKBNK", Decimal("99.50"))[0]) == [1]
+
+
+def test_rearmed_alert_waits_for_the_cooldown(monkeypatch):
+    monkeypatch.setattr("utils.alert_index.ALERT_COOLDOWN", 3600)
+    index = AlertIndex()
+    index.load([_alert(1, "100", fired_at=datetime.utcnow() - timedelta(minutes=10)),
+                _alert(2, "100", fired_at=datetime.utcnow() - timedelta(hours=2))])
+
+    fired, _ = index.evaluate("AKBNK", Decimal("100.00"))
+
+    assert _ids(fired) == [2]
+    assert index.status()["fired"] == 1
+
+
+def test_band_edges_survive_decimal_rounding():
+    index = AlertIndex()
+    # the band is 1% of the target: targets from 100 / 1.01 = 99.0099.. to 100 / 0.99 = 101.0101.. fire
+    index.load([_alert(1, "99.00"), _alert(2, "99.01"), _alert(3, "101.01"), _alert(4, "101.02")])
+
+    fired, _ = index.evaluate("AKBNK", Decimal("100.00"))
+
+    assert _ids(fired) == [2, 3]
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from utils import websocket_manager as ws
+from utils.websocket_manager import WebSocketManager
+
+
+class _StuckWebSocket:
+    """A client that accepts the connection but never finishes receiving a message."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.unblock = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        await self.unblock.wait()
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def small_queue(monkeypatch):
+    monkeypatch.setattr(ws, "WS_QUEUE_SIZE", 3)
+
+
+async def _send(manager, messages):
+    # one message at a time, giving the sender tasks a chance to run in between
+    for message in messages:
+        assert await manager.send_update(7, message) > 0
+        await asyncio.sleep(0.001)
+
+
+async def _fill(manager, websocket, messages):
+    connection = await manager.connect(websocket, user_id=7)
+    await _send(manager, messages)
+    return connection
+
+
+def test_drop_oldest_keeps_the_newest_messages(monkeypatch):
+    monkeypatch.setattr(ws, "WS_OVERFLOW_POLICY", "drop_oldest")
+
+    async def scenario():
+        manager, websocket = WebSocketManager(), _StuckWebSocket()
+        await _fill(manager, websocket, [f"m{i}" for i in range(6)])
+        status = manager.status()
+        websocket.unblock.set()
+        await asyncio.sleep(0.01)
+        return manager, websocket, status
+
+    manager, websocket, status = asyncio.run(scenario())
+
+    assert status["queued"] == 3 and status["dropped"] == 2
+    # m0 was already being sent, m1 and m2 were dropped
+    assert websocket.sent == ["m0", "m3", "m4", "m5"]
+    assert not websocket.closed
+
+
+def test_disconnect_policy_closes_a_client_that_fell_behind(monkeypatch):
+    monkeypatch.setattr(ws, "WS_OVERFLOW_POLICY", "disconnect")
+
+    async def scenario():
+        manager, websocket = WebSocketManager(), _StuckWebSocket()
+        connection = await _fill(manager, websocket, [f"m{i}" for i in range(5)])
+        await asyncio.sleep(0.01)
+        return manager, websocket, connection
+
+    manager, websocket, connection = asyncio.run(scenario())
+
+    assert connection.closed and websocket.closed
+    assert manager.status()["overflow_disconnects"] == 1
+    assert manager.connections == {}
+
+
+def test_a_stuck_client_does_not_hold_up_the_others(monkeypatch):
+    monkeypatch.setattr(ws, "WS_OVERFLOW_POLICY", "drop_oldest")
+
+    async def scenario():
+        manager, stuck, healthy = WebSocketManager(), _StuckWebSocket(), _StuckWebSocket()
+        healthy.unblock.set()
+        await manager.connect(stuck, user_id=7)
+        await manager.connect(healthy, user_id=7)
+        await _send(manager, [f"m{i}" for i in range(10)])
+        return healthy
+
+    healthy = asyncio.run(scenario())
+
+    assert healthy.sent == [f"m{i}" for i in range(10)]
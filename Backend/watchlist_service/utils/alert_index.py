@@ -0,0 +1,188 @@
+import bisect
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# an alert fires when the price is within this fraction of the target
+ALERT_THRESHOLD = Decimal("0.01")
+# a fired alert is re-armed only once the price is further than this fraction from the target again
+# (hysteresis: a price moving around the edge of the 1% band does not fire the alert over and over)
+ALERT_REARM_BAND = max(ALERT_THRESHOLD, Decimal(os.getenv("ALERT_REARM_BAND", "0.02")))
+# a re-armed alert does not fire again sooner than this many seconds after it last fired
+ALERT_COOLDOWN = int(os.getenv("ALERT_COOLDOWN", "3600"))
+# every worker keeps its own index; it is reloaded from the database after this many seconds so
+# alert changes made through another worker are picked up
+ALERT_INDEX_RELOAD = int(os.getenv("ALERT_INDEX_RELOAD", "300"))
+
+ARMED = "armed"
+FIRED = "fired"
+
+
+class Alert(NamedTuple):
+    item_id: int
+    watchlist_id: int
+    user_id: int
+    stock_symbol: str
+    target_price: Decimal
+    state: str = ARMED
+    fired_at: Optional[datetime] = None
+
+
+def in_band(price: Decimal, target_price: Decimal, band: Decimal = ALERT_THRESHOLD) -> bool:
+    return target_price > 0 and abs(price - target_price) / target_price <= band
+
+
+# In-memory index of the price alerts, grouped by symbol and state
+class AlertIndex:
+    """
+    Per symbol the armed and the fired alerts are kept in two lists sorted by target price. A price p
+    is within a band target +-b exactly when p / (1 + b) <= target <= p / (1 - b), so:
+
+      - the armed alerts that fire are one contiguous slice of the armed list
+      - the fired alerts that re-arm (p left their wider re-arm band) are a prefix and a suffix of the
+        fired list
+
+    both found with binary searches, so a price update costs O(log n + alerts that change state).
+    """
+
+    def __init__(self):
+        # state -> symbol -> sorted (target_price, item_id)
+        self._targets: Dict[str, Dict[str, List[Tuple[Decimal, int]]]] = {ARMED: {}, FIRED: {}}
+        self._alerts: Dict[int, Alert] = {}
+        self._by_watchlist: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        self.loaded_at = None
+
+    # replace the whole index, e.g. with the alerts loaded from the database
+    def load(self, alerts: Iterable[Alert]):
+        with self._lock:
+            self._targets = {ARMED: {}, FIRED: {}}
+            self._alerts = {}
+            self._by_watchlist = {}
+            for alert in alerts:
+                self._alerts[alert.item_id] = alert
+                self._targets[alert.state].setdefault(alert.stock_symbol, []).append(
+                    (alert.target_price, alert.item_id)
+                )
+                self._by_watchlist.setdefault(alert.watchlist_id, set()).add(alert.item_id)
+            for by_symbol in self._targets.values():
+                for symbol_targets in by_symbol.values():
+                    symbol_targets.sort()
+            self.loaded_at = time.monotonic()
+
+    # load the index with load_alerts() when it was never loaded or is older than ALERT_INDEX_RELOAD
+    def ensure_loaded(self, load_alerts: Callable[[], Iterable[Alert]]):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > ALERT_INDEX_RELOAD:
+            self.load(load_alerts())
+
+    # force a reload on the next ensure_loaded, e.g. when the database and the index disagree
+    def invalidate(self):
+        self.loaded_at = None
+
+    def upsert(self, alert: Alert):
+        with self._lock:
+            self._remove(alert.item_id)
+            self._insert(alert)
+
+    def remove(self, item_id: int):
+        with self._lock:
+            self._remove(item_id)
+
+    def remove_watchlist(self, watchlist_id: int):
+        with self._lock:
+            for item_id in list(self._by_watchlist.get(watchlist_id, ())):
+                self._remove(item_id)
+
+    def _insert(self, alert: Alert):
+        self._alerts[alert.item_id] = alert
+        bisect.insort(self._targets[alert.state].setdefault(alert.stock_symbol, []), (alert.target_price, alert.item_id))
+        self._by_watchlist.setdefault(alert.watchlist_id, set()).add(alert.item_id)
+
+    def _remove(self, item_id: int):
+        alert = self._alerts.pop(item_id, None)
+        if alert is None:
+            return
+        by_symbol = self._targets[alert.state]
+        symbol_targets = by_symbol[alert.stock_symbol]
+        entry = (alert.target_price, item_id)
+        position = bisect.bisect_left(symbol_targets, entry)
+        if position < len(symbol_targets) and symbol_targets[position] == entry:
+            del symbol_targets[position]
+        if not symbol_targets:
+            del by_symbol[alert.stock_symbol]
+        watchlist_items = self._by_watchlist.get(alert.watchlist_id)
+        if watchlist_items is not None:
+            watchlist_items.discard(item_id)
+            if not watchlist_items:
+                del self._by_watchlist[alert.watchlist_id]
+
+    @staticmethod
+    def _band_slice(symbol_targets: List[Tuple[Decimal, int]], price: Decimal, band: Decimal) -> Tuple[int, int]:
+        low = price / (1 + band)
+        high = price / (1 - band)
+        start = bisect.bisect_left(symbol_targets, (low,))
+        # the item id in the key makes (high, id) sort after every (high, ...) entry
+        end = bisect.bisect_right(symbol_targets, (high, float("inf")))
+        return start, end
+
+    def evaluate(self, stock_symbol: str, price: Decimal) -> Tuple[List[Alert], List[Alert]]:
+        """
+        Apply a new price of a symbol: fired alerts the price moved out of the re-arm band of are armed
+        again, then armed alerts whose band contains the price fire (unless still in their cooldown).
+        Returns (fired, rearmed), the alerts as they are after the transition; nothing else changes.
+        """
+        if price <= 0:
+            return [], []
+        now = datetime.utcnow()
+        fired, rearmed = [], []
+        with self._lock:
+            fired_targets = self._targets[FIRED].get(stock_symbol, [])
+            start, end = self._band_slice(fired_targets, price, ALERT_REARM_BAND)
+            # the Decimal divisions are rounded, so the first and last entry inside the slice are checked too
+            inside = fired_targets[start:end]
+            candidates = dict.fromkeys(fired_targets[:start] + inside[:1] + inside[-1:] + fired_targets[end:])
+            for _, item_id in candidates:
+                alert = self._alerts[item_id]
+                if not in_band(price, alert.target_price, ALERT_REARM_BAND):
+                    self._remove(item_id)
+                    alert = alert._replace(state=ARMED)
+                    self._insert(alert)
+                    rearmed.append(alert)
+
+            armed_targets = self._targets[ARMED].get(stock_symbol, [])
+            start, end = self._band_slice(armed_targets, price, ALERT_THRESHOLD)
+            for _, item_id in armed_targets[start:end]:
+                alert = self._alerts[item_id]
+                if not in_band(price, alert.target_price):
+                    continue
+                if alert.fired_at is not None and now - alert.fired_at < timedelta(seconds=ALERT_COOLDOWN):
+                    continue
+                fired.append(alert._replace(state=FIRED, fired_at=now))
+            for alert in fired:
+                self._remove(alert.item_id)
+                self._insert(alert)
+        return fired, rearmed
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return list(set(self._targets[ARMED]) | set(self._targets[FIRED]))
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def status(self) -> dict:
+        with self._lock:
+            fired = sum(len(targets) for targets in self._targets[FIRED].values())
+        return {
+            "alerts": len(self._alerts),
+            "fired": fired,
+            "symbols": len(self.symbols()),
+            "age_seconds": round(time.monotonic() - self.loaded_at) if self.loaded_at is not None else None,
+        }
+
+
+# Initialize AlertIndex instance
+alert_index = AlertIndex()
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# written by the stock service for every quote that changed: {symbol, price, ts}
+PRICE_STREAM = os.getenv("PRICE_STREAM", "prices:updates")
+PRICE_STREAM_GROUP = os.getenv("PRICE_STREAM_GROUP", "watchlist-alerts")
+PRICE_STREAM_BATCH = int(os.getenv("PRICE_STREAM_BATCH", "500"))
+# events left unacknowledged this long by a replica are taken over (it most likely died)
+PRICE_STREAM_CLAIM_IDLE = int(os.getenv("PRICE_STREAM_CLAIM_IDLE", "60"))
+# written by the stock service after every refresh cycle: {ts, interval, source}
+PRICE_STREAM_HEARTBEAT = os.getenv("PRICE_STREAM_HEARTBEAT", "prices:heartbeat")
+# the stream replaces polling only while the producer refreshes at least this often (seconds); keep it
+# at or below ALERT_POLL_INTERVAL, or alerts would fire later than with polling
+PRICE_STREAM_MAX_PRODUCER_INTERVAL = int(os.getenv("PRICE_STREAM_MAX_PRODUCER_INTERVAL", "60"))
+# a heartbeat older than the producer's interval plus this grace (seconds) counts as a missed cycle
+PRICE_STREAM_HEARTBEAT_GRACE = int(os.getenv("PRICE_STREAM_HEARTBEAT_GRACE", "30"))
+
+BLOCK_MS = 5000
+RETRY_SECONDS = 5
+
+
+# Consumes the price-update stream with a consumer group
+class PriceStreamConsumer:
+    """
+    Every replica of the watchlist service is one consumer of the group, so each event is delivered to
+    one replica. Events are acknowledged only after the handler succeeded (at-least-once): entries left
+    pending by a crash are read again by the same consumer on restart, or claimed by another replica
+    after PRICE_STREAM_CLAIM_IDLE seconds. The events of a batch are coalesced to the latest price per
+    symbol before they are handed to the handler.
+    """
+
+    def __init__(self):
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self.client: Optional[redis.Redis] = None
+        self.connected = False
+        self.last_event_at: Optional[float] = None
+        self.heartbeat: Optional[dict] = None
+        self.processed = 0
+        self.errors = 0
+        self._claim_cursor = "0-0"
+
+    # True while polling is not needed: the stream is connected and the producer's heartbeat shows it is
+    # alive and refreshing at least every PRICE_STREAM_MAX_PRODUCER_INTERVAL seconds. How much price
+    # traffic arrives says nothing about that, since only changed prices are published.
+    @property
+    def healthy(self) -> bool:
+        if not self.connected or self.heartbeat is None:
+            return False
+        interval = self.heartbeat.get("interval")
+        ts = self.heartbeat.get("ts")
+        if not isinstance(interval, (int, float)) or not isinstance(ts, (int, float)):
+            return False
+        return (
+            interval <= PRICE_STREAM_MAX_PRODUCER_INTERVAL
+            and time.time() - ts <= interval + PRICE_STREAM_HEARTBEAT_GRACE
+        )
+
+    async def run(self, handle: Callable[[Dict[str, Decimal]], Awaitable[None]]):
+        while True:
+            try:
+                await self._connect()
+                # first whatever this consumer read but never acknowledged, then new events
+                await self._consume(handle, "0")
+                while True:
+                    await self._read_heartbeat()
+                    await self._claim_abandoned(handle)
+                    await self._consume(handle, ">")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.connected = False
+                self.errors += 1
+                logger.warning(f"Price stream unavailable ({e}); retrying in {RETRY_SECONDS}s")
+                await asyncio.sleep(RETRY_SECONDS)
+
+    async def _connect(self):
+        if self.client is None:
+            self.client = redis.from_url(REDIS_URL, decode_responses=True)
+        try:
+            await self.client.xgroup_create(PRICE_STREAM, PRICE_STREAM_GROUP, id="$", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self.connected = True
+
+    async def _read_heartbeat(self):
+        raw = await self.client.get(PRICE_STREAM_HEARTBEAT)
+        try:
+            heartbeat = json.loads(raw) if raw else None
+        except ValueError:
+            heartbeat = raw
+        if heartbeat is not None and not isinstance(heartbeat, dict):
+            logger.warning(f"Malformed price stream heartbeat {raw!r}")
+            heartbeat = None
+        self.heartbeat = heartbeat
+
+    async def _consume(self, handle, start_id: str):
+        # ">" blocks for new events; "0" returns this consumer's pending events once, without blocking
+        while True:
+            response = await self.client.xreadgroup(
+                PRICE_STREAM_GROUP, self.consumer, {PRICE_STREAM: start_id},
+                count=PRICE_STREAM_BATCH, block=BLOCK_MS if start_id == ">" else None,
+            )
+            entries = response[0][1] if response else []
+            if entries:
+                await self._handle(handle, entries)
+            if start_id == ">" or not entries:
+                return
+
+    async def _claim_abandoned(self, handle):
+        self._claim_cursor, entries, *_ = await self.client.xautoclaim(
+            PRICE_STREAM, PRICE_STREAM_GROUP, self.consumer,
+            min_idle_time=PRICE_STREAM_CLAIM_IDLE * 1000, start_id=self._claim_cursor, count=PRICE_STREAM_BATCH,
+        )
+        if entries:
+            logger.info(f"Claimed {len(entries)} price events abandoned by another consumer")
+            await self._handle(handle, entries)
+
+    async def _handle(self, handle, entries: List[Tuple[str, dict]]):
+        prices: Dict[str, Decimal] = {}
+        for _, fields in entries:
+            # entries deleted by stream trimming come back without fields
+            if fields and "symbol" in fields and "price" in fields:
+                prices[fields["symbol"]] = Decimal(fields["price"]).quantize(Decimal("0.01"))
+        if prices:
+            await handle(prices)
+        await self.client.xack(PRICE_STREAM, PRICE_STREAM_GROUP, *[entry_id for entry_id, _ in entries])
+        self.processed += len(entries)
+        self.last_event_at = time.monotonic()
+
+    def status(self) -> dict:
+        return {
+            "connected": self.connected,
+            "healthy": self.healthy,
+            "processed": self.processed,
+            "errors": self.errors,
+            "seconds_since_event": (
+                round(time.monotonic() - self.last_event_at) if self.last_event_at is not None else None
+            ),
+            "producer_interval": self.heartbeat.get("interval") if self.heartbeat else None,
+            "seconds_since_heartbeat": (
+                round(time.time() - self.heartbeat["ts"]) if self.heartbeat and "ts" in self.heartbeat else None
+            ),
+        }
+
+
+# Initialize PriceStreamConsumer instance
+price_stream_consumer = PriceStreamConsumer()
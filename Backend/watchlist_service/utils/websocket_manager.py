@@ -1,26 +1,137 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Set
+
 from fastapi import WebSocket
 
+logger = logging.getLogger(__name__)
+
+# Messages waiting per connection before the overflow policy applies
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+# drop_oldest: a full queue drops its oldest message; disconnect: a client that far behind is closed
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+# A heartbeat is sent every WS_HEARTBEAT_INTERVAL seconds; clients answer with HEARTBEAT_REPLY, and a
+# connection nothing was received from for WS_IDLE_TIMEOUT seconds is closed
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "90"))
+# Longest a single send may take before the client is considered dead
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+HEARTBEAT = "ping"
+HEARTBEAT_REPLY = "pong"
+
+
+# One open socket with its own outbound queue, drained by its own sender task
+class Connection:
+    def __init__(self, websocket: WebSocket, user_id: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.sender: Optional[asyncio.Task] = None
+        self.last_seen = time.monotonic()
+        self.closed = False
+
+
 # WebSocketManager class for managing connections
 class WebSocketManager:
+    """
+    A user can have any number of connections (browser tabs). Sending only puts the message on the
+    queue of each connection, so the alert loop never waits for a client: every connection is drained
+    by its own task, and a slow or dead client only fills its own bounded queue.
+    """
+
     def __init__(self):
-        self.connections = {}
+        self.connections: Dict[int, Set[Connection]] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._stats = {"sent": 0, "dropped": 0, "overflow_disconnects": 0, "idle_disconnects": 0, "send_failures": 0}
 
-    async def connect(self, websocket: WebSocket, user_id: int):
+    async def connect(self, websocket: WebSocket, user_id: int) -> Connection:
         await websocket.accept()
-        self.connections[user_id] = websocket
-        print(f"User {user_id} connected")
+        connection = Connection(websocket, user_id)
+        connection.sender = asyncio.create_task(self._drain(connection))
+        self.connections.setdefault(user_id, set()).add(connection)
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        logger.info(f"User {user_id} connected ({len(self.connections[user_id])} connections)")
+        return connection
+
+    # called for every message received on the connection
+    def touch(self, connection: Connection):
+        connection.last_seen = time.monotonic()
+
+    # Send a message to every connection of a user; returns the number of connections it was queued for
+    async def send_update(self, user_id: int, message: str) -> int:
+        connections = list(self.connections.get(user_id, ()))
+        for connection in connections:
+            self.send_to(connection, message)
+        return len(connections)
+
+    def send_to(self, connection: Connection, message: str):
+        if connection.closed:
+            return
+        if connection.queue.full():
+            if WS_OVERFLOW_POLICY == "disconnect":
+                self._stats["overflow_disconnects"] += 1
+                logger.warning(f"Closing connection of user {connection.user_id}: {WS_QUEUE_SIZE} messages behind")
+                asyncio.create_task(self.disconnect(connection))
+                return
+            connection.queue.get_nowait()
+            self._stats["dropped"] += 1
+        connection.queue.put_nowait(message)
+
+    async def _drain(self, connection: Connection):
+        try:
+            while True:
+                message = await connection.queue.get()
+                await asyncio.wait_for(connection.websocket.send_text(message), WS_SEND_TIMEOUT)
+                self._stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats["send_failures"] += 1
+            logger.info(f"Send to user {connection.user_id} failed ({e!r}), closing the connection")
+            await self.disconnect(connection)
+
+    async def _heartbeat(self):
+        # heartbeats keep proxies from closing quiet connections, and the replies tell live clients from dead ones
+        while self.connections:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            for connections in list(self.connections.values()):
+                for connection in list(connections):
+                    if now - connection.last_seen > WS_IDLE_TIMEOUT:
+                        self._stats["idle_disconnects"] += 1
+                        logger.info(f"Closing idle connection of user {connection.user_id}")
+                        await self.disconnect(connection)
+                    else:
+                        self.send_to(connection, HEARTBEAT)
 
-    # Send a message to a specific user by user_id
-    async def send_update(self, user_id: int, message: str):
-        websocket = self.connections.get(user_id)
-        if websocket:
-            print(f"Sending message to user {user_id}: {message}")
-            await websocket.send_text(message)
+    async def disconnect(self, connection: Connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        connections = self.connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.connections[connection.user_id]
+        if connection.sender is not None and connection.sender is not asyncio.current_task():
+            connection.sender.cancel()
+        try:
+            await asyncio.wait_for(connection.websocket.close(), WS_SEND_TIMEOUT)
+        except Exception:
+            pass  # already closed by the client
+        logger.info(f"User {connection.user_id} disconnected")
 
-    async def disconnect(self, user_id: int):
-        if user_id in self.connections:
-            del self.connections[user_id]
-            print(f"User {user_id} disconnected")
+    def status(self) -> dict:
+        return {
+            "users": len(self.connections),
+            "connections": sum(len(connections) for connections in self.connections.values()),
+            "queued": sum(connection.queue.qsize() for connections in self.connections.values() for connection in connections),
+            **self._stats,
+        }
 
 # Initialize WebSocketManager instance
-websocket_manager = WebSocketManager()
\ No newline at end of file
+websocket_manager = WebSocketManager()
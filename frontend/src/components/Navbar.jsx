@@ -65,6 +65,11 @@ const Navbar = () => {
       socketRef.current = new WebSocket("ws://localhost:8002/ws/" + user.user_id);
 
       socketRef.current.onmessage = (event) => {
+        // server heartbeat: answer it so the connection is not closed as idle
+        if (event.data === "ping") {
+          socketRef.current.send("pong");
+          return;
+        }
         setNotifications((prev) => [event.data, ...prev].slice(0, 10));
         setUnreadCount((prev) => prev + 1);
       };
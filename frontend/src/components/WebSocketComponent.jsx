@@ -20,6 +20,11 @@ const WebSocketComponent = () => {
         socket.onopen = () => console.log("WebSocket connected ✅");
 
         socket.onmessage = (event) => {
+            // server heartbeat: answer it so the connection is not closed as idle
+            if (event.data === "ping") {
+                socket.send("pong");
+                return;
+            }
             console.log("New message:", event.data);
             setMessages((prev) => [...prev, event.data]);  // Add new message to array
             setOpen(true);  // Show Snackbar
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useMemo } from 'react';
+import React, { useState, useEffect, useMemo, useRef } from 'react';
 import { 
   Box, 
   Typography, 
@@ -49,6 +49,8 @@ const AllStocksPage = () => {
     const [totalPages, setTotalPages] = useState(1);
     const [totalStocks, setTotalStocks] = useState(0);
     const [itemsPerPage] = useState(10);
+    // next_cursor of every visited page, keyed by the page it leads to
+    const pageCursors = useRef({});
 
     // openFiltersDialog state is used to control the visibility of the filters dialog
     const [openFiltersDialog, setOpenFiltersDialog] = useState(false);
@@ -170,7 +172,10 @@ const AllStocksPage = () => {
             try {
                 setLoading(true);
                 // Fetch paginated stocks with prices from the combined endpoint
-                const response = await stockService.getStocksWithPrices(currentPage, itemsPerPage);
+                const response = await stockService.getStocksWithPrices(
+                    currentPage, itemsPerPage, pageCursors.current[currentPage]
+                );
+                pageCursors.current[currentPage + 1] = response.next_cursor;
 
                 // Update pagination info from response
                 setTotalStocks(response.total);
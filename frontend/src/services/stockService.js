@@ -299,22 +299,45 @@ const stockService = {
   },
 
   // requested url: http://localhost:8001/api/stocks/stocks-all/{symbol}
-  getAllStocksDetailed: async () => {
-    try {
-      const response = await axios.get(`${API_BASE_URL}/stocks-all/x`);
-      return response.data;
-    } catch (error) {
-      throw error.response.data;
+  // the response is NDJSON (one stock per line) streamed as stocks resolve;
+  // onStock (optional) is called for every stock as soon as it arrives, the full list is returned at the end
+  getAllStocksDetailed: async (onStock) => {
+    const response = await fetch(`${API_BASE_URL}/stocks-all/x`);
+    if (!response.ok) {
+      throw await response.json().catch(() => ({ detail: response.statusText }));
+    }
+
+    const stocks = [];
+    const handleLine = (line) => {
+      if (!line.trim()) return;
+      const stock = JSON.parse(line);
+      stocks.push(stock);
+      if (onStock) onStock(stock);
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.forEach(handleLine);
     }
+    handleLine(buffer + decoder.decode());
+    return stocks;
   },
 
   // Get paginated stocks with current prices (combined endpoint)
-  // response: { data: [...], total: N, page: N, pages: N, limit: N }
-  getStocksWithPrices: async (page = 1, limit = 10) => {
+  // response: { data: [...], total: N, page: N, pages: N, limit: N, next_cursor: string|null }
+  // pass the previous page's next_cursor as cursor to page forward with keyset pagination
+  getStocksWithPrices: async (page = 1, limit = 10, cursor = null, sort = 'symbol', order = 'asc') => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/with-prices`, {
-        params: { page, limit }
-      });
+      const params = { page, limit, sort, order };
+      if (cursor) params.cursor = cursor;
+      const response = await axios.get(`${API_BASE_URL}/with-prices`, { params });
       return response.data;
     } catch (error) {
       throw error.response.data;